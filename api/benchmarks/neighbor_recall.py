@@ -0,0 +1,93 @@
+"""Recall@k vs latency report for the neighbour search backends
+
+Generates a clustered synthetic catalog in a PCA-sized space and compares
+every backend against exact brute force.
+
+    python benchmarks/neighbor_recall.py --rows 10000 100000 --dims 10 --k 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommender.neighbors import make_index  # noqa: E402
+
+BACKENDS = ['brute', 'kd_tree', 'ball_tree', 'ivf']
+
+
+def synthetic_features(n_rows: int, n_dims: int, n_clusters: int = 50, seed: int = 0) -> np.ndarray:
+    """Gaussian blobs, roughly the shape of a PCA-reduced school catalog"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=3.0, size=(n_clusters, n_dims))
+    labels = rng.integers(0, n_clusters, size=n_rows)
+    return centers[labels] + rng.normal(size=(n_rows, n_dims))
+
+
+def run(n_rows: int, n_dims: int, k: int, n_queries: int, seed: int = 0):
+    features = synthetic_features(n_rows, n_dims, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    # Queries are centroids of a few catalog rows, like real favourite sets
+    queries = np.stack([
+        features[rng.choice(n_rows, size=3, replace=False)].mean(axis=0) for _ in range(n_queries)
+    ])
+
+    exact = make_index('brute').build(features)
+    truth = [set(exact.query(q, k)[0].tolist()) for q in queries]
+
+    rows = []
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        index = make_index(backend).build(features)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            positions, _ = index.query(query, k)
+            latencies.append(time.perf_counter() - start)
+            hits += len(expected.intersection(positions.tolist()))
+
+        latencies_ms = np.array(latencies) * 1000
+        rows.append({
+            'backend': backend,
+            'rows': n_rows,
+            'dims': n_dims,
+            'k': k,
+            'build_s': round(build_seconds, 4),
+            'recall_at_k': round(hits / (k * n_queries), 4),
+            'p50_ms': round(float(np.percentile(latencies_ms, 50)), 4),
+            'p95_ms': round(float(np.percentile(latencies_ms, 95)), 4)
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--dims', type=int, default=10)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--json', help='Optional path to write the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'backend':<10} {'rows':>9} {'build_s':>9} {'recall@k':>9} {'p50_ms':>9} {'p95_ms':>9}")
+    for n_rows in args.rows:
+        for row in run(n_rows, args.dims, args.k, args.queries):
+            results.append(row)
+            print(f"{row['backend']:<10} {row['rows']:>9} {row['build_s']:>9} "
+                  f"{row['recall_at_k']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Memory, latency and top-k overlap of the feature storage precisions
+
+Scores the same queries against float64 (the reference), float32, and int8
+with and without exact re-ranking, on a synthetic PCA-sized catalog.
+
+    python benchmarks/precision_report.py --rows 100000 1000000 --dims 10 --k 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from neighbor_recall import synthetic_features  # noqa: E402
+from recommender.neighbors import make_index  # noqa: E402
+from recommender.quantization import QuantizedMatrix  # noqa: E402
+
+
+def run(n_rows: int, n_dims: int, k: int, n_queries: int, rerank: int, seed: int = 0):
+    features = synthetic_features(n_rows, n_dims, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    queries = np.stack([
+        features[rng.choice(n_rows, size=3, replace=False)].mean(axis=0) for _ in range(n_queries)
+    ])
+
+    float32_features = features.astype(np.float32)
+    quantized = QuantizedMatrix.quantize(features)
+    settings = {
+        'float64': (features.nbytes, make_index('brute').build(features).query),
+        'float32': (float32_features.nbytes, make_index('brute').build(float32_features).query),
+        'int8': (quantized.nbytes, lambda q, k: quantized.query(q, k)),
+        f'int8+rerank{rerank}': (quantized.nbytes, lambda q, k: quantized.query(q, k, (), float32_features, rerank))
+    }
+
+    reference = None
+    rows = []
+    for name, (nbytes, query) in settings.items():
+        latencies = []
+        results = []
+        for q in queries:
+            start = time.perf_counter()
+            positions, _ = query(q, k)
+            latencies.append(time.perf_counter() - start)
+            results.append(set(positions.tolist()))
+        if reference is None:
+            reference = results
+
+        latencies_ms = np.array(latencies) * 1000
+        rows.append({
+            'precision': name,
+            'rows': n_rows,
+            'dims': n_dims,
+            'k': k,
+            'feature_mb': round(nbytes / 2 ** 20, 2),
+            'overlap_at_k': round(sum(len(a & b) for a, b in zip(results, reference)) / (k * n_queries), 4),
+            'p50_ms': round(float(np.percentile(latencies_ms, 50)), 4),
+            'p95_ms': round(float(np.percentile(latencies_ms, 95)), 4)
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--dims', type=int, default=10)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--rerank', type=int, default=200, help='Candidates re-ranked exactly in int8 mode')
+    parser.add_argument('--json', help='Optional path to write the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'precision':<16} {'rows':>9} {'feature_mb':>11} {'overlap@k':>10} {'p50_ms':>9} {'p95_ms':>9}")
+    for n_rows in args.rows:
+        for row in run(n_rows, args.dims, args.k, args.queries, args.rerank):
+            results.append(row)
+            print(f"{row['precision']:<16} {row['rows']:>9} {row['feature_mb']:>11} "
+                  f"{row['overlap_at_k']:>10} {row['p50_ms']:>9} {row['p95_ms']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
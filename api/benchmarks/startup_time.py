@@ -0,0 +1,114 @@
+"""Cold start time of the API: import, startup and first recommendation
+
+Each run is a fresh interpreter on already trained artifacts, timing
+``import main`` and the time until ``/recommendations`` first answers. Pass
+``--ref`` to measure another git revision side by side (e.g. the commit
+before lazy startup).
+
+    python benchmarks/startup_time.py --runs 5 --ref HEAD~1
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRETRAIN = """
+import main
+recommender = main.recommender
+if hasattr(recommender, 'refresh_from_source'):
+    recommender.refresh_from_source()
+else:
+    recommender.load_data()
+    recommender.fit(recommender.schools_df)
+"""
+
+MEASURE = """
+import csv, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+from fastapi.testclient import TestClient
+
+with open('data/schools.csv', newline='') as f:
+    school = next(csv.DictReader(f))['name']
+with TestClient(main.app) as client:
+    while True:
+        response = client.get('/recommendations', params={'school_names': school, 'n_recommendations': 5})
+        if response.status_code == 200 and 'recommendations' in response.json():
+            break
+        time.sleep(0.005)
+print(json.dumps({
+    'import_s': imported,
+    'first_response_s': time.perf_counter() - start,
+    'heavy_modules': [name for name in ('pandas', 'sklearn') if name in sys.modules]
+}))
+"""
+
+
+def prepare_tree(ref: str = None) -> str:
+    """Copy the API (working tree or a git revision) into a temp dir and train it"""
+    directory = tempfile.mkdtemp(prefix='startup-')
+    if ref is None:
+        for name in ('main.py', 'data', 'recommender'):
+            source = os.path.join(API_DIR, name)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(directory, name), ignore=shutil.ignore_patterns('__pycache__'))
+            else:
+                shutil.copy(source, directory)
+    else:
+        archive = subprocess.run(['git', 'archive', f'{ref}:api'], cwd=os.path.dirname(API_DIR),
+                                 check=True, capture_output=True).stdout
+        subprocess.run(['tar', '-x', '-C', directory], input=archive, check=True)
+        # Committed artifacts may come from another format; train from scratch
+        shutil.rmtree(os.path.join(directory, 'models'), ignore_errors=True)
+    subprocess.run([sys.executable, '-c', PRETRAIN], cwd=directory, check=True, capture_output=True)
+    return directory
+
+
+def measure(directory: str, runs: int):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', MEASURE], cwd=directory, check=True,
+                                capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'import_s': round(statistics.median(r['import_s'] for r in results), 4),
+        'first_response_s': round(statistics.median(r['first_response_s'] for r in results), 4),
+        'heavy_modules': results[-1]['heavy_modules']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--ref', help='Git revision to compare against the working tree')
+    parser.add_argument('--json', help='Optional path to write the results as JSON')
+    args = parser.parse_args()
+
+    trees = {'working tree': None}
+    if args.ref:
+        trees[args.ref] = args.ref
+
+    results = {}
+    print(f"{'tree':<14} {'import_s':>9} {'first_response_s':>17}  heavy modules")
+    for label, ref in trees.items():
+        directory = prepare_tree(ref)
+        try:
+            row = results[label] = measure(directory, args.runs)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        print(f"{label:<14} {row['import_s']:>9} {row['first_response_s']:>17}  {', '.join(row['heavy_modules']) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""Latency benchmarks for the recommender engine and an in-process API load test
+
+Generates synthetic catalogs with the schema of ``data/schools.csv`` and times
+``fit``, ``save_models``, ``load_models`` and ``get_recommendations`` (across k
+and input-set size), then load-tests the FastAPI app through an in-process
+ASGI client. Results are written as JSON; ``--baseline`` compares them with an
+earlier run and exits non-zero on regressions.
+
+    python benchmarks/suite.py --rows 1000 100000 1000000 --json results.json
+    python benchmarks/suite.py --rows 1000 100000 --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+TYPES = ['Private', 'Government']
+CURRICULA = ['O/A Levels', 'IB', 'Kindergarten', 'Matriculation']
+FOCUSES = ['STEM', 'Arts', 'Sports', 'General']
+FACILITIES = [
+    'Arts Room, Music Studio', 'All Modern Facilities', 'Library, Labs, Sports Ground', 'Limited Facilities',
+    'Library, Labs', 'Basic Sports Ground', 'Limited Resources', 'No Additional Facilities', 'Basic Classrooms'
+]
+
+# Metrics where a higher value is better; every other metric is a duration
+HIGHER_IS_BETTER = {'requests_per_s'}
+
+
+def synthetic_catalog(n_rows: int, seed: int = 0):
+    """School table with the columns and value ranges of data/schools.csv"""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'name': [f'Synthetic School {i}' for i in range(n_rows)],
+        'latitude': rng.uniform(24.80, 24.95, n_rows),
+        'longitude': rng.uniform(66.95, 67.25, n_rows),
+        'type': rng.choice(TYPES, n_rows),
+        'curriculum': rng.choice(CURRICULA, n_rows),
+        'rating': np.round(rng.uniform(2.5, 5.0, n_rows), 1),
+        'tuition': rng.integers(20_000, 500_000, n_rows),
+        'focus': rng.choice(FOCUSES, n_rows),
+        'facilities': rng.choice(FACILITIES, n_rows),
+        'student_teacher_ratio': rng.integers(8, 40, n_rows),
+        'test_scores': rng.integers(50, 100, n_rows)
+    })
+
+
+def percentiles(samples_s):
+    samples_ms = np.array(samples_s) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(samples_ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(samples_ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(samples_ms, 99)), 4)
+    }
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return round(time.perf_counter() - start, 4)
+
+
+def prepare_catalog(n_rows: int) -> str:
+    """Temp directory laid out like api/ (data/schools.csv, models/) for one catalog"""
+    directory = tempfile.mkdtemp(prefix=f'bench-{n_rows}-')
+    os.makedirs(os.path.join(directory, 'data'))
+    synthetic_catalog(n_rows).to_csv(os.path.join(directory, 'data', 'schools.csv'), index=False)
+    return directory
+
+
+def bench_engine(directory: str, n_rows: int, ks, input_sizes, n_queries: int):
+    from recommender.rec_eng import HybridSchoolRecommender
+
+    def make():
+        return HybridSchoolRecommender(
+            data_path=os.path.join(directory, 'data', 'schools.csv'),
+            model_dir=os.path.join(directory, 'models')
+        )
+
+    results = []
+    recommender = make()
+    results.append({'benchmark': 'load_data', 'rows': n_rows, 'seconds': timed(recommender.load_data)})
+    results.append({'benchmark': 'fit', 'rows': n_rows,
+                    'seconds': timed(lambda: recommender.fit(recommender.schools_df, force_retrain=True))})
+    results.append({'benchmark': 'save_models', 'rows': n_rows, 'seconds': timed(recommender.save_models)})
+    # A fresh instance, as a serving process would load it
+    results.append({'benchmark': 'load_models', 'rows': n_rows, 'seconds': timed(make().load_models)})
+
+    rng = np.random.default_rng(1)
+    names = recommender.snapshot.records.column('name')
+    for k in ks:
+        for input_size in input_sizes:
+            latencies = []
+            for _ in range(n_queries):
+                inputs = [names[i] for i in rng.choice(n_rows, size=min(input_size, n_rows), replace=False)]
+                start = time.perf_counter()
+                recommender.get_recommendations(inputs, n_recommendations=k)
+                latencies.append(time.perf_counter() - start)
+            results.append({'benchmark': 'get_recommendations', 'rows': n_rows, 'k': k,
+                            'inputs': input_size, **percentiles(latencies)})
+    return results
+
+
+async def _load_test(n_requests: int, concurrency: int, distinct_inputs: int):
+    """Runs inside the catalog directory; drives the app through an in-process ASGI client"""
+    import httpx
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            while (await client.get('/ready')).status_code != 200:
+                await asyncio.sleep(0.05)
+
+            names = main.recommender.snapshot.records.column('name')
+            rng = np.random.default_rng(2)
+            # A bounded set of distinct profiles, so the result cache sees realistic reuse
+            profiles = [[names[i] for i in rng.choice(len(names), size=3, replace=False)]
+                        for _ in range(distinct_inputs)]
+            latencies = []
+            errors = 0
+            counter = iter(range(n_requests))
+
+            async def worker():
+                nonlocal errors
+                for i in counter:
+                    params = [('school_names', name) for name in profiles[i % len(profiles)]]
+                    start = time.perf_counter()
+                    response = await client.get('/recommendations', params=params + [('n_recommendations', 10)])
+                    latencies.append(time.perf_counter() - start)
+                    errors += response.status_code != 200
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+    return {'requests_per_s': round(n_requests / elapsed, 2), 'errors': errors, **percentiles(latencies)}
+
+
+def bench_api(directory: str, n_rows: int, n_requests: int, concurrency: int, distinct_inputs: int):
+    """Load-test a fresh API process serving the catalog in ``directory``"""
+    shutil.copy(os.path.join(API_DIR, 'main.py'), directory)
+    shutil.copytree(os.path.join(API_DIR, 'recommender'), os.path.join(directory, 'recommender'),
+                    ignore=shutil.ignore_patterns('__pycache__'), dirs_exist_ok=True)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--api-worker', str(n_requests), str(concurrency),
+         str(distinct_inputs)],
+        cwd=directory, check=True, capture_output=True, text=True
+    ).stdout
+    metrics = json.loads(output.strip().splitlines()[-1])
+    return [{'benchmark': 'api_recommendations', 'rows': n_rows, 'concurrency': concurrency, **metrics}]
+
+
+def result_key(result):
+    return tuple(sorted((name, value) for name, value in result.items()
+                        if name in ('benchmark', 'rows', 'k', 'inputs', 'concurrency')))
+
+
+def compare(results, baseline, tolerance: float):
+    """Rows of (key, metric, baseline, current, change) that regressed beyond ``tolerance``"""
+    previous = {result_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        for metric, value in result.items():
+            if not metric.endswith(('_ms', 'seconds', '_per_s')) or not old.get(metric):
+                continue
+            change = value / old[metric] - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append((dict(result_key(result)), metric, old[metric], value, round(change, 3)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--k', type=int, nargs='+', default=[5, 20, 100])
+    parser.add_argument('--inputs', type=int, nargs='+', default=[1, 5, 20], help='Input-set sizes')
+    parser.add_argument('--queries', type=int, default=100, help='Queries per (k, input size)')
+    parser.add_argument('--requests', type=int, default=2000, help='API requests per catalog')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--distinct-inputs', type=int, default=500)
+    parser.add_argument('--skip-api', action='store_true')
+    parser.add_argument('--json', help='Path to write the results as JSON')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before flagging (0.2 = 20%%)')
+    parser.add_argument('--api-worker', nargs=3, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.api_worker:
+        sys.path.insert(0, os.getcwd())
+        print(json.dumps(asyncio.run(_load_test(*args.api_worker))))
+        return
+
+    results = []
+    for n_rows in args.rows:
+        directory = prepare_catalog(n_rows)
+        try:
+            rows = bench_engine(directory, n_rows, args.k, args.inputs, args.queries)
+            if not args.skip_api:
+                rows += bench_api(directory, n_rows, args.requests, args.concurrency, args.distinct_inputs)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        for row in rows:
+            print(json.dumps(row))
+        results.extend(rows)
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count()
+        },
+        'results': results
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for key, metric, old, new, change in regressions:
+            print(f"REGRESSION {key} {metric}: {old} -> {new} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,20 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
-import pandas as pd
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from recommender.rec_eng import HybridSchoolRecommender
-from typing import Dict, List
+from recommender.cache import RecommendationCache
+from recommender.locks import ModelBusyError
+from recommender.metrics import metrics
+from recommender.profiler import StackSampler
+from recommender.profiles import StaleProfileError
+from recommender.training import TrainingManager
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import functools
 import logging
+import os
+import time
 
 app = FastAPI()
 
@@ -10,80 +22,442 @@ app = FastAPI()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("recommender_api")
 
-# Initialize hybrid recommender with path to CSV
+# Initialize hybrid recommender with path to CSV; the neighbour search
+# backend (brute, kd_tree, ball_tree or ivf), the feature storage
+# precision (float64, float32 or int8) and chunked training for large
+# catalogs are chosen per deployment
 recommender = HybridSchoolRecommender(
     data_path='data/schools.csv',
-    model_dir='models'
+    model_dir='models',
+    index_backend=os.environ.get('RECOMMENDER_INDEX_BACKEND', 'brute'),
+    storage_precision=os.environ.get('RECOMMENDER_STORAGE_PRECISION', 'float32'),
+    scoring_workers=int(os.environ['RECOMMENDER_SCORING_WORKERS']) if os.environ.get('RECOMMENDER_SCORING_WORKERS') else None,
+    chunk_rows=int(os.environ['RECOMMENDER_TRAIN_CHUNK_ROWS']) if os.environ.get('RECOMMENDER_TRAIN_CHUNK_ROWS') else None
 )
 
-async def load_and_train_model():
-    """Background task to load/train the model"""
-    if recommender.load_data():
-        recommender.fit(recommender.schools_df)
+# Results keyed by the normalized input set; cleared whenever the model version changes
+cache = RecommendationCache(
+    max_entries=int(os.environ.get('RECOMMENDER_CACHE_SIZE', 10000)),
+    ttl_seconds=float(os.environ.get('RECOMMENDER_CACHE_TTL', 300))
+)
+
+# Training runs in a separate process; the API keeps serving the current snapshot
+training = TrainingManager(recommender)
+
+# Seconds between checks for artifacts published by another worker or process
+reload_interval = float(os.environ.get('RECOMMENDER_RELOAD_INTERVAL', 1.0))
+
+# Opt-in sampling profiler, started by RECOMMENDER_PROFILER=1 or /debug/profiler
+profiler = StackSampler(interval=float(os.environ.get('RECOMMENDER_PROFILER_INTERVAL', 0.005)))
+
+def _snapshot_value(read):
+    snapshot = recommender.snapshot
+    return read(snapshot) if snapshot is not None else None
+
+def _cache_stat(name):
+    return lambda: cache.stats()[name]
+
+metrics.gauge("recommender_model_schools", "Schools in the served model",
+              lambda: _snapshot_value(lambda snapshot: snapshot.n_schools))
+metrics.gauge("recommender_model_feature_bytes", "Bytes of the served feature matrix",
+              lambda: _snapshot_value(lambda snapshot: snapshot.feature_bytes))
+metrics.gauge("recommender_model_last_training_timestamp_seconds", "When the served model was trained",
+              lambda: _snapshot_value(lambda snapshot: snapshot.last_training_time.timestamp()))
+metrics.gauge("recommender_training_running", "1 while a training job is running",
+              lambda: int(training.running))
+metrics.gauge("recommender_training_last_duration_seconds", "Duration of the latest training job",
+              lambda: training.status["duration_seconds"])
+metrics.gauge("recommender_cache_entries", "Entries in the result cache", _cache_stat("entries"))
+for stat in ("hits", "misses", "evictions", "expirations", "invalidations"):
+    metrics.gauge(f"recommender_cache_{stat}_total", f"Result cache {stat}", _cache_stat(stat), kind="counter")
+
+def warm_up() -> bool:
+    """Map the published artifacts and tell whether they need (re)training
+    
+    Serving needs only the memory-mapped matrix, the columnar school table
+    and the small indexes; pandas and sklearn stay unimported.
+    """
+    recommender.refresh_if_stale(min_interval=0)
+    return recommender.source_changed() or recommender.settings_changed()
+
+async def warm_up_in_background():
+    try:
+        needs_training = await asyncio.get_running_loop().run_in_executor(None, warm_up)
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+        needs_training = True
+    logger.info(f"Warm-up finished, serving: {recommender.snapshot is not None}")
+    # Only train (off-process) when the source file no longer matches the
+    # fingerprint stored with the model or the storage precision changed
+    if needs_training:
+        training.start()
+    app.state.artifact_watcher = asyncio.get_running_loop().create_task(watch_artifacts())
+
+async def watch_artifacts():
+    """Swap in artifacts published by other workers, off the event loop
+    
+    Request handlers only read ``recommender.snapshot``; mapping a new
+    version (name index, row norms) happens here, in the default executor.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(reload_interval)
+        try:
+            await loop.run_in_executor(None, functools.partial(recommender.refresh_if_stale, min_interval=0))
+        except Exception as e:
+            logger.error(f"Reloading artifacts failed: {e}")
 
 @app.on_event("startup")
 async def startup_event():
-    await load_and_train_model()
+    # Accept connections immediately; /ready reports when the model is mapped
+    app.state.warm_up = asyncio.get_running_loop().create_task(warm_up_in_background())
+    if os.environ.get('RECOMMENDER_PROFILER') == '1':
+        profiler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for name in ("warm_up", "artifact_watcher"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+    training.shutdown()
+    recommender.scorer.shutdown()
+    profiler.stop()
+
+@app.get("/ready")
+async def readiness():
+    """200 once a model is being served, 503 while the service is still warming up"""
+    snapshot = recommender.snapshot
+    if snapshot is None:
+        return JSONResponse(status_code=503, content={
+            "status": "warming",
+            "training": training.status["state"]
+        })
+    return {"status": "serving", "model_version": snapshot.model_version}
 
 @app.post("/retrain")
-async def retrain_model(background_tasks: BackgroundTasks):
-    """Force model retraining"""
-    background_tasks.add_task(load_and_train_model)
-    return {"status": "success", "message": "Retraining started in background"}
+async def retrain_model(force: bool = Query(False, description="Retrain even if the data did not change")):
+    """Start model retraining, or join the retraining already in progress"""
+    job = training.start(force_retrain=force)
+    message = "Retraining already in progress" if job["coalesced"] else "Retraining started in background"
+    return {"status": "success", "message": message}
+
+@app.get("/retrain/status")
+async def retrain_status():
+    """Report the state, stage, duration and failure reason of the latest training job"""
+    return training.status
 
 @app.get("/model-info")
 async def get_model_info():
     """Get information about the current model"""
+    snapshot = recommender.snapshot
+    if snapshot is None:
+        return {
+            "last_training_time": None,
+            "feature_weights": recommender.feature_weights,
+            "number_of_schools": 0,
+            "model_version": None,
+            "scoring_workers": recommender.scorer.n_workers,
+            "cache": cache.stats()
+        }
     return {
-        "last_training_time": recommender.last_training_time,
-        "feature_weights": recommender.feature_weights,
-        "number_of_schools": len(recommender.schools_df) if recommender.schools_df is not None else 0
+        "last_training_time": snapshot.last_training_time,
+        "feature_weights": snapshot.feature_weights,
+        "number_of_schools": snapshot.n_schools,
+        "model_version": snapshot.model_version,
+        "index_backend": snapshot.neighbor_index.name,
+        "storage_precision": snapshot.storage_precision,
+        "feature_bytes": snapshot.feature_bytes,
+        "scoring_workers": recommender.scorer.n_workers,
+        "cache": cache.stats()
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request stage latencies, training, model size and cache statistics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/debug/profiler")
+def toggle_profiler(
+    enabled: bool = Query(..., description="Start or stop the sampling profiler"),
+    interval_ms: Optional[float] = Query(None, gt=0, description="Milliseconds between samples"),
+    reset: bool = Query(False, description="Discard the samples collected so far")
+):
+    """Start or stop the sampling profiler"""
+    if reset:
+        profiler.reset()
+    if enabled:
+        profiler.start(interval=interval_ms / 1000 if interval_ms else None)
+    else:
+        profiler.stop()
+    return {"running": profiler.running, "interval_ms": profiler.interval * 1000, "samples": profiler.n_samples}
+
+@app.get("/debug/profiler", response_class=PlainTextResponse)
+async def get_profile(limit: int = Query(200, gt=0, description="Number of stacks to return")):
+    """Collapsed stacks sampled so far, hottest first (flamegraph.pl / speedscope input)"""
+    return PlainTextResponse(profiler.report(limit))
+
+def build_filters(school_type, curriculum, focus, facilities, min_tuition, max_tuition, min_rating, max_rating) -> Dict:
+    """Normalize the attribute query parameters into recommender filters"""
+    filters = {}
+    for field, values in (("type", school_type), ("curriculum", curriculum),
+                          ("focus", focus), ("facilities", facilities)):
+        if values:
+            filters[field] = tuple(sorted(set(values)))
+    for field, low, high in (("tuition", min_tuition, max_tuition), ("rating", min_rating, max_rating)):
+        if low is not None or high is not None:
+            if low is not None and high is not None and low > high:
+                raise HTTPException(status_code=400, detail=f"min_{field} is greater than max_{field}")
+            filters[field] = (low, high)
+    return filters
+
+def build_options(latitude, longitude, max_distance_km, filters) -> Dict:
+    """Location and attribute constraints as recommender keyword arguments"""
+    if (latitude is None) != (longitude is None):
+        raise HTTPException(status_code=400, detail="latitude and longitude must be given together")
+    options = {"location": (latitude, longitude), "max_distance_km": max_distance_km} if latitude is not None else {}
+    if filters:
+        options["filters"] = filters
+    return options
+
 @app.get("/recommendations")
 async def get_recommendations(
     school_names: List[str] = Query(..., description="List of school names to base recommendations on"),
-    n_recommendations: int = Query(5, description="Number of recommendations to return")
+    n_recommendations: int = Query(5, ge=1, description="Number of recommendations to return"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90, description="User latitude for nearby recommendations"),
+    longitude: Optional[float] = Query(None, ge=-180, le=180, description="User longitude for nearby recommendations"),
+    max_distance_km: float = Query(10.0, gt=0, description="Radius around the user location, in km"),
+    school_type: Optional[List[str]] = Query(None, alias="type", description="Only these school types"),
+    curriculum: Optional[List[str]] = Query(None, description="Only these curricula"),
+    focus: Optional[List[str]] = Query(None, description="Only these focus areas"),
+    facilities: Optional[List[str]] = Query(None, description="Facilities every result must offer"),
+    min_tuition: Optional[float] = Query(None, description="Minimum tuition"),
+    max_tuition: Optional[float] = Query(None, description="Maximum tuition"),
+    min_rating: Optional[float] = Query(None, description="Minimum rating"),
+    max_rating: Optional[float] = Query(None, description="Maximum rating")
 ):
-    """Get school recommendations based on given school names"""
-    logger.info(f"Received recommendation request for schools: {school_names}")
+    """Get school recommendations based on given school names
+    
+    With ``latitude`` and ``longitude``, only schools within ``max_distance_km``
+    are considered and each result carries its ``distance_km``. Attribute
+    constraints are hard filters applied before scoring, so the top results
+    are the most similar among the matching schools. Cache hits are
+    answered on the event loop; misses are scored in the default executor.
+    """
+    logger.debug("Received recommendation request for schools: %s", school_names)
+    started = time.perf_counter()
+    
+    filters = build_filters(school_type, curriculum, focus, facilities, min_tuition, max_tuition, min_rating, max_rating)
+    options = build_options(latitude, longitude, max_distance_km, filters)
     
     try:
-        if recommender.schools_df is None:
-            logger.error("Schools data not loaded")
-            return {"error": "Schools data not loaded"}
-            
-        if recommender.load_models():
-            logger.info("Models loaded successfully")
-            recommendations = recommender.get_recommendations(
-                school_ids=school_names,
-                n_recommendations=n_recommendations
-            )
-            logger.info(f"Generated {len(recommendations)} recommendations")
-            return {"recommendations": recommendations}
+        # New artifacts are swapped in by watch_artifacts, never on the request path
+        with metrics.span("model_lookup"):
+            snapshot = recommender.snapshot
+            if snapshot is not None:
+                cache.sync(snapshot.model_version)
+        if snapshot is not None:
+            with metrics.span("cache_lookup"):
+                key = cache.make_key(school_names, **{
+                    name: tuple(sorted(value.items())) if name == "filters" else value
+                    for name, value in options.items()
+                })
+                recommendations = cache.get(key, n_recommendations)
+            if recommendations is None:
+                # Scoring (and waiting on the shard pool) runs off the event loop;
+                # inputs are deduplicated so every spelling of the same set shares one entry
+                recommendations = await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+                    recommender.get_recommendations,
+                    school_ids=sorted(set(school_names)),
+                    n_recommendations=n_recommendations,
+                    **options
+                ))
+                cache.put(key, n_recommendations, recommendations, model_version=snapshot.model_version)
+            logger.debug("Generated %d recommendations", len(recommendations))
+            # Payloads are plain JSON types, so skip FastAPI's jsonable_encoder pass
+            with metrics.span("serialization"):
+                response = JSONResponse({"recommendations": recommendations, "model_version": snapshot.model_version})
+            metrics.observe_span("request", time.perf_counter() - started)
+            return response
             
         logger.error("Failed to load models")
-        return {"error": "Failed to load model"}
+        raise HTTPException(status_code=503, detail="Model not loaded yet, see /ready")
     except ValueError as e:
         logger.error(f"Error generating recommendations: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+class BatchRecommendationRequest(BaseModel):
+    profiles: List[List[str]]
+    n_recommendations: int = Field(5, ge=1)
+
+@app.post("/recommendations/batch")
+def get_batch_recommendations(request: BatchRecommendationRequest):
+    """Get recommendations for many profiles in one vectorized pass
+    
+    Declared sync so FastAPI runs the CPU-bound scoring in its threadpool.
+    """
+    logger.info(f"Received batch recommendation request for {len(request.profiles)} profiles")
+    
+    try:
+        snapshot = recommender.snapshot
+        if snapshot is None:
+            logger.error("Failed to load models")
+            raise HTTPException(status_code=503, detail="Model not loaded yet, see /ready")
+        # Move the cache to the scored model first, so its results can't land under another version
+        cache.sync(snapshot.model_version)
+        
+        batch = recommender.get_recommendations_batch(
+            profiles=[sorted(set(profile)) for profile in request.profiles],
+            n_recommendations=request.n_recommendations
+        )
+        
+        # Batch runs double as cache warming for the per-user endpoint
+        for profile, recommendations in zip(request.profiles, batch):
+            if recommendations is not None:
+                cache.put(cache.make_key(profile), request.n_recommendations, recommendations,
+                          model_version=snapshot.model_version)
+        
+        results = [
+            {"recommendations": recommendations} if recommendations is not None
+            else {"error": "No valid schools found"}
+            for recommendations in batch
+        ]
+        return {"results": results}
+    except ValueError as e:
+        logger.error(f"Error generating batch recommendations: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+class UserProfile(BaseModel):
+    feature_space: str
+    vector: List[float]
+    weight: float
+    updated_at: float
+    schools: List[str]
+    # (school name, interaction type, latest timestamp) of each pair in the profile
+    entries: Optional[List[Tuple[str, str, float]]] = None
+    n_interactions: int
+
+class Interaction(BaseModel):
+    school_name: str
+    type: str = "view"
+    timestamp: datetime
+
+class ProfileUpdateRequest(BaseModel):
+    profile: Optional[UserProfile] = None
+    interactions: List[Interaction]
+    max_entries: Optional[int] = Field(None, ge=1)
+
+class ProfileRecommendationRequest(BaseModel):
+    profile: UserProfile
+    n_recommendations: int = Field(5, ge=1)
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    max_distance_km: float = Field(10.0, gt=0)
+    type: Optional[List[str]] = None
+    curriculum: Optional[List[str]] = None
+    focus: Optional[List[str]] = None
+    facilities: Optional[List[str]] = None
+    min_tuition: Optional[float] = None
+    max_tuition: Optional[float] = None
+    min_rating: Optional[float] = None
+    max_rating: Optional[float] = None
+
+@app.post("/profiles")
+def update_profile(request: ProfileUpdateRequest):
+    """Fold interactions into a user profile and return the new profile
+    
+    Each interaction costs O(d). A repeated (school, type) pair replaces its
+    earlier contribution, and ``max_entries`` keeps only the newest pairs.
+    Send ``profile: null`` with the latest interaction per pair to build a
+    profile; a 409 means the model was refitted since the profile was built
+    and it has to be rebuilt that way.
+    """
+    if recommender.snapshot is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet, see /ready")
+    try:
+        profile, unknown = recommender.update_profile(
+            dict(request.profile) if request.profile else None,
+            [(interaction.school_name, interaction.type, interaction.timestamp) for interaction in request.interactions],
+            max_entries=request.max_entries
+        )
+    except StaleProfileError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"profile": profile, "unknown": unknown}
+
+@app.post("/recommendations/profile")
+def get_profile_recommendations(request: ProfileRecommendationRequest):
+    """Recommendations scored from a stored user profile (409 if it must be rebuilt)"""
+    filters = build_filters(request.type, request.curriculum, request.focus, request.facilities,
+                            request.min_tuition, request.max_tuition, request.min_rating, request.max_rating)
+    options = build_options(request.latitude, request.longitude, request.max_distance_km, filters)
+    with metrics.span("model_lookup"):
+        loaded = recommender.snapshot is not None
+    if not loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded yet, see /ready")
+    try:
+        recommendations = recommender.get_profile_recommendations(
+            dict(request.profile), n_recommendations=request.n_recommendations, **options
+        )
+    except StaleProfileError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with metrics.span("serialization"):
+        return JSONResponse({"recommendations": recommendations, "model_version": recommender.snapshot.model_version})
+
+class SchoolsUpsertRequest(BaseModel):
+    schools: List[Dict[str, Any]]
+
+class SchoolsRemoveRequest(BaseModel):
+    names: List[str]
+
+async def apply_catalog_edit(edit) -> Dict:
+    """Run an upsert or removal off the event loop; hand drift to a background retrain
+    
+    The edit is recorded before the engine decides it cannot patch the
+    model, so the retrain picks it up.
+    """
+    if training.running:
+        raise HTTPException(status_code=409, detail="Training in progress, retry when it finishes")
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(None, edit)
+    except ModelBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result["mode"] == "retrain":
+        training.start()
+    return {"status": "success", **result}
+
+@app.put("/schools")
+async def upsert_schools(request: SchoolsUpsertRequest):
+    """Add or edit schools in the live model without a full retrain"""
+    import pandas as pd
+    
+    result = await apply_catalog_edit(functools.partial(recommender.upsert_schools, pd.DataFrame(request.schools)))
+    logger.info(f"Upserted schools: {result}")
+    return result
+
+@app.post("/schools/remove")
+async def remove_schools(request: SchoolsRemoveRequest):
+    """Remove schools from the live model without a full retrain"""
+    result = await apply_catalog_edit(functools.partial(recommender.remove_schools, request.names))
+    logger.info(f"Removed schools: {result}")
+    return result
+
 @app.get("/test-recommender")
 async def test_recommender():
     """Test if the recommender system is working"""
     try:
         logger.info("Testing recommender system...")
         
-        # Test data loading
-        if not recommender.load_data():
-            return {"status": "error", "message": "Failed to load school data"}
-            
-        # Test model loading
-        if not recommender.load_models():
+        # Test model loading; the school data comes from the mapped artifacts
+        snapshot = recommender.snapshot
+        if snapshot is None:
             return {"status": "error", "message": "Failed to load models"}
             
-        # Get first school from dataset
-        test_school = recommender.schools_df['name'].iloc[0]
+        # Get first school from the served model, skipping removed rows
+        test_school = snapshot.records[int(snapshot.live_positions[0])]['name']
         logger.info(f"Testing with school: {test_school}")
         
         # Try to get recommendations
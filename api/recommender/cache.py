@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+import threading
+import time
+
+
+class RecommendationCache:
+    """In-process LRU + TTL cache of recommendation lists
+
+    Entries are keyed by the normalized input set (and any extra query
+    options), not by the number of results: an entry computed for k results
+    also answers every request for fewer. All entries belong to one model
+    version and are dropped as soon as another version is seen.
+
+    Args:
+        max_entries: Maximum number of cached input sets (least recently used go first)
+        ttl_seconds: Lifetime of an entry
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.model_version = None
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(school_names: Iterable[str], **options) -> Hashable:
+        """Order- and duplicate-insensitive key for an input set plus query options"""
+        return tuple(sorted(set(school_names))), tuple(sorted(options.items()))
+
+    def sync(self, model_version: str):
+        """Drop every entry if the served model version changed"""
+        if model_version == self.model_version:
+            return
+        with self._lock:
+            if model_version != self.model_version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.model_version = model_version
+
+    def get(self, key: Hashable, n_recommendations: int) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, computed_n, recommendations = entry
+                if expires_at < time.monotonic():
+                    del self._entries[key]
+                    self.expirations += 1
+                # A shorter list than requested means the catalog ran out, so it is complete
+                elif computed_n >= n_recommendations or len(recommendations) < computed_n:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return recommendations[:n_recommendations]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, n_recommendations: int, recommendations: List[Dict], model_version: str = None):
+        """Store a result; with ``model_version``, only if the cache still belongs to that version
+
+        A result computed from a model the cache has since moved past is dropped
+        rather than served under the newer version.
+        """
+        with self._lock:
+            if model_version is not None and model_version != self.model_version:
+                return
+            existing = self._entries.get(key)
+            if existing is not None and existing[1] > n_recommendations:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, n_recommendations, recommendations)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "model_version": self.model_version
+        }
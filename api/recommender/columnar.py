@@ -0,0 +1,272 @@
+from typing import Any, Dict, List
+import json
+import os
+import shutil
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+
+
+class ColumnarWriter:
+    """Append school rows into flat, fixed-layout column files
+
+    Numeric columns are raw little-endian arrays. Text columns are an int64
+    offsets array (n + 1 entries) into a UTF-8 bytes blob, plus a null mask.
+    Rows can be appended in chunks; ``close`` writes the manifest.
+
+    Args:
+        directory: Directory to create the column files in
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.columns: Dict[str, Dict[str, Any]] = {}
+        self.n_rows = 0
+        self._files = {}
+        self._text_offsets: Dict[str, int] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self, filename: str):
+        if filename not in self._files:
+            self._files[filename] = open(os.path.join(self.directory, filename), 'wb')
+        return self._files[filename]
+
+    def append(self, frame):
+        """Append a DataFrame chunk; column set and kinds are fixed by the first chunk"""
+        for name in frame.columns:
+            values = frame[name]
+            spec = self.columns.get(name)
+            if spec is None:
+                is_numeric = isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biuf'
+                # Files are named by position so any column name is safe on disk
+                spec = {'file': f"col{len(self.columns)}"}
+                if is_numeric:
+                    spec.update(kind='numeric', dtype=values.dtype.newbyteorder('<').str)
+                else:
+                    spec.update(kind='text')
+                    self._text_offsets[name] = 0
+                    self._open(f"{spec['file']}.offsets").write(np.zeros(1, dtype='<i8').tobytes())
+                self.columns[name] = spec
+
+            if spec['kind'] == 'numeric':
+                self._open(f"{spec['file']}.values").write(np.ascontiguousarray(values.to_numpy(), dtype=spec['dtype']).tobytes())
+                continue
+
+            offsets, blob, nulls = _encode_text(values, self._text_offsets[name])
+            if len(offsets):
+                self._text_offsets[name] = int(offsets[-1])
+            self._open(f"{spec['file']}.offsets").write(offsets.tobytes())
+            self._open(f"{spec['file']}.bytes").write(blob)
+            self._open(f"{spec['file']}.nulls").write(nulls.tobytes())
+        self.n_rows += len(frame)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        # Text columns whose every value was empty never opened a blob file
+        for spec in self.columns.values():
+            if spec['kind'] == 'text':
+                for suffix in ('bytes', 'nulls'):
+                    path = os.path.join(self.directory, f"{spec['file']}.{suffix}")
+                    if not os.path.exists(path):
+                        open(path, 'wb').close()
+        manifest = {'n_rows': self.n_rows, 'columns': [{'name': name, **spec} for name, spec in self.columns.items()]}
+        with open(os.path.join(self.directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+
+def _encode_text(values, base_offset: int):
+    """End offsets (after ``base_offset``), UTF-8 blob and null mask of a text column chunk"""
+    nulls = values.isna().to_numpy()
+    encoded = [b'' if is_null else str(value).encode('utf-8') for value, is_null in zip(values.tolist(), nulls)]
+    lengths = np.fromiter((len(item) for item in encoded), dtype='<i8', count=len(encoded))
+    return (base_offset + np.cumsum(lengths)).astype('<i8'), b''.join(encoded), nulls.astype(np.uint8)
+
+
+def write_columnar(directory: str, frame):
+    """Write a whole DataFrame in the columnar layout"""
+    writer = ColumnarWriter(directory)
+    writer.append(frame)
+    writer.close()
+
+
+def conform_frame(frame, column_names: List[str], numeric_dtypes: Dict[str, np.dtype]):
+    """Reorder rows to a table's columns and cast them to its stored types
+
+    Rows built from JSON or an empty frame carry object or float columns; an
+    integer column appended as float (or as text) would change the table's
+    layout, its payloads and every row hash computed from it. Numeric
+    columns are cast to ``numeric_dtypes``, other columns hold str or None.
+
+    Raises:
+        ValueError: If a value does not fit its column's dtype, e.g. text or a
+            missing value in an integer column
+    """
+    import pandas as pd
+
+    frame = frame.reindex(columns=column_names).reset_index(drop=True)
+    for name in column_names:
+        values = frame[name]
+        dtype = numeric_dtypes.get(name)
+        if dtype is None:
+            frame[name] = pd.Series([None if pd.isna(value) else str(value) for value in values],
+                                    index=frame.index, dtype=object)
+            continue
+        try:
+            values = pd.to_numeric(values)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be numeric")
+        if dtype.kind in 'biu' and values.isna().any():
+            raise ValueError(f"{name} cannot be empty")
+        frame[name] = values.astype(dtype)
+    return frame
+
+
+def link_or_copy(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def extend_columnar(source_directory: str, directory: str, frame):
+    """Write a copy of a columnar table with ``frame`` appended
+
+    The source table stays untouched (it may be mapped by readers). Without
+    rows to append, the column files are hard-linked instead of copied.
+    ``frame`` must already match the table's columns and dtypes, see
+    ``conform_frame``.
+    """
+    with open(os.path.join(source_directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    os.makedirs(directory)
+    for filename in os.listdir(source_directory):
+        if filename == MANIFEST:
+            continue
+        source, target = os.path.join(source_directory, filename), os.path.join(directory, filename)
+        if len(frame):
+            shutil.copyfile(source, target)
+        else:
+            link_or_copy(source, target)
+
+    if len(frame):
+        for column in manifest['columns']:
+            path = os.path.join(directory, column['file'])
+            values = frame[column['name']]
+            if column['kind'] == 'numeric':
+                with open(f"{path}.values", 'ab') as f:
+                    f.write(np.ascontiguousarray(values.to_numpy(), dtype=column['dtype']).tobytes())
+                continue
+            with open(f"{path}.offsets", 'rb') as f:
+                f.seek(-8, os.SEEK_END)
+                base_offset = int(np.frombuffer(f.read(8), dtype='<i8')[0])
+            offsets, blob, nulls = _encode_text(values, base_offset)
+            for suffix, data in (('offsets', offsets.tobytes()), ('bytes', blob), ('nulls', nulls.tobytes())):
+                with open(f"{path}.{suffix}", 'ab') as f:
+                    f.write(data)
+    manifest['n_rows'] += len(frame)
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+
+
+def _memmap(path: str, dtype, count: int) -> np.ndarray:
+    # np.memmap refuses empty files, and there is nothing to share for them anyway
+    if count == 0 or os.path.getsize(path) == 0:
+        return np.zeros(count, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class ColumnarStore:
+    """Read-only, memory-mapped view over a columnar school table
+
+    Column files are mapped with ``mode='r'`` so every worker process reading
+    the same directory shares one page-cached copy. Rows are decoded into
+    plain dicts only when requested.
+
+    Args:
+        directory: Directory written by ``ColumnarWriter``
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.n_rows = manifest['n_rows']
+        self.column_names = [column['name'] for column in manifest['columns']]
+        self._numeric: Dict[str, np.ndarray] = {}
+        self._text: Dict[str, tuple] = {}
+        for column in manifest['columns']:
+            name = column['name']
+            path = os.path.join(directory, column['file'])
+            if column['kind'] == 'numeric':
+                self._numeric[name] = _memmap(f"{path}.values", np.dtype(column['dtype']), self.n_rows)
+            else:
+                offsets = _memmap(f"{path}.offsets", np.dtype('<i8'), self.n_rows + 1)
+                blob = _memmap(f"{path}.bytes", np.uint8, int(offsets[-1]) if self.n_rows else 0)
+                nulls = _memmap(f"{path}.nulls", np.uint8, self.n_rows)
+                self._text[name] = (offsets, blob, nulls)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @property
+    def numeric_dtypes(self) -> Dict[str, np.dtype]:
+        """Stored dtype of every numeric column"""
+        return {name: values.dtype for name, values in self._numeric.items()}
+
+    def _text_value(self, name: str, idx: int):
+        offsets, blob, nulls = self._text[name]
+        if nulls[idx]:
+            return None
+        return bytes(blob[offsets[idx]:offsets[idx + 1]]).decode('utf-8')
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        """Decode one row into a dict of native Python values"""
+        idx = int(idx)
+        row = {}
+        for name in self.column_names:
+            if name in self._numeric:
+                row[name] = self._numeric[name][idx].item()
+            else:
+                row[name] = self._text_value(name, idx)
+        return row
+
+    def column(self, name: str, start: int = 0, end: int = None):
+        """Numeric columns as a (mapped) array, text columns as a list of str/None
+
+        Args:
+            name: Column name
+            start: First row
+            end: Row after the last one (defaults to the end of the table)
+        """
+        end = self.n_rows if end is None else min(end, self.n_rows)
+        if name in self._numeric:
+            return self._numeric[name][start:end]
+        offsets, blob, nulls = self._text[name]
+        # Plain lists: per-element indexing into a memmap is slow
+        offsets = offsets[start:end + 1].tolist()
+        nulls = nulls[start:end].tolist()
+        base = offsets[0]
+        data = bytes(blob[base:offsets[-1]])
+        return [
+            None if nulls[i] else data[offsets[i] - base:offsets[i + 1] - base].decode('utf-8')
+            for i in range(len(nulls))
+        ]
+
+    def iter_chunks(self, names: List[str], chunk_rows: int = 65536):
+        """Consecutive ``{name: column slice}`` dicts covering every row (one, empty, for an empty table)"""
+        for start in range(0, max(self.n_rows, 1), chunk_rows):
+            yield {name: self.column(name, start, start + chunk_rows) for name in names}
+
+    def to_frame(self):
+        """Materialize the table as a pandas DataFrame (training paths only)"""
+        import pandas as pd
+
+        return pd.DataFrame({
+            name: np.array(self._numeric[name]) if name in self._numeric else self.column(name)
+            for name in self.column_names
+        })
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        return [self[idx] for idx in range(self.n_rows)]
@@ -0,0 +1,195 @@
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Exact-match attributes; a row matches any of the requested values
+CATEGORICAL_FILTERS = ('type', 'curriculum', 'focus')
+# Comma-separated lists; a row must offer every requested item
+LIST_FILTERS = ('facilities',)
+# Inclusive (min, max) ranges, either bound optional
+RANGE_FILTERS = ('tuition', 'rating')
+FILTER_FIELDS = CATEGORICAL_FILTERS + LIST_FILTERS + RANGE_FILTERS
+
+
+def _split_items(value) -> Iterable[str]:
+    if not isinstance(value, str):
+        return ()
+    return (item.strip().lower() for item in value.split(',') if item.strip())
+
+
+class AttributeFilterIndex:
+    """Bitmaps and sorted arrays for hard constraints on school attributes
+
+    Every categorical value (and every single facility) gets a packed bitset
+    of the rows carrying it; numeric columns are kept as sorted values with
+    their row positions, so a range is two binary searches. Constraints
+    combine by AND over the packed bitsets before any distance is computed.
+    """
+
+    def __init__(self):
+        self.n_rows = 0
+        self.values: Dict[str, np.ndarray] = {}
+        self.bitsets: Dict[str, np.ndarray] = {}
+        self.sorted_values: Dict[str, np.ndarray] = {}
+        self.sorted_positions: Dict[str, np.ndarray] = {}
+
+    def _pack(self, mask: np.ndarray) -> np.ndarray:
+        return np.packbits(mask, axis=-1)
+
+    def build(self, columns: Dict[str, Sequence]):
+        """Index the filterable columns present in ``columns`` (name -> values per row)"""
+        return self.build_chunks([columns])
+
+    def build_chunks(self, chunks: Iterable[Dict[str, Sequence]]):
+        """Index the filterable columns from consecutive row chunks
+
+        Only (value, row) pairs are kept between chunks, so memory follows the
+        chunk size and the index itself rather than the decoded columns.
+        """
+        items: Dict[str, Tuple[Dict[str, int], list, list]] = {}
+        ranges: Dict[str, list] = {}
+        n_rows = 0
+        for columns in chunks:
+            n_chunk = len(next(iter(columns.values()))) if columns else 0
+            for field in CATEGORICAL_FILTERS + LIST_FILTERS:
+                if field not in columns:
+                    continue
+                if field in LIST_FILTERS:
+                    row_items = [tuple(_split_items(value)) for value in columns[field]]
+                else:
+                    row_items = [(value,) if isinstance(value, str) else () for value in columns[field]]
+                # Codes in first-seen order; renumbered once every value is known
+                lookup, codes, rows = items.setdefault(field, ({}, [], []))
+                codes.append(np.fromiter((lookup.setdefault(item, len(lookup)) for entry in row_items for item in entry),
+                                         dtype=np.int64))
+                rows.append(n_rows + np.repeat(np.arange(n_chunk), [len(entry) for entry in row_items]))
+            for field in RANGE_FILTERS:
+                if field in columns:
+                    ranges.setdefault(field, []).append(np.asarray(columns[field], dtype=np.float64))
+            n_rows += n_chunk
+        self.n_rows = n_rows
+
+        for field, (lookup, codes, rows) in items.items():
+            values = sorted(lookup)
+            rank = np.empty(len(values), dtype=np.int64)
+            rank[[lookup[value] for value in values]] = np.arange(len(values))
+            codes = rank[np.concatenate(codes)]
+            rows = np.concatenate(rows)
+            # One (value, row) pair per item, set straight into the packed bitsets
+            bitsets = np.zeros((len(values), (n_rows + 7) // 8), dtype=np.uint8)
+            np.bitwise_or.at(bitsets, (codes, rows >> 3), (0x80 >> (rows & 7)).astype(np.uint8))
+            self.values[field] = np.array(values, dtype=str)
+            self.bitsets[field] = bitsets
+
+        for field, parts in ranges.items():
+            column = np.concatenate(parts)
+            known = np.flatnonzero(~np.isnan(column))
+            order = known[np.argsort(column[known], kind='stable')]
+            self.sorted_positions[field] = order
+            self.sorted_values[field] = column[order]
+        return self
+
+    def extend(self, columns: Dict[str, Sequence]) -> "AttributeFilterIndex":
+        """A new index with the rows in ``columns`` appended after the indexed ones
+
+        The appended rows are indexed on their own, then their bits are
+        shifted into wider copies of the bitsets and their values inserted
+        into the sorted arrays; nothing is rebuilt.
+        """
+        added = AttributeFilterIndex().build(columns)
+        n_rows = self.n_rows + added.n_rows
+        extended = AttributeFilterIndex()
+        extended.n_rows = n_rows
+        n_bytes = (n_rows + 7) // 8
+
+        for field in set(self.bitsets) | set(added.bitsets):
+            old_values = self.values.get(field, np.empty(0, dtype=str))
+            new_values = added.values.get(field, np.empty(0, dtype=str))
+            values = np.union1d(old_values, new_values)
+            bitsets = np.zeros((len(values), n_bytes), dtype=np.uint8)
+            if len(old_values):
+                old_bitsets = self.bitsets[field]
+                bitsets[np.searchsorted(values, old_values), :old_bitsets.shape[1]] = old_bitsets
+            for value, value_bits in zip(new_values, added.bitsets.get(field, ())):
+                rows = self.n_rows + np.flatnonzero(np.unpackbits(value_bits, count=added.n_rows))
+                np.bitwise_or.at(bitsets[np.searchsorted(values, value)], rows >> 3,
+                                 (0x80 >> (rows & 7)).astype(np.uint8))
+            extended.values[field] = values
+            extended.bitsets[field] = bitsets
+
+        for field in set(self.sorted_values) | set(added.sorted_values):
+            sorted_values = self.sorted_values.get(field, np.empty(0))
+            sorted_positions = self.sorted_positions.get(field, np.empty(0, dtype=np.int64))
+            new_values = added.sorted_values.get(field, np.empty(0))
+            insert_at = np.searchsorted(sorted_values, new_values, side='right')
+            extended.sorted_values[field] = np.insert(sorted_values, insert_at, new_values)
+            extended.sorted_positions[field] = np.insert(
+                sorted_positions, insert_at, self.n_rows + added.sorted_positions.get(field, np.empty(0, dtype=np.int64)))
+        return extended
+
+    def _value_bits(self, field: str, value: str) -> Optional[np.ndarray]:
+        values = self.values[field]
+        i = np.searchsorted(values, value)
+        if i < len(values) and values[i] == value:
+            return self.bitsets[field][i]
+        return None
+
+    def _range_bits(self, field: str, bounds: Tuple[Optional[float], Optional[float]]) -> np.ndarray:
+        low, high = bounds
+        sorted_values = self.sorted_values[field]
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        end = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side='right')
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.sorted_positions[field][start:end]] = True
+        return self._pack(mask)
+
+    def select(self, filters: Dict) -> np.ndarray:
+        """Sorted row positions satisfying every constraint
+
+        Args:
+            filters: ``{field: values}`` for categorical and list fields and
+                ``{field: (min, max)}`` for range fields
+
+        Raises:
+            ValueError: For a field that cannot be filtered on
+        """
+        bits = np.full((self.n_rows + 7) // 8, 0xFF, dtype=np.uint8)
+        for field, constraint in filters.items():
+            if field in RANGE_FILTERS and field in self.sorted_values:
+                bits &= self._range_bits(field, constraint)
+            elif field in CATEGORICAL_FILTERS and field in self.bitsets:
+                any_of = np.zeros_like(bits)
+                for value in constraint:
+                    value_bits = self._value_bits(field, value)
+                    if value_bits is not None:
+                        any_of |= value_bits
+                bits &= any_of
+            elif field in LIST_FILTERS and field in self.bitsets:
+                for value in (item for entry in constraint for item in _split_items(entry)):
+                    value_bits = self._value_bits(field, value)
+                    bits &= value_bits if value_bits is not None else 0
+            else:
+                raise ValueError(f"Cannot filter on {field}")
+        return np.flatnonzero(np.unpackbits(bits, count=self.n_rows))
+
+    def save(self, path: str):
+        arrays = {'n_rows': np.int64(self.n_rows)}
+        for field in self.bitsets:
+            arrays[f'{field}.values'] = self.values[field]
+            arrays[f'{field}.bitsets'] = self.bitsets[field]
+        for field in self.sorted_values:
+            arrays[f'{field}.sorted_values'] = self.sorted_values[field]
+            arrays[f'{field}.sorted_positions'] = self.sorted_positions[field]
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "AttributeFilterIndex":
+        index = cls()
+        with np.load(path) as data:
+            index.n_rows = int(data['n_rows'])
+            for key in data.files:
+                if key == 'n_rows':
+                    continue
+                field, kind = key.split('.', 1)
+                getattr(index, kind)[field] = data[key]
+        return index
@@ -0,0 +1,43 @@
+from typing import Dict, Optional
+import hashlib
+import os
+
+import numpy as np
+
+
+def file_fingerprint(path: str, chunk_size: int = 1 << 20) -> Optional[Dict]:
+    """Size, mtime and streaming SHA-256 of a source file, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+
+def same_source(path: str, fingerprint: Optional[Dict]) -> bool:
+    """Whether the file at ``path`` still matches a stored fingerprint
+
+    An unchanged size and mtime is trusted without reading the file; otherwise
+    the content hash decides (e.g. a touched but identical file).
+    """
+    if not fingerprint:
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size == fingerprint['size'] and stat.st_mtime_ns == fingerprint['mtime_ns']:
+        return True
+    current = file_fingerprint(path)
+    return current is not None and current['sha256'] == fingerprint['sha256']
+
+
+def row_hashes(frame) -> np.ndarray:
+    """One uint64 content hash per row, over every column"""
+    import pandas as pd
+
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64)
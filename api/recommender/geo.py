@@ -0,0 +1,148 @@
+from typing import Tuple
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of points"""
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(latitudes)
+    half_dlat = (lat2 - lat1) / 2
+    half_dlon = (np.radians(longitudes) - math.radians(longitude)) / 2
+    a = np.sin(half_dlat) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(half_dlon) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoGridIndex:
+    """Bucket index over school coordinates for radius queries
+
+    Schools are assigned to square cells of ``cell_degrees`` on a side. Cells
+    are stored as sorted integer keys with CSR-style offsets into one array of
+    row positions, so a radius query looks up only the cells overlapping the
+    query's bounding box and computes exact distances for their rows alone.
+    Rows without coordinates are left out.
+
+    Args:
+        cell_degrees: Cell size in degrees (0.02 is about 2.2 km of latitude)
+    """
+
+    def __init__(self, cell_degrees: float = 0.02):
+        self.cell_degrees = cell_degrees
+        self.columns = int(math.ceil(360 / cell_degrees)) + 1
+        self.cell_keys = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.positions = np.empty(0, dtype=np.int64)
+        self.latitudes = None
+        self.longitudes = None
+
+    def _cells(self, latitudes, longitudes):
+        rows = np.floor((np.asarray(latitudes) + 90) / self.cell_degrees).astype(np.int64)
+        columns = np.floor((np.asarray(longitudes) + 180) / self.cell_degrees).astype(np.int64)
+        return rows, columns
+
+    def build(self, latitudes: np.ndarray, longitudes: np.ndarray):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.latitudes, self.longitudes = latitudes, longitudes
+
+        located = np.flatnonzero(np.isfinite(latitudes) & np.isfinite(longitudes))
+        rows, columns = self._cells(latitudes[located], longitudes[located])
+        keys = rows * self.columns + columns
+        order = np.argsort(keys, kind='stable')
+        self.positions = located[order]
+        self.cell_keys, counts = np.unique(keys[order], return_counts=True)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return self
+
+    def extend(self, latitudes: np.ndarray, longitudes: np.ndarray) -> "GeoGridIndex":
+        """A new index over the given columns, whose first ``n_rows`` rows are already indexed
+
+        Appended rows are merged into their cells with binary searches; this
+        index, shared by readers, is left as is.
+        """
+        extended = GeoGridIndex(self.cell_degrees).attach(latitudes, longitudes)
+        start = self.n_rows
+        new_latitudes, new_longitudes = extended.latitudes[start:], extended.longitudes[start:]
+        located = np.flatnonzero(np.isfinite(new_latitudes) & np.isfinite(new_longitudes))
+        rows, columns = self._cells(new_latitudes[located], new_longitudes[located])
+        keys = rows * self.columns + columns
+        order = np.argsort(keys, kind='stable')
+        keys, new_positions = keys[order], start + located[order]
+
+        # Row keys of the existing positions, then each new row after its cell's rows
+        old_keys = np.repeat(self.cell_keys, np.diff(self.offsets))
+        insert_at = np.searchsorted(old_keys, keys, side='right')
+        extended.positions = np.insert(self.positions, insert_at, new_positions)
+        all_keys = np.insert(old_keys, insert_at, keys)
+        extended.cell_keys, counts = np.unique(all_keys, return_counts=True)
+        extended.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return extended
+
+    def attach(self, latitudes: np.ndarray, longitudes: np.ndarray):
+        """Re-attach the coordinate columns after the index was loaded"""
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        return self
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.latitudes) if self.latitudes is not None else 0
+
+    def candidates(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """Row positions in the cells overlapping the radius' bounding box
+
+        A box crossing the antimeridian is split into one longitude range on
+        each side; a box reaching a pole covers every longitude.
+        """
+        lat_span = radius_km / KM_PER_DEGREE
+        lat_lo, lat_hi = max(-90.0, latitude - lat_span), min(90.0, latitude + lat_span)
+        if abs(latitude) + lat_span >= 90:
+            longitude_ranges = [(-180.0, 180.0)]
+        else:
+            # Longitude degrees shrink towards the poles; use the widest latitude of the box
+            lon_span = radius_km / (KM_PER_DEGREE * math.cos(math.radians(abs(latitude) + lat_span)))
+            lon_lo, lon_hi = longitude - lon_span, longitude + lon_span
+            if lon_span >= 180:
+                longitude_ranges = [(-180.0, 180.0)]
+            elif lon_lo < -180:
+                longitude_ranges = [(-180.0, lon_hi), (lon_lo + 360, 180.0)]
+            elif lon_hi > 180:
+                longitude_ranges = [(lon_lo, 180.0), (-180.0, lon_hi - 360)]
+            else:
+                longitude_ranges = [(lon_lo, lon_hi)]
+
+        (row_lo, row_hi), _ = self._cells([lat_lo, lat_hi], [0.0, 0.0])
+        row_keys = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.columns
+        slices = []
+        for lon_lo, lon_hi in longitude_ranges:
+            _, (col_lo, col_hi) = self._cells([0.0, 0.0], [lon_lo, lon_hi])
+            # Cells of one grid row form a contiguous key range
+            starts = np.searchsorted(self.cell_keys, row_keys + col_lo, side='left')
+            ends = np.searchsorted(self.cell_keys, row_keys + col_hi, side='right')
+            slices.extend(self.positions[self.offsets[start]:self.offsets[end]]
+                          for start, end in zip(starts, ends) if end > start)
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def query(self, latitude: float, longitude: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (positions, distances in km) of the rows within ``radius_km``, in row order"""
+        positions = np.sort(self.candidates(latitude, longitude, radius_km))
+        distances = haversine_km(latitude, longitude, self.latitudes[positions], self.longitudes[positions])
+        within = distances <= radius_km
+        return positions[within], distances[within]
+
+    def save(self, path: str):
+        np.savez(path, cell_degrees=self.cell_degrees, cell_keys=self.cell_keys,
+                 offsets=self.offsets, positions=self.positions)
+
+    @classmethod
+    def load(cls, path: str) -> "GeoGridIndex":
+        with np.load(path) as data:
+            index = cls(float(data['cell_degrees']))
+            index.cell_keys = data['cell_keys']
+            index.offsets = data['offsets']
+            index.positions = data['positions']
+        return index
@@ -0,0 +1,42 @@
+import fcntl
+import os
+
+
+class ModelBusyError(RuntimeError):
+    """Another process is writing the model; retry when it finishes"""
+
+
+class ModelDirLock:
+    """Advisory lock on a model directory, shared by every worker process
+
+    Training and incremental updates hold it while they write and publish
+    artifacts, so one process at a time rewrites the model, whichever
+    uvicorn worker or script started it. ``flock`` locks belong to the open
+    file, so two threads of one process exclude each other as well, and the
+    kernel drops the lock if its holder dies.
+
+    Args:
+        model_dir: Directory holding the model artifacts
+    """
+    FILENAME = '.write.lock'
+
+    def __init__(self, model_dir: str):
+        self.path = os.path.join(model_dir, self.FILENAME)
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; without ``blocking``, return False at once if it is held"""
+        f = open(self.path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
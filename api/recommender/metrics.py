@@ -0,0 +1,130 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+import threading
+import time
+
+# Latency buckets in seconds, from 50us to 10s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense
+
+    ``observe`` is a bisect plus two additions under a lock, cheap enough to
+    sit on the request path.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text format
+
+    Spans and other durations go into labelled histograms; gauges are read
+    from callbacks when ``/metrics`` is scraped, so nothing is computed
+    between scrapes.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Tuple[str, str, Dict[str, Histogram]]] = {}
+        self._gauges: Dict[str, Tuple[str, str, Callable]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, label: str, value: str) -> Histogram:
+        """Histogram of family ``name`` for one value of its label"""
+        family = self._histograms.get(name)
+        if family is None:
+            with self._lock:
+                family = self._histograms.setdefault(name, (help_text, label, {}))
+        series = family[2].get(value)
+        if series is None:
+            with self._lock:
+                series = family[2].setdefault(value, Histogram())
+        return series
+
+    def observe_span(self, span: str, seconds: float):
+        self.histogram('recommender_span_seconds', 'Time spent per request stage', 'span', span).observe(seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block into the ``recommender_span_seconds`` histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_span(name, time.perf_counter() - start)
+
+    def gauge(self, name: str, help_text: str, read: Callable, kind: str = 'gauge'):
+        """Register (or replace) a value read at scrape time
+
+        Args:
+            name: Metric name
+            help_text: HELP line
+            read: Returns a number, or a list of (labels dict, number) pairs
+            kind: 'gauge' or 'counter'
+        """
+        with self._lock:
+            self._gauges[name] = (help_text, kind, read)
+
+    def render(self) -> str:
+        with self._lock:
+            families = sorted((name, help_text, label, sorted(series.items()))
+                              for name, (help_text, label, series) in self._histograms.items())
+            gauges = list(self._gauges.items())
+        lines = []
+        for name, help_text, label, series in families:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for value, histogram in series:
+                counts, total = histogram.snapshot()
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_format_labels({label: value, "le": le})} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels({label: value})} {total}')
+                lines.append(f'{name}_count{_format_labels({label: value})} {cumulative}')
+
+        for name, (help_text, kind, read) in gauges:
+            try:
+                values = read()
+            except Exception:
+                continue
+            if values is None:
+                continue
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            if isinstance(values, (int, float)):
+                values = [({}, values)]
+            for labels, value in values:
+                if value is not None:
+                    lines.append(f'{name}{_format_labels(labels)} {float(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry shared by the engine and the API
+metrics = MetricsRegistry()
@@ -0,0 +1,274 @@
+from typing import Callable, Dict, Iterable, Tuple
+import copy
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("recommender_engine")
+
+
+def select_top_k(distances: np.ndarray, excluded_positions, k: int) -> np.ndarray:
+    """Positions of the k smallest distances, nearest first, skipping excluded rows
+
+    Uses an O(n) partial selection; only the k winners are sorted.
+    Note: ``distances`` is modified in place for the excluded rows.
+    """
+    if excluded_positions:
+        distances[list(excluded_positions)] = np.inf
+    k = min(k, len(distances) - len(excluded_positions))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(distances):
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(len(distances))
+    return candidates[np.argsort(distances[candidates], kind='stable')]
+
+
+class NeighborIndex:
+    """Base class for nearest-neighbour search over the reduced feature matrix
+
+    Subclasses implement ``build`` and ``query``, and ``extend`` when they
+    can index appended rows without a rebuild. The feature matrix itself is
+    never pickled with the index; it is re-attached after loading.
+    """
+    name = None
+
+    def __init__(self):
+        self.features_matrix = None
+
+    def build(self, features_matrix: np.ndarray):
+        self.features_matrix = features_matrix
+        return self
+
+    def attach(self, features_matrix: np.ndarray):
+        """Re-attach the feature matrix after the index was unpickled"""
+        self.features_matrix = features_matrix
+        return self
+
+    @property
+    def n_rows(self) -> int:
+        return self._n_rows
+
+    def extend(self, features_matrix: np.ndarray) -> "NeighborIndex":
+        """A new index over ``features_matrix``, whose first ``n_rows`` rows are the indexed ones
+
+        The published index is shared by concurrent readers, so it is never
+        modified; the default simply rebuilds.
+        """
+        return copy.copy(self).build(features_matrix)
+
+    def query(self, query: np.ndarray, k: int, excluded_positions: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (positions, distances) of the k nearest rows, nearest first"""
+        raise NotImplementedError
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['features_matrix'] = None
+        return state
+
+
+class BruteForceIndex(NeighborIndex):
+    """Exact scan over every row"""
+    name = 'brute'
+
+    def build(self, features_matrix: np.ndarray):
+        self._n_rows = len(features_matrix)
+        return super().build(features_matrix)
+
+    def extend(self, features_matrix):
+        # Nothing but the row count to update: a copy of this empty index is as cheap as a build
+        return type(self)().build(features_matrix)
+
+    def query(self, query, k, excluded_positions=()):
+        # Match the stored precision so float32 storage is scanned in float32
+        query = np.asarray(query, dtype=self.features_matrix.dtype)
+        distances = np.linalg.norm(self.features_matrix - query, axis=1)
+        positions = select_top_k(distances, set(excluded_positions), k)
+        return positions, distances[positions]
+
+
+class TreeIndex(NeighborIndex):
+    """Exact KD-tree or ball-tree search, effective in the low-dimensional PCA space
+
+    Rows appended by ``extend`` are scanned exactly next to the tree until
+    they exceed ``max_unindexed_fraction`` of it, then the tree is rebuilt.
+    """
+    max_unindexed_fraction = 0.1
+
+    def __init__(self, kind: str = 'kd_tree', leaf_size: int = 40):
+        super().__init__()
+        self.kind = kind
+        self.leaf_size = leaf_size
+        self.tree = None
+        self._tree_rows = 0
+
+    @property
+    def name(self):
+        return self.kind
+
+    def build(self, features_matrix):
+        from sklearn.neighbors import BallTree, KDTree
+
+        tree_class = KDTree if self.kind == 'kd_tree' else BallTree
+        self.tree = tree_class(features_matrix, leaf_size=self.leaf_size)
+        self._n_rows = self._tree_rows = len(features_matrix)
+        return super().build(features_matrix)
+
+    def extend(self, features_matrix):
+        n_tree = getattr(self, '_tree_rows', self._n_rows)
+        if len(features_matrix) - n_tree > self.max_unindexed_fraction * n_tree:
+            return TreeIndex(self.kind, self.leaf_size).build(features_matrix)
+        extended = copy.copy(self)
+        extended._n_rows = len(features_matrix)
+        return extended.attach(features_matrix)
+
+    def _query_tree(self, query, k, excluded_positions):
+        """Up to k nearest tree rows outside ``excluded_positions``
+
+        Starts from a few more than k neighbours and widens until enough
+        survive the exclusion, so a long exclusion list (e.g. removed rows)
+        does not inflate every query.
+        """
+        n_tree = getattr(self, '_tree_rows', self._n_rows)
+        n_neighbors = min(2 * k + 8, n_tree)
+        while n_neighbors > 0:
+            distances, positions = self.tree.query(np.atleast_2d(query), k=n_neighbors)
+            keep = [i for i, position in enumerate(positions[0]) if position not in excluded_positions][:k]
+            if len(keep) == k or n_neighbors == n_tree:
+                return positions[0][keep], distances[0][keep]
+            n_neighbors = min(2 * n_neighbors, n_tree)
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
+    def query(self, query, k, excluded_positions=()):
+        excluded_positions = set(excluded_positions)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        positions, distances = self._query_tree(query, k, excluded_positions)
+        n_tree = getattr(self, '_tree_rows', self._n_rows)
+        if n_tree == self._n_rows:
+            return positions, distances
+
+        # Appended rows are not in the tree yet: scan them and merge
+        extra = np.linalg.norm(np.asarray(self.features_matrix[n_tree:], dtype=np.float64) - query, axis=1)
+        extra_excluded = {position - n_tree for position in excluded_positions if position >= n_tree}
+        top = select_top_k(extra, extra_excluded, k)
+        positions = np.concatenate([positions, top + n_tree])
+        distances = np.concatenate([distances, extra[top]])
+        best = np.argsort(distances, kind='stable')[:k]
+        return positions[best], distances[best]
+
+
+class IVFIndex(NeighborIndex):
+    """Inverted-file index: k-means cells, only the closest cells are scanned
+
+    Args:
+        n_lists: Number of k-means cells (defaults to sqrt of the row count)
+        n_probe: Number of closest cells scanned per query
+        n_iter: Lloyd iterations used to place the cell centroids
+        seed: Random seed for centroid initialization
+    """
+    name = 'ivf'
+
+    def __init__(self, n_lists: int = None, n_probe: int = 8, n_iter: int = 20, seed: int = 0):
+        super().__init__()
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self.list_order = None
+        self.list_offsets = None
+
+    @staticmethod
+    def _assign(features_matrix: np.ndarray, centroids: np.ndarray, block_rows: int = 65536) -> np.ndarray:
+        """Nearest centroid per row, computed in blocks to bound memory"""
+        centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+        assignment = np.empty(len(features_matrix), dtype=np.intp)
+        for start in range(0, len(features_matrix), block_rows):
+            block = features_matrix[start:start + block_rows]
+            # ||x||^2 is constant per row, so it does not change the argmin
+            scores = centroid_norms[None, :] - 2 * block @ centroids.T
+            assignment[start:start + block_rows] = scores.argmin(axis=1)
+        return assignment
+
+    def build(self, features_matrix):
+        n_rows = len(features_matrix)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+        rng = np.random.default_rng(self.seed)
+
+        centroids = features_matrix[rng.choice(n_rows, size=n_lists, replace=False)].astype(np.float64)
+        for _ in range(self.n_iter):
+            assignment = self._assign(features_matrix, centroids)
+            counts = np.bincount(assignment, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, features_matrix)
+            non_empty = counts > 0
+            updated = centroids.copy()
+            updated[non_empty] = sums[non_empty] / counts[non_empty, None]
+            if np.allclose(updated, centroids):
+                break
+            centroids = updated
+
+        assignment = self._assign(features_matrix, centroids)
+        # CSR layout: rows of cell c are list_order[list_offsets[c]:list_offsets[c + 1]]
+        self.list_order = np.argsort(assignment, kind='stable')
+        self.list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=n_lists))))
+        self.centroids = centroids
+        self._n_rows = n_rows
+        logger.info(f"Built IVF index with {n_lists} lists over {n_rows} rows")
+        return super().build(features_matrix)
+
+    def extend(self, features_matrix):
+        """Assign appended rows to the existing cells (the centroids are kept)"""
+        n_lists = len(self.centroids)
+        assignment = self._assign(features_matrix[self._n_rows:], self.centroids)
+        counts = np.bincount(assignment, minlength=n_lists)
+        new_order = self._n_rows + np.argsort(assignment, kind='stable')
+        new_offsets = np.concatenate(([0], np.cumsum(counts)))
+        # Each cell's new rows go after its existing ones
+        parts = []
+        for cell in range(n_lists):
+            parts.append(self.list_order[self.list_offsets[cell]:self.list_offsets[cell + 1]])
+            parts.append(new_order[new_offsets[cell]:new_offsets[cell + 1]])
+        extended = copy.copy(self)
+        extended.list_order = np.concatenate(parts) if parts else self.list_order
+        extended.list_offsets = self.list_offsets + new_offsets
+        extended._n_rows = len(features_matrix)
+        return extended.attach(features_matrix)
+
+    def query(self, query, k, excluded_positions=()):
+        excluded = np.fromiter(excluded_positions, dtype=np.int64)
+        cell_order = np.argsort(np.linalg.norm(self.centroids - query, axis=1))
+        n_probe = min(self.n_probe, len(cell_order))
+
+        # Widen the probe until the scanned cells can fill k results
+        while True:
+            cells = cell_order[:n_probe]
+            candidates = np.concatenate([
+                self.list_order[self.list_offsets[cell]:self.list_offsets[cell + 1]] for cell in cells
+            ])
+            is_excluded = np.isin(candidates, excluded)
+            if len(candidates) - np.count_nonzero(is_excluded) >= k or n_probe >= len(cell_order):
+                break
+            n_probe = min(2 * n_probe, len(cell_order))
+
+        distances = np.linalg.norm(self.features_matrix[candidates] - query, axis=1)
+        top = select_top_k(distances, set(np.flatnonzero(is_excluded).tolist()), k)
+        return candidates[top], distances[top]
+
+
+NEIGHBOR_BACKENDS: Dict[str, Callable[..., NeighborIndex]] = {
+    'brute': BruteForceIndex,
+    'kd_tree': lambda **params: TreeIndex(kind='kd_tree', **params),
+    'ball_tree': lambda **params: TreeIndex(kind='ball_tree', **params),
+    'ivf': IVFIndex
+}
+
+
+def make_index(backend: str, **params) -> NeighborIndex:
+    """Instantiate an unbuilt neighbour index by backend name"""
+    if backend not in NEIGHBOR_BACKENDS:
+        raise ValueError(f"Unknown index backend: {backend}. Choose from {sorted(NEIGHBOR_BACKENDS)}")
+    return NEIGHBOR_BACKENDS[backend](**params)
@@ -0,0 +1,91 @@
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .columnar import conform_frame
+
+
+class SchoolOverrides:
+    """Admin edits to the catalog, layered over the source CSV
+
+    ``upsert_schools`` and ``remove_schools`` patch the served model, but a
+    retrain rebuilds it from the CSV. The edits are therefore also recorded
+    here and applied to everything read from the source, whole or chunk by
+    chunk, so neither a retrain nor a restart reverts them. An upserted row
+    replaces every source row of the same name and a removal drops them; an
+    entry stays until a later edit of the same name replaces it.
+
+    Args:
+        model_dir: Directory holding the model artifacts
+    """
+    FILENAME = 'school_overrides.json'
+
+    def __init__(self, model_dir: str):
+        self.path = os.path.join(model_dir, self.FILENAME)
+
+    def load(self) -> Dict:
+        """``{'upserts': {name: row}, 'removed': [names]}``, empty if nothing was edited"""
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'upserts': {}, 'removed': []}
+
+    def version(self) -> Optional[str]:
+        """Content hash of the recorded edits, or None if there are none"""
+        try:
+            with open(self.path, 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def record(self, upserts: List[Dict] = (), removed: Iterable[str] = ()) -> Optional[str]:
+        """Add edits, replacing earlier ones of the same names; returns the new version
+
+        Callers hold the model directory's write lock.
+        """
+        overrides = self.load()
+        removed_names = set(overrides['removed'])
+        for row in upserts:
+            overrides['upserts'][row['name']] = row
+            removed_names.discard(row['name'])
+        for name in removed:
+            overrides['upserts'].pop(name, None)
+            removed_names.add(name)
+        overrides['removed'] = sorted(removed_names)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(overrides, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        return self.version()
+
+    @staticmethod
+    def drop_overridden(frame, overrides: Dict):
+        """Source rows not replaced or removed by an edit"""
+        overridden = set(overrides['upserts']) | set(overrides['removed'])
+        if not overridden:
+            return frame
+        return frame[~frame['name'].isin(overridden)]
+
+    @staticmethod
+    def upserted_rows(overrides: Dict, like):
+        """The upserted rows as a frame with the columns and dtypes of the source frame ``like``"""
+        import pandas as pd
+
+        numeric_dtypes = {name: dtype for name, dtype in like.dtypes.items()
+                          if isinstance(dtype, np.dtype) and dtype.kind in 'biuf'}
+        return conform_frame(pd.DataFrame(list(overrides['upserts'].values())), list(like.columns), numeric_dtypes)
+
+    def apply(self, frame, overrides: Dict = None):
+        """The source frame with every recorded edit applied"""
+        import pandas as pd
+
+        overrides = self.load() if overrides is None else overrides
+        if not overrides['upserts']:
+            return self.drop_overridden(frame, overrides).reset_index(drop=True)
+        return pd.concat([self.drop_overridden(frame, overrides), self.upserted_rows(overrides, frame)],
+                         ignore_index=True)
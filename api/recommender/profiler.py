@@ -0,0 +1,74 @@
+from collections import Counter
+from typing import Optional
+import sys
+import threading
+
+
+class StackSampler:
+    """Opt-in sampling profiler for the serving process
+
+    A daemon thread snapshots the stack of every other thread each
+    ``interval`` seconds and counts the collapsed stacks. Nothing runs on the
+    request path, so the overhead is bounded by the sampling rate and zero
+    while stopped. ``report`` returns the counts in the collapsed format read
+    by flamegraph.pl and speedscope.
+
+    Args:
+        interval: Seconds between samples
+        max_depth: Innermost frames kept per stack
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.n_samples = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None):
+        with self._lock:
+            if self.running:
+                return
+            if interval is not None:
+                self.interval = interval
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._thread is None:
+                return
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self.samples = Counter()
+            self.n_samples = 0
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+            self.n_samples += 1
+
+    def report(self, limit: int = 200) -> str:
+        """The ``limit`` most frequent stacks as ``frame;frame;frame count`` lines"""
+        lines = [f'{stack} {count}' for stack, count in self.samples.most_common(limit)]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,138 @@
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import math
+
+import numpy as np
+
+# Relative weight of one interaction by type; unknown types count as a view
+DEFAULT_INTERACTION_WEIGHTS = {'view': 1.0, 'favorite': 3.0}
+
+
+class StaleProfileError(ValueError):
+    """The profile was built in another feature space and must be rebuilt from the history"""
+
+
+def interaction_time(value) -> float:
+    """Epoch seconds of a datetime, ISO 8601 string or number"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def fold_interactions(profile: Optional[Dict], interactions: Iterable[Tuple[str, str, object]],
+                      vector_of: Callable[[str], Optional[np.ndarray]], feature_space: str,
+                      weights: Dict[str, float], half_life_seconds: float,
+                      max_entries: Optional[int] = None) -> Tuple[Dict, List[str]]:
+    """Add interactions to a user profile in O(d) each
+
+    A profile holds the decayed, weighted sum of the reduced vectors of the
+    schools a user interacted with, and the matching sum of weights; the
+    centroid is their ratio. Every entry decays by half each
+    ``half_life_seconds`` relative to the latest interaction, so moving the
+    reference time forward rescales both sums by the same factor and older
+    entries never need to be revisited. Interactions may arrive in any order.
+
+    Each (school, interaction type) pair contributes once, from its newest
+    timestamp: a repeat replaces the earlier contribution instead of adding
+    to it. With ``max_entries``, the oldest pairs beyond it are dropped. A
+    profile is therefore the same whether it was folded one interaction at a
+    time or rebuilt from the newest ``max_entries`` rows of an interaction
+    store keeping the latest interaction per (school, type).
+
+    Args:
+        profile: Profile to extend, or None to start a new one
+        interactions: (school name, interaction type, timestamp) tuples
+        vector_of: Reduced feature vector of a school, or None if unknown
+        feature_space: Version of the fitted transformers the vectors come from
+        weights: Weight per interaction type
+        half_life_seconds: Recency half-life
+        max_entries: (school, type) pairs kept at most, the newest ones
+
+    Returns:
+        (new profile, names of unknown schools that were skipped); the
+        profile is None while no interaction named a known school
+
+    Raises:
+        StaleProfileError: If ``profile`` belongs to another feature space, or
+            predates per-pair entries, or a contribution to replace names a
+            school no longer in the catalog
+    """
+    if profile is not None and (profile.get('feature_space') != feature_space or profile.get('entries') is None):
+        raise StaleProfileError("Profile was built for another model; rebuild it from the interaction history")
+
+    if profile is None:
+        vector, total, updated_at, entries, count = None, 0.0, None, {}, 0
+    else:
+        vector = np.asarray(profile['vector'], dtype=np.float64)
+        total, updated_at = float(profile['weight']), profile['updated_at']
+        entries = {(school_name, interaction_type): timestamp
+                   for school_name, interaction_type, timestamp in profile['entries']}
+        count = int(profile['n_interactions'])
+
+    def contribution(school_name, interaction_type, timestamp):
+        weight = weights.get(interaction_type, weights.get('view', 1.0))
+        return weight * math.pow(0.5, (updated_at - timestamp) / half_life_seconds)
+
+    def drop(key):
+        nonlocal vector, total
+        row = vector_of(key[0])
+        if row is None:
+            raise StaleProfileError(f"Profile holds {key[0]!r}, which left the catalog; rebuild it from the history")
+        weight = contribution(*key, entries.pop(key))
+        vector -= weight * np.asarray(row, dtype=np.float64)
+        total -= weight
+
+    unknown = []
+    for school_name, interaction_type, timestamp in interactions:
+        # Counted even when skipped, so callers can match it against their history
+        count += 1
+        row = vector_of(school_name)
+        if row is None:
+            unknown.append(school_name)
+            continue
+        key, timestamp = (school_name, interaction_type), interaction_time(timestamp)
+        if key in entries:
+            if timestamp <= entries[key]:
+                continue
+            drop(key)
+        if vector is None:
+            vector, updated_at = np.zeros(len(row)), timestamp
+        if timestamp > updated_at:
+            # Move the reference time forward: everything so far decays
+            decay = math.pow(0.5, (timestamp - updated_at) / half_life_seconds)
+            vector *= decay
+            total *= decay
+            updated_at = timestamp
+        weight = contribution(school_name, interaction_type, timestamp)
+        vector += weight * np.asarray(row, dtype=np.float64)
+        total += weight
+        entries[key] = timestamp
+
+    if max_entries is not None:
+        for key in sorted(entries, key=entries.get)[:max(len(entries) - max_entries, 0)]:
+            drop(key)
+
+    if vector is None:
+        # Only possible when starting from no profile
+        return None, unknown
+    return {
+        'feature_space': feature_space,
+        'vector': vector.tolist(),
+        'weight': total,
+        'updated_at': updated_at,
+        'schools': sorted({school_name for school_name, _ in entries}),
+        'entries': [[school_name, interaction_type, timestamp]
+                    for (school_name, interaction_type), timestamp in sorted(entries.items())],
+        'n_interactions': count
+    }, unknown
+
+
+def profile_centroid(profile: Dict, feature_space: str) -> np.ndarray:
+    """The profile's weighted mean vector in the reduced feature space"""
+    if profile.get('feature_space') != feature_space or profile.get('entries') is None:
+        raise StaleProfileError("Profile was built for another model; rebuild it from the interaction history")
+    if not profile['weight'] > 0:
+        raise ValueError("Profile has no weight")
+    return np.asarray(profile['vector'], dtype=np.float64) / profile['weight']
@@ -0,0 +1,131 @@
+from typing import Iterable, Optional, Tuple
+import os
+
+import numpy as np
+
+from .metrics import metrics
+from .neighbors import select_top_k
+
+STORAGE_PRECISIONS = ('float64', 'float32', 'int8')
+
+
+class QuantizedMatrix:
+    """Symmetric int8 scalar quantization with one scale per dimension
+
+    A row is stored as ``codes * scales`` with ``codes`` in [-127, 127], a
+    quarter of the float32 bytes. Queries scan the codes block by block (the
+    float32 conversion of a block stays in cache), then optionally re-rank
+    the best candidates exactly against the full-precision matrix.
+
+    Args:
+        codes: (n_rows, n_dims) int8 codes
+        scales: (n_dims,) float32 step size per dimension
+    """
+    CODES_FILE = 'features_int8.npy'
+    SCALES_FILE = 'quant_scales.npy'
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray, block_rows: int = 65536):
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.block_rows = block_rows
+        # Squared norms of the dequantized rows for the ||a||^2 - 2a.b + ||b||^2 expansion
+        self.norms = np.empty(len(codes), dtype=np.float32)
+        for start, block in self._blocks():
+            self.norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+
+    @classmethod
+    def quantize(cls, features_matrix: np.ndarray, block_rows: int = 65536) -> "QuantizedMatrix":
+        """Quantize block by block, so a memory-mapped matrix is never copied whole"""
+        n_rows, n_dims = features_matrix.shape
+        max_abs = np.zeros(n_dims, dtype=np.float32)
+        for start in range(0, n_rows, block_rows):
+            block = np.asarray(features_matrix[start:start + block_rows], dtype=np.float32)
+            np.maximum(max_abs, np.abs(block).max(axis=0), out=max_abs)
+        scales = np.where(max_abs > 0, max_abs / 127, 1).astype(np.float32)
+        codes = np.empty((n_rows, n_dims), dtype=np.int8)
+        for start in range(0, n_rows, block_rows):
+            block = np.asarray(features_matrix[start:start + block_rows], dtype=np.float32)
+            codes[start:start + block_rows] = np.clip(np.rint(block / scales), -127, 127)
+        return cls(codes, scales, block_rows)
+
+    def extend(self, rows: np.ndarray) -> "QuantizedMatrix":
+        """A new matrix with ``rows`` appended, quantized with the existing scales
+
+        Values beyond the range seen at quantization time are clipped to it.
+        """
+        codes = np.clip(np.rint(np.asarray(rows, dtype=np.float32) / self.scales), -127, 127).astype(np.int8)
+        return QuantizedMatrix(np.concatenate([self.codes, codes]), self.scales, self.block_rows)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def _blocks(self):
+        for start in range(0, len(self.codes), self.block_rows):
+            yield start, self.codes[start:start + self.block_rows].astype(np.float32) * self.scales
+
+    def shard_scorer(self, query: np.ndarray):
+        """``score_shard(start, end)`` returning approximate squared distances to ``query``"""
+        query = np.asarray(query, dtype=np.float32)
+        # Fold the scales into the query once; blocks then only need an int8 -> float32 cast
+        scaled_query = query * self.scales
+        query_norm = query @ query
+
+        def score_shard(start: int, end: int) -> np.ndarray:
+            squared = np.empty(end - start, dtype=np.float32)
+            for block_start in range(start, end, self.block_rows):
+                block = self.codes[block_start:min(block_start + self.block_rows, end)]
+                squared[block_start - start:block_start - start + len(block)] = block.astype(np.float32) @ scaled_query
+            squared *= -2
+            squared += self.norms[start:end]
+            squared += query_norm
+            return np.maximum(squared, 0, out=squared)
+
+        return score_shard
+
+    def squared_distances(self, query: np.ndarray) -> np.ndarray:
+        """Approximate squared euclidean distances from ``query`` to every row"""
+        return self.shard_scorer(query)(0, len(self.codes))
+
+    def query(self, query: np.ndarray, k: int, excluded_positions: Iterable[int] = (),
+              exact_matrix: Optional[np.ndarray] = None, rerank: int = 200,
+              scorer=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (positions, distances) of the k nearest rows, nearest first
+
+        Args:
+            query: Query vector in the reduced feature space
+            k: Number of rows to return
+            excluded_positions: Rows never returned
+            exact_matrix: Full-precision rows used to re-rank the candidates
+            rerank: Number of approximate candidates re-ranked exactly (0 disables)
+            scorer: Optional ``ShardedScorer`` spreading the scan over threads
+        """
+        rerank_exactly = exact_matrix is not None and rerank > 0
+        n_candidates = max(k, rerank) if rerank_exactly else k
+        if scorer is not None:
+            candidates, squared = scorer.top_k(len(self.codes), self.shard_scorer(query), n_candidates, excluded_positions)
+        else:
+            with metrics.span('distance'):
+                squared = self.squared_distances(query)
+            with metrics.span('top_k'):
+                candidates = select_top_k(squared, set(excluded_positions), n_candidates)
+            squared = squared[candidates]
+        if not rerank_exactly:
+            return candidates, np.sqrt(squared)
+
+        with metrics.span('rerank'):
+            distances = np.linalg.norm(exact_matrix[candidates] - np.asarray(query, dtype=exact_matrix.dtype), axis=1)
+            order = np.argsort(distances, kind='stable')[:k]
+        return candidates[order], distances[order]
+
+    def save(self, directory: str):
+        np.save(os.path.join(directory, self.CODES_FILE), self.codes)
+        np.save(os.path.join(directory, self.SCALES_FILE), self.scales)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["QuantizedMatrix"]:
+        """Map the codes from an artifact directory, or None if it has none"""
+        codes_path = os.path.join(directory, cls.CODES_FILE)
+        if not os.path.exists(codes_path):
+            return None
+        return cls(np.load(codes_path, mmap_mode='r'), np.load(os.path.join(directory, cls.SCALES_FILE)))
@@ -1,18 +1,50 @@
-import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.decomposition import PCA
-from sklearn.compose import ColumnTransformer
-from typing import List, Dict
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+import functools
 import joblib
 import os
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import time
 from datetime import datetime
 import logging
 
+from .columnar import ColumnarStore, ColumnarWriter, conform_frame, extend_columnar, link_or_copy, write_columnar
+from .filters import FILTER_FIELDS, AttributeFilterIndex
+from .fingerprint import file_fingerprint, row_hashes, same_source
+from .geo import GeoGridIndex
+from .locks import ModelBusyError, ModelDirLock
+from .metrics import metrics
+from .neighbors import NeighborIndex, make_index, select_top_k
+from .overrides import SchoolOverrides
+from .profiles import DEFAULT_INTERACTION_WEIGHTS, fold_interactions, profile_centroid
+from .quantization import STORAGE_PRECISIONS, QuantizedMatrix
+from .sharding import ShardedScorer, euclidean_shard_scorer
+from .snapshot import ModelSnapshot, artifact_signature, build_name_index
+
+# pandas and sklearn are only needed to train or patch the model; the serving
+# path maps precomputed artifacts and never imports them
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger("recommender_engine")
 
+def _holding_write_lock(method):
+    """Run a method that writes artifacts under the in-process and cross-process write locks"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._writing():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class HybridSchoolRecommender:
-    def __init__(self, data_path: str, model_dir='models', feature_weights=None):
+    def __init__(self, data_path: str, model_dir='models', feature_weights=None,
+                 index_backend: str = 'brute', index_params: Dict = None, drift_threshold: float = 0.1,
+                 storage_precision: str = 'float32', rerank_candidates: int = 200,
+                 scoring_workers: int = None, chunk_rows: int = None,
+                 interaction_weights: Dict[str, float] = None, profile_half_life_days: float = 90.0):
         """
         Initialize the recommender
         
@@ -20,15 +52,52 @@ class HybridSchoolRecommender:
             data_path: Path to the CSV file containing school data
             model_dir: Directory to save/load trained models
             feature_weights: Optional custom weights for features
+            index_backend: Neighbour search backend ('brute', 'kd_tree', 'ball_tree' or 'ivf')
+            index_params: Optional keyword arguments for the index backend
+            drift_threshold: Relative shift of the numerical statistics (in standard
+                deviations for means, as a ratio for scales) that forces a full refit
+                on incremental updates
+            storage_precision: How the reduced feature matrix is stored and scanned:
+                'float64', 'float32' or 'int8' (scalar quantized, scanned approximately)
+            rerank_candidates: With 'int8', number of approximate candidates re-ranked
+                exactly against the float32 matrix (0 keeps the approximate order)
+            scoring_workers: Threads scoring catalog shards for brute-force queries
+                (defaults to the CPU count)
+            chunk_rows: If set, ``refresh_from_source`` retrains with ``fit_streaming``
+                in chunks of this many rows instead of parsing the whole CSV
+            interaction_weights: Weight of each interaction type in user profiles
+            profile_half_life_days: Age at which an interaction counts half in a profile
         """
+        if storage_precision not in STORAGE_PRECISIONS:
+            raise ValueError(f"Unknown storage precision: {storage_precision}. Choose from {list(STORAGE_PRECISIONS)}")
         self.data_path = data_path
         self.model_dir = model_dir
+        self.index_backend = index_backend
+        self.index_params = index_params or {}
+        self.drift_threshold = drift_threshold
+        self.storage_precision = storage_precision
+        self.rerank_candidates = rerank_candidates
+        self.chunk_rows = chunk_rows
+        self.interaction_weights = interaction_weights or dict(DEFAULT_INTERACTION_WEIGHTS)
+        self.profile_half_life_days = profile_half_life_days
+        self.scorer = ShardedScorer(n_workers=scoring_workers)
+        self.neighbor_index: NeighborIndex = None
         self.schools_df = None
         self.features_matrix = None
         
+        # Resident model used by the request path; swapped, never mutated
+        self.snapshot: ModelSnapshot = None
+        self._snapshot_lock = threading.Lock()
+        self._update_lock = threading.RLock()
+        self._last_staleness_check = 0.0
+        
         # Create models directory if it doesn't exist
         os.makedirs(model_dir, exist_ok=True)
         
+        # One writer per model directory across worker processes
+        self._dir_lock = ModelDirLock(model_dir)
+        self._write_depth = 0
+        
         self.feature_weights = feature_weights or {
             'type': 1.0,
             'curriculum': 1.0,
@@ -43,21 +112,92 @@ class HybridSchoolRecommender:
         self.numerical_features = ['rating', 'tuition', 'student_teacher_ratio', 'test_scores']
         self.categorical_features = ['type', 'curriculum', 'focus', 'facilities']
         
-        self.preprocessor = ColumnTransformer(
+        # Fitted transformers; created by fit() or taken from the snapshot on updates
+        self.preprocessor = None
+        self.pca = None
+        
+        self.last_training_time = None
+        
+        # Fingerprint of the source file that self.schools_df was parsed from,
+        # with the version of the admin overrides applied to it
+        self.source_fingerprint = None
+        self.overrides = SchoolOverrides(model_dir)
+
+    def settings(self) -> Dict:
+        """Constructor arguments that recreate this recommender's configuration, e.g. in a training process
+        
+        Feature weights are the ones of the served model once one is loaded.
+        """
+        return {
+            'feature_weights': dict(self.feature_weights),
+            'index_backend': self.index_backend,
+            'index_params': dict(self.index_params),
+            'drift_threshold': self.drift_threshold,
+            'storage_precision': self.storage_precision,
+            'rerank_candidates': self.rerank_candidates,
+            'chunk_rows': self.chunk_rows,
+            'interaction_weights': dict(self.interaction_weights),
+            'profile_half_life_days': self.profile_half_life_days
+        }
+    
+    @contextmanager
+    def _writing(self, blocking: bool = True):
+        """Hold the write locks; re-entrant within the holding thread
+        
+        Raises:
+            ModelBusyError: Without ``blocking``, if another process holds the model directory
+        """
+        with self._update_lock:
+            if self._write_depth == 0 and not self._dir_lock.acquire(blocking):
+                raise ModelBusyError("The model is being trained or updated by another process, retry when it finishes")
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._dir_lock.release()
+    
+    def _make_transformers(self):
+        """Unfitted preprocessor and PCA (imports sklearn on first use)"""
+        from sklearn.compose import ColumnTransformer
+        from sklearn.decomposition import PCA
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+        
+        preprocessor = ColumnTransformer(
             transformers=[
                 ('num', StandardScaler(), self.numerical_features),
                 ('cat', OneHotEncoder(handle_unknown='ignore'), self.categorical_features)
             ])
-        
-        self.pca = PCA(n_components=0.95)
-        
-        self.last_training_time = None
-
+        return preprocessor, PCA(n_components=0.95)
+    
+    def _source_fingerprint(self) -> Optional[Dict]:
+        """Fingerprint of the source CSV plus the version of the admin overrides applied to it"""
+        fingerprint = file_fingerprint(self.data_path)
+        return None if fingerprint is None else {**fingerprint, 'overrides': self.overrides.version()}
+    
+    @staticmethod
+    def _with_overrides(fingerprint: Optional[Dict], overrides_version: Optional[str]) -> Optional[Dict]:
+        """A source fingerprint carried over to another version of the overrides"""
+        return None if fingerprint is None else {**fingerprint, 'overrides': overrides_version}
+    
     def load_data(self):
-        """Load school data from CSV"""
+        """Load school data from CSV with the admin overrides applied, skipping the parse if neither changed"""
+        import pandas as pd
+        
         try:
+            fingerprint = self._source_fingerprint()
+            if (self.schools_df is not None and fingerprint is not None and self.source_fingerprint is not None
+                    and fingerprint['sha256'] == self.source_fingerprint['sha256']
+                    and fingerprint['overrides'] == self.source_fingerprint.get('overrides')):
+                logger.info(f"{self.data_path} unchanged, reusing parsed data")
+                # Record the new mtime of a touched file, so later checks are a stat again
+                self.source_fingerprint = fingerprint
+                return True
+            
             logger.info(f"Loading data from {self.data_path}")
-            self.schools_df = pd.read_csv(self.data_path)
+            self.schools_df = self.overrides.apply(pd.read_csv(self.data_path))
+            self.source_fingerprint = fingerprint
             logger.info(f"Loaded {len(self.schools_df)} schools")
             return True
         except Exception as e:
@@ -67,59 +207,180 @@ class HybridSchoolRecommender:
     def _get_model_paths(self):
         """Get paths for all model components"""
         return {
-            'preprocessor': os.path.join(self.model_dir, 'preprocessor.joblib'),
-            'pca': os.path.join(self.model_dir, 'pca.joblib'),
-            'features_matrix': os.path.join(self.model_dir, 'features_matrix.npy'),
-            'schools_df': os.path.join(self.model_dir, 'schools_df.pkl'),
-            'metadata': os.path.join(self.model_dir, 'metadata.joblib')
+            'metadata': os.path.join(self.model_dir, 'metadata.joblib'),
+            'artifacts': os.path.join(self.model_dir, 'artifacts')
         }
     
-    def save_models(self):
-        """Save all model components and metadata"""
-        paths = self._get_model_paths()
+    def _get_artifact_paths(self, artifact_version: str):
+        """Get paths inside one immutable, versioned artifact directory"""
+        directory = os.path.join(self._get_model_paths()['artifacts'], artifact_version)
+        return {
+            'directory': directory,
+            'preprocessor': os.path.join(directory, 'preprocessor.joblib'),
+            'pca': os.path.join(directory, 'pca.joblib'),
+            'features_matrix': os.path.join(directory, 'features_matrix.npy'),
+            'schools': os.path.join(directory, 'schools'),
+            'neighbor_index': os.path.join(directory, 'neighbor_index.joblib'),
+            'row_hashes': os.path.join(directory, 'row_hashes.npy'),
+            'tombstones': os.path.join(directory, 'tombstones.npy'),
+            'geo_index': os.path.join(directory, 'geo_index.npz'),
+            'filter_index': os.path.join(directory, 'filter_index.npz')
+        }
+    
+    def _atomic_dump(self, path: str, write):
+        """Write an artifact to a temporary file and move it into place"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    
+    def _write_artifacts(self, artifact_version: str):
+        """Write transformers, features, school columns and index into a new versioned directory
+        
+        The directory is filled under a temporary name and renamed into place,
+        so readers never observe a partially written artifact set.
+        """
+        paths = self._get_artifact_paths(artifact_version)
+        tmp_directory = f"{paths['directory']}.tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        
+        self._write_transformers(tmp_directory)
+        
+        # int8 keeps a float32 copy on disk for exact re-ranking and incremental updates
+        dtype = np.float64 if self.storage_precision == 'float64' else np.float32
+        np.save(os.path.join(tmp_directory, 'features_matrix.npy'), np.ascontiguousarray(self.features_matrix, dtype=dtype))
+        write_columnar(os.path.join(tmp_directory, 'schools'), self.schools_df)
+        joblib.dump(self.neighbor_index, os.path.join(tmp_directory, 'neighbor_index.joblib'))
+        np.save(os.path.join(tmp_directory, 'row_hashes.npy'), row_hashes(self.schools_df))
+        self._write_search_indexes(tmp_directory, self.features_matrix, ColumnarStore(os.path.join(tmp_directory, 'schools')))
+        os.rename(tmp_directory, paths['directory'])
+    
+    def _write_transformers(self, directory: str):
+        """Pickle the fitted preprocessor and PCA next to the features they produced
+        
+        Each artifact version carries its own copy, so a snapshot can never
+        pick up transformers refitted later by another process.
+        """
+        joblib.dump(self.preprocessor, os.path.join(directory, 'preprocessor.joblib'))
+        joblib.dump(self.pca, os.path.join(directory, 'pca.joblib'))
+    
+    def _write_search_indexes(self, directory: str, features_matrix: np.ndarray, records: ColumnarStore):
+        """Write the quantized codes, spatial index and attribute bitmaps next to a feature matrix
+        
+        Everything is read back from the (mapped) columnar table block by
+        block, so no decoded copy of the catalog is needed.
+        """
+        if self.storage_precision == 'int8':
+            QuantizedMatrix.quantize(features_matrix).save(directory)
+        if {'latitude', 'longitude'} <= set(records.column_names):
+            GeoGridIndex().build(records.column('latitude'), records.column('longitude')).save(
+                os.path.join(directory, 'geo_index.npz'))
+        filter_columns = [name for name in FILTER_FIELDS if name in records.column_names]
+        AttributeFilterIndex().build_chunks(records.iter_chunks(filter_columns)).save(
+            os.path.join(directory, 'filter_index.npz'))
+    
+    def _prune_artifacts(self, keep: int = 2):
+        """Remove all but the newest artifact directories
+        
+        Workers still mapping a removed directory keep reading it safely: the
+        files stay alive until their last mapping is closed.
+        """
+        root = self._get_model_paths()['artifacts']
+        versions = sorted(name for name in os.listdir(root) if not name.endswith('.tmp'))
+        for name in versions[:-keep]:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    
+    def save_models(self, refitted: bool = True, artifact_version: str = None):
+        """Save all model components and metadata
         
-        # Save transformers
-        joblib.dump(self.preprocessor, paths['preprocessor'])
-        joblib.dump(self.pca, paths['pca'])
+        Args:
+            refitted: Whether the preprocessor and PCA were fitted anew; incremental
+                updates reuse the snapshot's, which keeps its profiles valid
+            artifact_version: Version of an artifact directory that is already
+                written (streaming training); otherwise one is written from the
+                in-memory model
+        """
+        paths = self._get_model_paths()
+        model_version = artifact_version or datetime.now().strftime('%Y%m%d%H%M%S%f')
         
-        # Save processed data
-        np.save(paths['features_matrix'], self.features_matrix)
-        self.schools_df.to_pickle(paths['schools_df'])
+        # Save processed data in the memory-mappable format
+        if artifact_version is None:
+            self._write_artifacts(model_version)
         
-        # Save metadata
+        # Save metadata last: it points at the artifact directory and its file
+        # signature is the version token readers poll
         metadata = {
             'feature_weights': self.feature_weights,
             'last_training_time': self.last_training_time,
             'numerical_features': self.numerical_features,
-            'categorical_features': self.categorical_features
+            'categorical_features': self.categorical_features,
+            'index_backend': self.index_backend,
+            'storage_precision': self.storage_precision,
+            'model_version': model_version,
+            'artifact_version': model_version,
+            # Profiles stay valid as long as the transformers are not refitted
+            'feature_space': model_version if refitted or self.snapshot is None else self.snapshot.feature_space,
+            'source_fingerprint': self.source_fingerprint
         }
-        joblib.dump(metadata, paths['metadata'])
+        self._atomic_dump(paths['metadata'], lambda f: joblib.dump(metadata, f))
+        self._prune_artifacts()
         
         print(f"Models and data saved to {self.model_dir}")
+        return metadata
     
     def load_models(self) -> bool:
         """Load all model components and metadata"""
         paths = self._get_model_paths()
         
         try:
-            # Check if all files exist
-            if not all(os.path.exists(path) for path in paths.values()):
+            if not os.path.exists(paths['metadata']):
                 return False
             
-            # Load transformers
-            self.preprocessor = joblib.load(paths['preprocessor'])
-            self.pca = joblib.load(paths['pca'])
-            
-            # Load processed data
-            self.features_matrix = np.load(paths['features_matrix'])
-            self.schools_df = pd.read_pickle(paths['schools_df'])
+            signature = artifact_signature(paths['metadata'])
             
             # Load metadata
             metadata = joblib.load(paths['metadata'])
-            self.feature_weights = metadata['feature_weights']
-            self.last_training_time = metadata['last_training_time']
-            self.numerical_features = metadata['numerical_features']
-            self.categorical_features = metadata['categorical_features']
+            if 'artifact_version' not in metadata:
+                return False
+            artifact_paths = self._get_artifact_paths(metadata['artifact_version'])
+            # Directories written before the transformers were versioned need a retrain
+            if not os.path.exists(artifact_paths['pca']):
+                return False
+            
+            # Map processed data read-only; worker processes share the page cache
+            features_matrix = np.load(artifact_paths['features_matrix'], mmap_mode='r')
+            records = ColumnarStore(artifact_paths['schools'])
+            neighbor_index = self._load_neighbor_index(artifact_paths['neighbor_index'], features_matrix)
+            hashes = (np.load(artifact_paths['row_hashes'], mmap_mode='r')
+                      if os.path.exists(artifact_paths['row_hashes']) else None)
+            tombstones = (np.load(artifact_paths['tombstones'])
+                          if os.path.exists(artifact_paths['tombstones']) else np.empty(0, dtype=np.int64))
+            geo_index = self._load_geo_index(artifact_paths['geo_index'], records)
+            filter_index = self._load_filter_index(artifact_paths['filter_index'], records)
+            quantized = QuantizedMatrix.load(artifact_paths['directory'])
+            
+            snapshot = self._build_snapshot(
+                # Unpickling the transformers imports sklearn; deferred until an update needs them
+                load_transformers=functools.partial(self._load_transformers, artifact_paths['preprocessor'], artifact_paths['pca']),
+                features_matrix=features_matrix,
+                records=records,
+                neighbor_index=neighbor_index,
+                feature_weights=metadata['feature_weights'],
+                last_training_time=metadata['last_training_time'],
+                numerical_features=metadata['numerical_features'],
+                categorical_features=metadata['categorical_features'],
+                model_version=metadata['model_version'],
+                source_fingerprint=metadata.get('source_fingerprint'),
+                row_hashes=hashes,
+                geo_index=geo_index,
+                filter_index=filter_index,
+                quantized=quantized,
+                feature_space=metadata.get('feature_space', metadata['model_version']),
+                tombstones=tombstones,
+                signature=signature
+            )
+            self._swap_snapshot(snapshot)
             
             print(f"Models loaded successfully. Last trained: {self.last_training_time}")
             return True
@@ -128,43 +389,257 @@ class HybridSchoolRecommender:
             print(f"Error loading models: {str(e)}")
             return False
     
-    def needs_retraining(self, schools_data: pd.DataFrame) -> bool:
-        """Check if model needs retraining based on data changes"""
-        if self.schools_df is None:
-            return True
+    @staticmethod
+    def _load_transformers(preprocessor_path: str, pca_path: str):
+        return joblib.load(preprocessor_path), joblib.load(pca_path)
+    
+    def _build_neighbor_index(self, features_matrix: np.ndarray) -> NeighborIndex:
+        """Build the configured neighbour search backend over the reduced features"""
+        return make_index(self.index_backend, **self.index_params).build(features_matrix)
+    
+    def _load_neighbor_index(self, path: str, features_matrix: np.ndarray) -> NeighborIndex:
+        """Load the persisted index, rebuilding it if missing, stale or of another backend"""
+        if os.path.exists(path):
+            try:
+                neighbor_index = joblib.load(path)
+                if neighbor_index.name == self.index_backend and neighbor_index.n_rows == len(features_matrix):
+                    return neighbor_index.attach(features_matrix)
+            except Exception as e:
+                logger.warning(f"Could not load neighbour index, rebuilding: {e}")
+        return self._build_neighbor_index(features_matrix)
+    
+    def _load_geo_index(self, path: str, records: ColumnarStore) -> Optional[GeoGridIndex]:
+        """Load the spatial index, rebuilding it for artifacts written without one"""
+        if not {'latitude', 'longitude'} <= set(records.column_names):
+            return None
+        latitudes, longitudes = records.column('latitude'), records.column('longitude')
+        if os.path.exists(path):
+            try:
+                return GeoGridIndex.load(path).attach(latitudes, longitudes)
+            except Exception as e:
+                logger.warning(f"Could not load spatial index, rebuilding: {e}")
+        return GeoGridIndex().build(latitudes, longitudes)
+    
+    def _load_filter_index(self, path: str, records: ColumnarStore) -> AttributeFilterIndex:
+        """Load the attribute bitmaps, rebuilding them for artifacts written without them"""
+        if os.path.exists(path):
+            try:
+                filter_index = AttributeFilterIndex.load(path)
+                if filter_index.n_rows == len(records):
+                    return filter_index
+            except Exception as e:
+                logger.warning(f"Could not load filter index, rebuilding: {e}")
+        filter_columns = [name for name in FILTER_FIELDS if name in records.column_names]
+        return AttributeFilterIndex().build_chunks(records.iter_chunks(filter_columns))
+    
+    def _build_snapshot(self, **components) -> ModelSnapshot:
+        """Assemble an immutable snapshot from loaded, freshly trained or patched components
+        
+        The name index and row norms are derived unless the caller carried
+        them over from the previous snapshot.
+        """
+        components['numerical_features'] = tuple(components['numerical_features'])
+        components['categorical_features'] = tuple(components['categorical_features'])
+        if 'name_positions' not in components:
+            components['name_positions'] = build_name_index(components['records'].column('name'),
+                                                            components['tombstones'].tolist())
+        if 'row_norms' not in components:
+            # Squared row norms for the ||a||^2 - 2a.b + ||b||^2 distance expansion
+            features_matrix = components['features_matrix']
+            components['row_norms'] = np.einsum('ij,ij->i', features_matrix, features_matrix)
+        return ModelSnapshot(**components)
+    
+    def _swap_snapshot(self, snapshot: ModelSnapshot):
+        """Publish a new snapshot and mirror it onto the legacy attributes"""
+        with self._snapshot_lock:
+            self.features_matrix = snapshot.features_matrix
+            self.neighbor_index = snapshot.neighbor_index
+            self.feature_weights = snapshot.feature_weights
+            self.last_training_time = snapshot.last_training_time
+            self.numerical_features = list(snapshot.numerical_features)
+            self.categorical_features = list(snapshot.categorical_features)
+            # Single reference assignment: readers see either the old or the new model
+            self.snapshot = snapshot
+    
+    def refresh_if_stale(self, min_interval: float = 1.0) -> bool:
+        """Reload artifacts only if they changed on disk since the current snapshot
+        
+        Args:
+            min_interval: Minimum seconds between two on-disk signature checks
             
-        # Compare current data with loaded data
-        if len(schools_data) != len(self.schools_df):
+        Returns:
+            True if a usable snapshot is available after the check
+        """
+        now = time.monotonic()
+        if self.snapshot is not None and now - self._last_staleness_check < min_interval:
             return True
-            
-        # Check if any school data has changed
-        return not schools_data.equals(self.schools_df)
+        self._last_staleness_check = now
+        
+        signature = artifact_signature(self._get_model_paths()['metadata'])
+        if self.snapshot is not None and (signature is None or signature == self.snapshot.signature):
+            return True
+        
+        if signature is not None and self.load_models():
+            return True
+        return self.snapshot is not None
     
-    def _apply_feature_weights(self, features_matrix: np.ndarray, feature_names: List[str]) -> np.ndarray:
-        """Apply feature weights to the transformed features"""
-        weighted_features = features_matrix.copy()
+    def source_changed(self) -> bool:
+        """Cheap check whether the source CSV or the admin overrides differ from what the snapshot was built from"""
+        snapshot = self.snapshot
+        if snapshot is None or not same_source(self.data_path, snapshot.source_fingerprint):
+            return True
+        return snapshot.source_fingerprint.get('overrides') != self.overrides.version()
+    
+    def settings_changed(self) -> bool:
+        """Whether the published artifacts use another storage precision than configured"""
+        snapshot = self.snapshot
+        return snapshot is not None and snapshot.storage_precision != self.storage_precision
+    
+    @_holding_write_lock
+    def refresh_from_source(self, force_retrain: bool = False) -> str:
+        """Bring the model up to date with the source CSV
+        
+        An unchanged file costs one stat (or one file hash); the CSV is only
+        parsed when it changed. With ``chunk_rows`` set, a changed file is
+        retrained with ``fit_streaming`` (no row-level incremental update,
+        which needs the whole table in memory). Waits for any other process
+        writing the same model directory, then re-checks against what it
+        published.
+        
+        Returns:
+            'unchanged', 'incremental' or 'full'
+        """
+        if (not force_retrain and (self.snapshot is not None or self.load_models())
+                and not self.source_changed() and not self.settings_changed()):
+            print("Source data unchanged - no retraining needed")
+            return 'unchanged'
+        if self.chunk_rows:
+            return self.fit_streaming(self.chunk_rows)
+        if not self.load_data():
+            raise Exception(f"Failed to load school data from {self.data_path}")
+        return self.fit(self.schools_df, force_retrain=force_retrain)
+    
+    def _diff_rows(self, schools_data: "pd.DataFrame"):
+        """Rows to append and row positions to drop to turn the snapshot into ``schools_data``
+        
+        Rows are matched by content hash as a multiset, so duplicate school
+        names are fine and an edited row shows up as one removal plus one
+        addition; rows already removed (tombstones) are not compared.
+        Returns None when no row-level diff is possible (no stored hashes or
+        different columns) and a full retrain is required.
+        """
+        snapshot = self.snapshot
+        columns = snapshot.records.column_names
+        if snapshot.row_hashes is None or set(schools_data.columns) != set(columns):
+            return None
+        
+        new_hashes = row_hashes(schools_data[columns])
+        live_positions = snapshot.live_positions
+        live_hashes = snapshot.row_hashes[live_positions]
+        if len(new_hashes) == len(live_hashes) and np.array_equal(new_hashes, live_hashes):
+            return schools_data.iloc[:0], []
+        
+        stored_hashes = live_hashes.tolist()
+        unmatched_new = Counter(new_hashes.tolist())
+        removed_positions = []
+        for position, row_hash in zip(live_positions.tolist(), stored_hashes):
+            if unmatched_new[row_hash] > 0:
+                unmatched_new[row_hash] -= 1
+            else:
+                removed_positions.append(position)
         
+        unmatched_stored = Counter(stored_hashes)
+        appended = []
+        for row_hash in new_hashes.tolist():
+            appended.append(unmatched_stored[row_hash] == 0)
+            if unmatched_stored[row_hash] > 0:
+                unmatched_stored[row_hash] -= 1
+        return schools_data[appended], removed_positions
+    
+    def needs_retraining(self, schools_data: "pd.DataFrame") -> bool:
+        """Check if model needs retraining based on data changes"""
+        if self.snapshot is None:
+            return True
+        changes = self._diff_rows(schools_data)
+        return changes is None or len(changes[0]) > 0 or len(changes[1]) > 0
+    
+    def _feature_weight_vector(self, feature_names: List[str]) -> np.ndarray:
+        """Weight of every transformed column"""
+        weights = np.ones(len(feature_names))
         for feature, weight in self.feature_weights.items():
             # Find all columns that start with this feature name
             feature_cols = [i for i, name in enumerate(feature_names) 
                           if name == feature or name.startswith(f"{feature}_")]
-            
-            # Apply weight to those columns
-            weighted_features[:, feature_cols] *= weight
-            
-        return weighted_features
+            weights[feature_cols] *= weight
+        return weights
     
-    def fit(self, schools_data: pd.DataFrame, force_retrain=False):
-        """Prepare the recommender with transformed and weighted features"""
+    def _apply_feature_weights(self, features_matrix: np.ndarray, feature_names: List[str]) -> np.ndarray:
+        """Apply feature weights to the transformed features
+        
+        Sparse input stays sparse: only the stored (non-zero) entries are scaled.
+        """
+        weights = self._feature_weight_vector(feature_names)
+        if hasattr(features_matrix, 'multiply'):
+            return features_matrix.multiply(weights).tocsr()
+        return features_matrix * weights
+    
+    def _get_feature_names(self) -> List[str]:
+        """Names of the columns produced by the fitted preprocessor"""
+        return (
+            self.numerical_features +
+            self.preprocessor.named_transformers_['cat'].get_feature_names_out(self.categorical_features).tolist()
+        )
+    
+    def _transform_rows(self, schools_data: "pd.DataFrame") -> np.ndarray:
+        """Project rows into the reduced space with the already fitted transformers"""
+        weighted_features = self._apply_feature_weights(
+            self.preprocessor.transform(schools_data), self._get_feature_names()
+        )
+        if hasattr(weighted_features, 'toarray'):
+            weighted_features = weighted_features.toarray()
+        return self.pca.transform(weighted_features)
+    
+    # Above this share of changed rows a full retrain is cheaper than patching
+    _max_incremental_fraction = 0.2
+    # Above this share of removed rows kept as tombstones, a patch rewrites the artifacts without them
+    _max_removed_fraction = 0.05
+    
+    @_holding_write_lock
+    def fit(self, schools_data: "pd.DataFrame", force_retrain=False) -> str:
+        """Prepare the recommender with transformed and weighted features
+        
+        Returns:
+            'unchanged', 'incremental' or 'full'
+        """
         try:
-            # Check if we can load existing models
+            # The fingerprint only describes schools_data if it was parsed by load_data()
+            source_fingerprint = self.source_fingerprint if schools_data is self.schools_df else None
+            
+            # Check if we can load existing models and patch them row by row
             if not force_retrain and self.load_models():
-                if not self.needs_retraining(schools_data):
-                    print("Using existing models - no retraining needed")
-                    return
+                changes = self._diff_rows(schools_data)
+                if changes is not None:
+                    appended, removed = changes
+                    n_changed = len(appended) + len(removed)
+                    if n_changed == 0:
+                        if source_fingerprint is not None and source_fingerprint != self.snapshot.source_fingerprint:
+                            # Same rows, new file (e.g. touched): record the fingerprint
+                            self._apply_changes(appended, removed, source_fingerprint)
+                        elif self.settings_changed():
+                            # Same rows, other storage precision: rewrite the artifacts only
+                            self._apply_changes(appended, removed, self.snapshot.source_fingerprint)
+                        print("Using existing models - no retraining needed")
+                        return 'unchanged'
+                    if n_changed <= self._max_incremental_fraction * max(1, self.snapshot.n_schools):
+                        result = self._apply_changes(appended, removed, source_fingerprint)
+                        if result["mode"] == "incremental":
+                            print(f"Applied incremental update: {result}")
+                            return 'incremental'
             
             print("Training new models...")
-            self.schools_df = schools_data.copy()
+            # fit() never mutates the frame, so it is kept without a copy
+            self.schools_df = schools_data
+            self.source_fingerprint = source_fingerprint
             
             # Validate required columns exist
             required_columns = self.numerical_features + self.categorical_features
@@ -172,79 +647,772 @@ class HybridSchoolRecommender:
             if missing_columns:
                 raise ValueError(f"Missing required columns: {missing_columns}")
             
+            # Fit fresh transformers so the published snapshot's ones stay untouched
+            self.preprocessor, self.pca = self._make_transformers()
+            
             # Transform features
             features_matrix = self.preprocessor.fit_transform(self.schools_df)
             
-            # Convert sparse matrix to dense if necessary
-            if hasattr(features_matrix, 'toarray'):
-                features_matrix = features_matrix.toarray()
-                
-            # Get feature names
-            feature_names = (
-                self.numerical_features +
-                self.preprocessor.named_transformers_['cat'].get_feature_names_out(self.categorical_features).tolist()
-            )
+            # Apply feature weights (on the sparse encoding, if that is what came out)
+            weighted_features = self._apply_feature_weights(features_matrix, self._get_feature_names())
             
-            # Apply feature weights
-            weighted_features = self._apply_feature_weights(features_matrix, feature_names)
+            # Convert sparse matrix to dense if necessary
+            if hasattr(weighted_features, 'toarray'):
+                weighted_features = weighted_features.toarray()
             
             # Apply PCA
             self.features_matrix = self.pca.fit_transform(weighted_features)
             
+            # Build the neighbour search index over the reduced space
+            self.neighbor_index = self._build_neighbor_index(self.features_matrix)
+            
             # Update training timestamp
             self.last_training_time = datetime.now()
             
             # Save the models
             self.save_models()
             
-            print(f"Training completed. Reduced dimensions from {features_matrix.shape[1]} to {self.features_matrix.shape[1]}")
+            # Publish the freshly trained model to the request path, mapped
+            # from disk exactly as other worker processes will see it
+            if not self.load_models():
+                raise Exception("Saved models could not be loaded back")
+            
+            print(f"Training completed. Reduced dimensions from {features_matrix.shape[1]} to {self.snapshot.features_matrix.shape[1]}")
+            return 'full'
+            
+        except Exception as e:
+            raise Exception(f"Training failed: {str(e)}")
+
+    def _read_source(self, chunk_rows: int, dtype: Dict = None):
+        """The source CSV in chunks of at most ``chunk_rows`` rows, with the admin overrides applied
+        
+        Overridden source rows are dropped chunk by chunk; the upserted rows
+        come last, as one more chunk.
+        """
+        import pandas as pd
+        
+        overrides = self.overrides.load()
+        first_chunk = None
+        for chunk in pd.read_csv(self.data_path, chunksize=chunk_rows, dtype=dtype):
+            if first_chunk is None:
+                first_chunk = chunk
+            chunk = self.overrides.drop_overridden(chunk, overrides)
+            if len(chunk):
+                yield chunk
+        if first_chunk is not None and overrides['upserts']:
+            yield self.overrides.upserted_rows(overrides, first_chunk)
+    
+    def _scan_source(self, chunk_rows: int):
+        """First streaming pass: row count, column dtypes, scaler statistics and category sets
+        
+        Returns:
+            (n_rows, dtypes, preprocessor) with the preprocessor fitted to the
+            whole file
+        """
+        from sklearn.preprocessing import StandardScaler
+        
+        scaler = StandardScaler()
+        categories = {feature: set() for feature in self.categorical_features}
+        has_nulls = dict.fromkeys(self.categorical_features, False)
+        seen_dtypes: Dict[str, set] = {}
+        first_chunk = None
+        n_rows = 0
+        for chunk in self._read_source(chunk_rows):
+            if first_chunk is None:
+                required_columns = self.numerical_features + self.categorical_features
+                missing_columns = [col for col in required_columns if col not in chunk.columns]
+                if missing_columns:
+                    raise ValueError(f"Missing required columns: {missing_columns}")
+                first_chunk = chunk
+            for name, dtype in chunk.dtypes.items():
+                seen_dtypes.setdefault(name, set()).add(dtype)
+            scaler.partial_fit(chunk[self.numerical_features])
+            for feature in self.categorical_features:
+                categories[feature].update(chunk[feature].dropna().unique().tolist())
+                has_nulls[feature] |= bool(chunk[feature].isna().any())
+            n_rows += len(chunk)
+        if not n_rows:
+            raise ValueError(f"No schools in {self.data_path}")
+        
+        # Chunks are parsed independently; settle on the dtype a whole-file read infers
+        dtypes = {}
+        for name, kinds in seen_dtypes.items():
+            if len(kinds) == 1:
+                dtypes[name] = kinds.pop()
+            elif all(dtype.kind in 'biuf' for dtype in kinds):
+                dtypes[name] = np.dtype(np.float64)
+            else:
+                dtypes[name] = np.dtype(object)
+        
+        # Fix the encoder's categories to the whole file (NaN last, as OneHotEncoder
+        # orders them), fit the layout on one chunk and install the global statistics
+        preprocessor, _ = self._make_transformers()
+        preprocessor.set_params(cat__categories=[
+            sorted(categories[feature]) + ([np.nan] if has_nulls[feature] else [])
+            for feature in self.categorical_features
+        ])
+        preprocessor.fit(first_chunk)
+        fitted_scaler = preprocessor.named_transformers_['num']
+        for attribute in ('mean_', 'var_', 'scale_', 'n_samples_seen_'):
+            setattr(fitted_scaler, attribute, getattr(scaler, attribute))
+        return n_rows, dtypes, preprocessor
+    
+    @_holding_write_lock
+    def fit_streaming(self, chunk_rows: int = 100_000) -> str:
+        """Full retrain from the source CSV without holding the catalog in memory
+        
+        The CSV is parsed twice, ``chunk_rows`` at a time. The first pass
+        collects the row count, column dtypes, scaler statistics and category
+        sets. The second encodes and weights each chunk (sparse-aware),
+        appends it to the columnar table and the row hashes, and spills the
+        weighted rows to a temporary on-disk matrix. An ``IncrementalPCA`` is
+        then fitted over the spill, which is finally projected into the
+        preallocated, memory-mapped feature matrix. Peak memory follows
+        ``chunk_rows`` and the per-row indexes, not the number of columns
+        times the catalog size.
+        
+        Args:
+            chunk_rows: Rows parsed and transformed at once
+            
+        Returns:
+            'full'
+        """
+        from sklearn.decomposition import IncrementalPCA
+        
+        tmp_directory = None
+        try:
+            print(f"Training new models from {self.data_path} in chunks of {chunk_rows} rows...")
+            source_fingerprint = self._source_fingerprint()
+            n_rows, dtypes, self.preprocessor = self._scan_source(chunk_rows)
+            feature_names = self._get_feature_names()
+            
+            model_version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+            paths = self._get_artifact_paths(model_version)
+            tmp_directory = f"{paths['directory']}.tmp"
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            os.makedirs(tmp_directory)
+            
+            # Second pass: table, row hashes and weighted features, chunk by chunk
+            spill_path = os.path.join(tmp_directory, 'weighted_features.npy')
+            weighted = np.lib.format.open_memmap(spill_path, mode='w+', dtype=np.float64,
+                                                 shape=(n_rows, len(feature_names)))
+            hashes = np.lib.format.open_memmap(os.path.join(tmp_directory, 'row_hashes.npy'), mode='w+',
+                                               dtype=np.uint64, shape=(n_rows,))
+            writer = ColumnarWriter(os.path.join(tmp_directory, 'schools'))
+            start = 0
+            for chunk in self._read_source(chunk_rows, dtype=dtypes):
+                end = start + len(chunk)
+                if end > n_rows:
+                    raise ValueError(f"{self.data_path} changed while training")
+                writer.append(chunk)
+                hashes[start:end] = row_hashes(chunk)
+                block = self._apply_feature_weights(self.preprocessor.transform(chunk), feature_names)
+                weighted[start:end] = block.toarray() if hasattr(block, 'toarray') else block
+                start = end
+            writer.close()
+            hashes.flush()
+            if start != n_rows:
+                raise ValueError(f"{self.data_path} changed while training")
+            
+            # Keep every component while fitting (the first batch must cover all
+            # features), then cut to the explained variance PCA is configured for
+            _, pca_template = self._make_transformers()
+            pca = IncrementalPCA()
+            batch_rows = max(chunk_rows, len(feature_names))
+            for batch_start in range(0, n_rows, batch_rows):
+                pca.partial_fit(weighted[batch_start:batch_start + batch_rows])
+            cumulative = np.cumsum(pca.explained_variance_ratio_)
+            n_components = min(int(np.searchsorted(cumulative, pca_template.n_components, side='right')) + 1,
+                               len(cumulative))
+            for attribute in ('components_', 'explained_variance_', 'explained_variance_ratio_', 'singular_values_'):
+                setattr(pca, attribute, getattr(pca, attribute)[:n_components])
+            pca.n_components = pca.n_components_ = n_components
+            self.pca = pca
+            
+            # Project straight into the preallocated matrix readers will map
+            dtype = np.float64 if self.storage_precision == 'float64' else np.float32
+            features_matrix = np.lib.format.open_memmap(os.path.join(tmp_directory, 'features_matrix.npy'),
+                                                        mode='w+', dtype=dtype, shape=(n_rows, n_components))
+            for batch_start in range(0, n_rows, batch_rows):
+                features_matrix[batch_start:batch_start + batch_rows] = pca.transform(
+                    weighted[batch_start:batch_start + batch_rows])
+            features_matrix.flush()
+            del weighted
+            os.remove(spill_path)
+            
+            self.neighbor_index = self._build_neighbor_index(features_matrix)
+            joblib.dump(self.neighbor_index, os.path.join(tmp_directory, 'neighbor_index.joblib'))
+            self._write_transformers(tmp_directory)
+            self._write_search_indexes(tmp_directory, features_matrix, ColumnarStore(os.path.join(tmp_directory, 'schools')))
+            os.rename(tmp_directory, paths['directory'])
+            tmp_directory = None
+            
+            # Nothing of the catalog stays resident; load_data() parses it again if asked
+            self.schools_df = None
+            self.features_matrix = features_matrix
+            self.source_fingerprint = source_fingerprint
+            self.last_training_time = datetime.now()
+            self.save_models(artifact_version=model_version)
+            if not self.load_models():
+                raise Exception("Saved models could not be loaded back")
+            
+            print(f"Training completed. Reduced dimensions from {len(feature_names)} to {n_components}")
+            return 'full'
             
         except Exception as e:
             raise Exception(f"Training failed: {str(e)}")
+        finally:
+            if tmp_directory is not None:
+                shutil.rmtree(tmp_directory, ignore_errors=True)
 
-    def get_recommendations(self, school_ids: List[str], n_recommendations: int = 5) -> List[Dict]:
-        """Get recommendations based on school IDs"""
-        logger.info(f"Getting recommendations for schools: {school_ids}")
+    def _detect_drift(self, numerical_values: np.ndarray, changed_rows: "pd.DataFrame" = None) -> Optional[str]:
+        """Reason the fitted transformers no longer describe the data, or None
+        
+        Args:
+            numerical_values: Numerical features of the full school table after the change
+            changed_rows: Rows that were added or edited, checked for unseen categories
+        """
+        encoder = self.preprocessor.named_transformers_['cat']
+        if changed_rows is not None and len(changed_rows):
+            for feature, categories in zip(self.categorical_features, encoder.categories_):
+                unseen = set(changed_rows[feature].dropna()) - set(categories)
+                if unseen:
+                    return f"new {feature} values: {sorted(unseen)}"
+        
+        scaler = self.preprocessor.named_transformers_['num']
+        mean_shift = np.abs(numerical_values.mean(axis=0) - scaler.mean_) / scaler.scale_
+        scale_shift = np.abs(numerical_values.std(axis=0) / scaler.scale_ - 1)
+        for feature, mean_delta, scale_delta in zip(self.numerical_features, mean_shift, scale_shift):
+            if mean_delta > self.drift_threshold or scale_delta > self.drift_threshold:
+                return f"{feature} statistics shifted (mean {mean_delta:.2f} sd, scale {scale_delta:.0%})"
+        return None
+    
+    def _numerical_values(self, records: ColumnarStore, positions: np.ndarray, appended: "pd.DataFrame") -> np.ndarray:
+        """Numerical features of the stored rows at ``positions`` followed by the appended rows"""
+        stored = np.column_stack([np.asarray(records.column(name), dtype=float)[positions]
+                                  for name in self.numerical_features])
+        return np.vstack([stored, appended[self.numerical_features].to_numpy(dtype=float)])
+    
+    def _check_required_columns(self, columns):
+        required_columns = ['name'] + self.numerical_features + self.categorical_features
+        missing_columns = [col for col in required_columns if col not in columns]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
+    
+    def _apply_changes(self, appended: "pd.DataFrame", removed_positions: List[int],
+                       source_fingerprint: Dict = None) -> Dict:
+        """Patch the published model by removing rows and appending new ones
+        
+        Only appended rows are transformed, with the snapshot's fitted
+        preprocessor and PCA, and the new artifact version is derived from
+        the previous one rather than rewritten: see ``_write_patch``. Once
+        removed rows make up more than ``_max_removed_fraction`` of the
+        artifacts (or the storage precision changed), they are rewritten
+        without them instead, still without refitting.
+        
+        Args:
+            appended: Rows to add at the end of the table; cast to the table's dtypes
+            removed_positions: Row positions to drop
+            source_fingerprint: Fingerprint of the source and overrides the result matches, if any
+            
+        Returns:
+            ``{"mode": "incremental"}``, or ``{"mode": "retrain", "reason": ...}``
+            with nothing changed if the rows drifted from the fitted transformers
+            
+        Raises:
+            ValueError: If appended rows lack required columns or do not fit the table's dtypes
+        """
+        with self._writing():
+            snapshot = self.snapshot
+            if snapshot is None:
+                raise ValueError("Model not loaded")
+            
+            # Patch with the transformers stored with the snapshot's own artifacts
+            self.preprocessor, self.pca = snapshot.preprocessor, snapshot.pca
+            
+            self._check_required_columns(appended.columns)
+            records = snapshot.records
+            appended = conform_frame(appended, records.column_names, records.numeric_dtypes)
+            tombstones = np.union1d(snapshot.tombstones, np.asarray(removed_positions, dtype=np.int64))
+            live_positions = np.setdiff1d(snapshot.live_positions, tombstones, assume_unique=True)
+            
+            drift = self._detect_drift(self._numerical_values(records, live_positions, appended), appended)
+            if drift:
+                logger.info(f"Drift detected ({drift}), incremental update not applicable")
+                return {"mode": "retrain", "reason": drift}
+            
+            # Transform only the new rows; untouched rows keep their reduced vectors
+            new_rows = (self._transform_rows(appended) if len(appended)
+                        else np.empty((0, snapshot.features_matrix.shape[1])))
+            new_rows = new_rows.astype(snapshot.features_matrix.dtype)
+            
+            self.source_fingerprint = source_fingerprint
+            if (snapshot.row_hashes is None or self.settings_changed()
+                    or len(tombstones) > self._max_removed_fraction * (snapshot.n_rows + len(appended))):
+                self._write_compacted(snapshot, live_positions, appended, new_rows)
+            else:
+                self._write_patch(snapshot, appended, new_rows, tombstones)
+            return {"mode": "incremental"}
+    
+    def _write_compacted(self, snapshot: ModelSnapshot, live_positions: np.ndarray,
+                         appended: "pd.DataFrame", new_rows: np.ndarray):
+        """Rewrite and publish the artifacts with only the live and appended rows (no refit)"""
+        import pandas as pd
+        
+        self.schools_df = pd.concat([snapshot.schools_df.iloc[live_positions], appended], ignore_index=True)
+        self.features_matrix = np.vstack([snapshot.features_matrix[live_positions], new_rows])
+        self.neighbor_index = self._build_neighbor_index(self.features_matrix)
+        self.save_models(refitted=False)
+        if not self.load_models():
+            raise Exception("Updated models could not be loaded back")
+    
+    def _write_patch(self, snapshot: ModelSnapshot, appended: "pd.DataFrame", new_rows: np.ndarray,
+                     tombstones: np.ndarray):
+        """Publish a new artifact version derived from the snapshot's
+        
+        The transformers are hard-linked and the matrix, table and row hashes
+        are copied with the new rows appended, all without decoding or
+        re-encoding stored rows. Removed rows are recorded as tombstones;
+        the neighbour, spatial and attribute indexes and the quantized codes
+        are extended with the appended rows instead of being rebuilt. The new
+        snapshot is assembled from these pieces and the previous snapshot's
+        name index and row norms, not loaded back from disk.
+        """
+        version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        previous = self._get_artifact_paths(snapshot.model_version)
+        paths = self._get_artifact_paths(version)
+        tmp_directory = f"{paths['directory']}.tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        
+        def tmp_path(name):
+            return os.path.join(tmp_directory, os.path.basename(paths[name]))
+        
+        n_previous = snapshot.n_rows
+        n_rows = n_previous + len(appended)
+        try:
+            for name in ('preprocessor', 'pca'):
+                link_or_copy(previous[name], tmp_path(name))
+            features_matrix = np.lib.format.open_memmap(tmp_path('features_matrix'), mode='w+',
+                                                        dtype=snapshot.features_matrix.dtype,
+                                                        shape=(n_rows, snapshot.features_matrix.shape[1]))
+            features_matrix[:n_previous] = snapshot.features_matrix
+            features_matrix[n_previous:] = new_rows
+            features_matrix.flush()
+            hashes = np.lib.format.open_memmap(tmp_path('row_hashes'), mode='w+', dtype=np.uint64, shape=(n_rows,))
+            hashes[:n_previous] = snapshot.row_hashes
+            hashes[n_previous:] = row_hashes(appended)
+            hashes.flush()
+            del features_matrix, hashes
+            np.save(tmp_path('tombstones'), tombstones)
+            extend_columnar(previous['schools'], tmp_path('schools'), appended)
+            
+            features_matrix = np.load(tmp_path('features_matrix'), mmap_mode='r')
+            neighbor_index = snapshot.neighbor_index.extend(features_matrix)
+            joblib.dump(neighbor_index, tmp_path('neighbor_index'))
+            geo_index = None
+            if snapshot.geo_index is not None:
+                geo_index = snapshot.geo_index.extend(
+                    np.concatenate([snapshot.geo_index.latitudes, appended['latitude'].to_numpy(dtype=float)]),
+                    np.concatenate([snapshot.geo_index.longitudes, appended['longitude'].to_numpy(dtype=float)]))
+                geo_index.save(tmp_path('geo_index'))
+            filter_index = None
+            if snapshot.filter_index is not None:
+                filter_index = snapshot.filter_index.extend(
+                    {name: appended[name].tolist() for name in FILTER_FIELDS if name in appended.columns})
+                filter_index.save(tmp_path('filter_index'))
+            quantized = snapshot.quantized.extend(new_rows) if snapshot.quantized is not None else None
+            if quantized is not None:
+                quantized.save(tmp_directory)
+            os.rename(tmp_directory, paths['directory'])
+        except BaseException:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            raise
+        
+        metadata = self.save_models(refitted=False, artifact_version=version)
+        
+        # Map the published files (not the temporary paths) for the new snapshot
+        features_matrix = np.load(paths['features_matrix'], mmap_mode='r')
+        records = ColumnarStore(paths['schools'])
+        if quantized is not None:
+            quantized = QuantizedMatrix.load(paths['directory'])
+        self._swap_snapshot(self._build_snapshot(
+            load_transformers=functools.partial(self._load_transformers, paths['preprocessor'], paths['pca']),
+            features_matrix=features_matrix,
+            records=records,
+            neighbor_index=neighbor_index.attach(features_matrix),
+            feature_weights=metadata['feature_weights'],
+            last_training_time=metadata['last_training_time'],
+            numerical_features=metadata['numerical_features'],
+            categorical_features=metadata['categorical_features'],
+            model_version=metadata['model_version'],
+            source_fingerprint=metadata['source_fingerprint'],
+            row_hashes=np.load(paths['row_hashes'], mmap_mode='r'),
+            geo_index=geo_index,
+            filter_index=filter_index,
+            quantized=quantized,
+            feature_space=metadata['feature_space'],
+            tombstones=tombstones,
+            name_positions=self._patch_name_positions(snapshot, tombstones, appended),
+            row_norms=np.concatenate([snapshot.row_norms, np.einsum('ij,ij->i', new_rows, new_rows)]),
+            signature=artifact_signature(self._get_model_paths()['metadata'])
+        ))
+        logger.info(f"Patched model {snapshot.model_version} into {version}: "
+                    f"{len(appended)} rows appended, {len(tombstones)} removed rows kept as tombstones")
+    
+    @staticmethod
+    def _patch_name_positions(snapshot: ModelSnapshot, tombstones: np.ndarray,
+                              appended: "pd.DataFrame") -> Dict[str, Tuple[int, ...]]:
+        """The snapshot's name index without the newly removed rows and with the appended ones"""
+        removed = set(np.setdiff1d(tombstones, snapshot.tombstones, assume_unique=True).tolist())
+        name_positions = dict(snapshot.name_positions)
+        for name in {snapshot.records.column('name', position, position + 1)[0] for position in removed}:
+            remaining = tuple(position for position in name_positions[name] if position not in removed)
+            if remaining:
+                name_positions[name] = remaining
+            else:
+                del name_positions[name]
+        for offset, name in enumerate(appended['name'].tolist(), start=snapshot.n_rows):
+            name_positions[name] = name_positions.get(name, ()) + (offset,)
+        return name_positions
+    
+    def _latest_snapshot(self) -> ModelSnapshot:
+        """The newest published snapshot; updates patch this one, with its own transformers"""
+        self.refresh_if_stale(min_interval=0)
+        if self.snapshot is None:
+            raise ValueError("Model not loaded")
+        return self.snapshot
+    
+    def upsert_schools(self, schools_data: "pd.DataFrame") -> Dict:
+        """Add or replace schools (matched by name) without refitting
+        
+        Only the given rows are transformed with the fitted preprocessor and
+        PCA. Every existing row carrying an upserted name is replaced. The
+        edit is also recorded in the admin overrides, so retraining from the
+        source keeps it. If the rows carry category values the encoder has
+        never seen, or shift the numerical statistics beyond
+        ``drift_threshold``, nothing is patched and the result's mode is
+        'retrain': the model must be retrained (which applies the edit).
+        
+        Returns:
+            Summary with the update mode and the affected school counts
+            
+        Raises:
+            ValueError: If rows lack required columns or hold values of the wrong type
+            ModelBusyError: If another process is training or updating the model
+        """
+        schools_data = schools_data.drop_duplicates('name', keep='last') if 'name' in schools_data.columns else schools_data
+        with self._writing(blocking=False):
+            # Names resolve against the snapshot being patched, never an older one
+            snapshot = self._latest_snapshot()
+            self._check_required_columns(schools_data.columns)
+            records = snapshot.records
+            schools_data = conform_frame(schools_data, records.column_names, records.numeric_dtypes)
+            existing = [name for name in schools_data['name'] if name in snapshot.name_positions]
+            removed_positions = [position for name in existing for position in snapshot.name_positions[name]]
+            overrides_version = self.overrides.record(upserts=schools_data.to_dict('records'))
+            result = self._apply_changes(schools_data, removed_positions,
+                                         self._with_overrides(snapshot.source_fingerprint, overrides_version))
+        return {**result, "updated": len(existing), "added": len(schools_data) - len(existing)}
+    
+    def remove_schools(self, names: List[str]) -> Dict:
+        """Remove schools by name without refitting (unless statistics drift)
+        
+        Like upserts, removals are recorded in the admin overrides.
+        
+        Returns:
+            Summary with the update mode, removed count and unknown names
+            
+        Raises:
+            ModelBusyError: If another process is training or updating the model
+        """
+        import pandas as pd
+        
+        with self._writing(blocking=False):
+            snapshot = self._latest_snapshot()
+            known = [name for name in names if name in snapshot.name_positions]
+            unknown = [name for name in names if name not in snapshot.name_positions]
+            if not known:
+                return {"mode": "noop", "removed": 0, "unknown": unknown}
+            removed_positions = sorted({position for name in known for position in snapshot.name_positions[name]})
+            overrides_version = self.overrides.record(removed=known)
+            # Cast to the table's dtypes by _apply_changes like any other appended rows
+            no_rows = pd.DataFrame(columns=snapshot.records.column_names)
+            result = self._apply_changes(no_rows, removed_positions,
+                                         self._with_overrides(snapshot.source_fingerprint, overrides_version))
+        return {**result, "removed": len(removed_positions), "unknown": unknown}
+    
+    def get_recommendations(self, school_ids: List[str], n_recommendations: int = 5,
+                            location: Optional[Tuple[float, float]] = None,
+                            max_distance_km: Optional[float] = None,
+                            filters: Optional[Dict] = None) -> List[Dict]:
+        """Get recommendations based on school IDs
+        
+        Args:
+            school_ids: Names of the schools to base recommendations on
+            n_recommendations: Number of recommendations to return
+            location: Optional (latitude, longitude) of the user; requires max_distance_km
+            max_distance_km: Only recommend schools within this distance of ``location``
+            filters: Optional hard constraints, e.g. ``{'type': ['Private'],
+                'tuition': (None, 300000)}``; see ``AttributeFilterIndex.select``
+        """
+        logger.debug("Getting recommendations for schools: %s", school_ids)
         
         if not isinstance(school_ids, list) or len(school_ids) == 0:
             raise ValueError("school_ids must be a non-empty list")
+        
+        # Read the resident model once so a concurrent swap can't mix versions
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise ValueError("Model not loaded")
+        features_matrix = snapshot.features_matrix
 
-        # Get indices of input schools
-        input_indices = []
-        for school_id in school_ids:
-            try:
-                idx = self.schools_df[self.schools_df['name'] == school_id].index[0]
-                input_indices.append(idx)
-                logger.info(f"Found index {idx} for school {school_id}")
-            except (IndexError, KeyError) as e:
-                logger.error(f"School not found: {school_id}. Error: {str(e)}")
-                continue
+        with metrics.span('resolve_inputs'):
+            input_indices, excluded_positions = self._resolve_inputs(snapshot, school_ids)
 
         if not input_indices:
             raise ValueError("No valid schools found")
 
         # Calculate average feature vector for input schools
-        average_features = np.mean([self.features_matrix[idx] for idx in input_indices], axis=0)
+        average_features = features_matrix[input_indices].mean(axis=0)
+        return self._recommend_from_centroid(
+            snapshot, average_features, excluded_positions, n_recommendations, location, max_distance_km, filters
+        )
+    
+    def update_profile(self, profile: Optional[Dict], interactions: List[Tuple[str, str, object]],
+                       max_entries: Optional[int] = None) -> Tuple[Dict, List[str]]:
+        """Fold (school, interaction type, timestamp) tuples into a user profile
         
-        # Calculate similarity scores using euclidean distance
-        distances = np.linalg.norm(self.features_matrix - average_features, axis=1)
+        Costs O(d) per interaction whatever the length of the user's history.
+        A repeated (school, type) pair replaces its earlier contribution, and
+        with ``max_entries`` only the newest pairs are kept. Pass
+        ``profile=None`` with the latest interaction per pair to (re)build a
+        profile, e.g. after ``StaleProfileError``.
         
-        # Convert distances to similarities (inverse of distance)
-        similarities = 1 / (1 + distances)
-        
-        # Get top similar schools
-        school_indices = similarities.argsort()[::-1]
-        
-        # Filter out input schools and create recommendations
-        recommended_schools = []
-        for idx in school_indices:
-            if self.schools_df.iloc[idx]['name'] not in school_ids:
-                school_data = self.schools_df.iloc[idx].to_dict()
-                school_data['id'] = str(idx)
-                school_data['similarity_score'] = float(similarities[idx])
-                recommended_schools.append(school_data)
-                if len(recommended_schools) >= n_recommendations:
-                    break
+        Returns:
+            (profile, unknown school names); the profile is None if no
+            interaction named a known school
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise ValueError("Model not loaded")
+        
+        def vector_of(school_name):
+            positions = snapshot.name_positions.get(school_name)
+            return None if positions is None else snapshot.features_matrix[positions[0]]
+        
+        return fold_interactions(profile, interactions, vector_of, snapshot.feature_space,
+                                 self.interaction_weights, self.profile_half_life_days * 86400, max_entries)
+    
+    def get_profile_recommendations(self, profile: Dict, n_recommendations: int = 5,
+                                    location: Optional[Tuple[float, float]] = None,
+                                    max_distance_km: Optional[float] = None,
+                                    filters: Optional[Dict] = None) -> List[Dict]:
+        """Recommendations scored from a profile built by ``update_profile``
+        
+        The profile's weighted centroid is used as is, so the cost does not
+        depend on the number of interactions; schools in the profile are
+        excluded.
+        
+        Raises:
+            StaleProfileError: If the model was refitted since the profile was built
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise ValueError("Model not loaded")
+        centroid = profile_centroid(profile, snapshot.feature_space)
+        with metrics.span('resolve_inputs'):
+            _, excluded_positions = self._resolve_inputs(snapshot, profile['schools'])
+        return self._recommend_from_centroid(
+            snapshot, centroid.astype(snapshot.features_matrix.dtype), excluded_positions, n_recommendations,
+            location, max_distance_km, filters
+        )
+    
+    def _recommend_from_centroid(self, snapshot: ModelSnapshot, centroid: np.ndarray, excluded_positions,
+                                 n_recommendations: int, location: Optional[Tuple[float, float]],
+                                 max_distance_km: Optional[float], filters: Optional[Dict]) -> List[Dict]:
+        """Closest schools to a query vector, optionally constrained by location and attributes"""
+        if location is not None or filters:
+            return self._get_constrained_recommendations(
+                snapshot, centroid, excluded_positions, n_recommendations,
+                location, max_distance_km, filters
+            )
+        
+        # Closest schools by euclidean distance, excluded rows skipped
+        top_indices, distances = self._search(snapshot, centroid, n_recommendations, excluded_positions)
+        
+        with metrics.span('format'):
+            recommended_schools = [
+                self._format_recommendation(snapshot, idx, distance)
+                for idx, distance in zip(top_indices, distances)
+            ]
 
-        logger.info(f"Generated {len(recommended_schools)} recommendations")
-        return recommended_schools
\ No newline at end of file
+        logger.debug("Generated %d recommendations", len(recommended_schools))
+        return recommended_schools
+    
+    def _get_constrained_recommendations(self, snapshot: ModelSnapshot, centroid: np.ndarray, excluded_positions,
+                                         n_recommendations: int, location: Optional[Tuple[float, float]],
+                                         max_distance_km: Optional[float], filters: Optional[Dict]) -> List[Dict]:
+        """Score only the schools passing the attribute filters and within the radius
+        
+        The filter bitmaps and the spatial index narrow the candidates before
+        any distance is computed, so the cost follows the number of matching
+        schools rather than the catalog size.
+        """
+        if filters and snapshot.filter_index is None:
+            raise ValueError("Attribute filters are not available")
+        if location is not None:
+            if snapshot.geo_index is None:
+                raise ValueError("School locations are not available")
+            if max_distance_km is None or max_distance_km <= 0:
+                raise ValueError("max_distance_km must be positive")
+        
+        with metrics.span('index_lookup'):
+            positions = None
+            distances_km = None
+            if filters:
+                positions = snapshot.filter_index.select(filters)
+            if location is not None:
+                nearby, distances_km = snapshot.geo_index.query(location[0], location[1], max_distance_km)
+                if positions is not None:
+                    # Both are sorted row positions
+                    keep = np.isin(nearby, positions, assume_unique=True)
+                    nearby, distances_km = nearby[keep], distances_km[keep]
+                positions = nearby
+            
+            keep = ~np.isin(positions, list(excluded_positions))
+            positions = positions[keep]
+            if distances_km is not None:
+                distances_km = distances_km[keep]
+        logger.debug("Scoring %d of %d schools matching the constraints", len(positions), snapshot.n_schools)
+        
+        with metrics.span('distance'):
+            # Same expansion as the batch path, restricted to the candidate rows
+            candidates = snapshot.features_matrix[positions]
+            squared = snapshot.row_norms[positions] - 2 * (candidates @ centroid) + centroid @ centroid
+            distances = np.sqrt(np.maximum(squared, 0))
+        
+        with metrics.span('top_k'):
+            top_offsets = select_top_k(distances, (), n_recommendations)
+        
+        with metrics.span('format'):
+            recommended_schools = []
+            for offset in top_offsets:
+                school_data = self._format_recommendation(snapshot, positions[offset], distances[offset])
+                if distances_km is not None:
+                    school_data['distance_km'] = round(float(distances_km[offset]), 3)
+                recommended_schools.append(school_data)
+        
+        logger.debug("Generated %d recommendations", len(recommended_schools))
+        return recommended_schools
+    
+    def get_recommendations_batch(self, profiles: List[List[str]], n_recommendations: int = 5,
+                                  max_block_bytes: int = 64 * 1024 * 1024) -> List[Optional[List[Dict]]]:
+        """Get recommendations for many profiles at once
+        
+        Args:
+            profiles: One list of school names per user
+            n_recommendations: Number of recommendations per profile
+            max_block_bytes: Upper bound on the distance block computed at once
+            
+        Returns:
+            One list of recommendations per profile, or None for profiles
+            without any known school
+        """
+        if not isinstance(profiles, list) or len(profiles) == 0:
+            raise ValueError("profiles must be a non-empty list")
+        
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise ValueError("Model not loaded")
+        features_matrix = snapshot.features_matrix
+        
+        resolved = [self._resolve_inputs(snapshot, school_ids) for school_ids in profiles]
+        valid = [i for i, (input_indices, _) in enumerate(resolved) if input_indices]
+        results: List[Optional[List[Dict]]] = [None] * len(profiles)
+        logger.info(f"Scoring {len(valid)} of {len(profiles)} profiles in batch")
+        if not valid:
+            return results
+        
+        # One centroid per profile, stacked into a query matrix
+        centroids = np.vstack([features_matrix[resolved[i][0]].mean(axis=0) for i in valid])
+        
+        # Tree, approximate and quantized backends answer each centroid through the index
+        if snapshot.neighbor_index.name != 'brute' or snapshot.quantized is not None:
+            for offset, profile_idx in enumerate(valid):
+                top_indices, distances = self._search(
+                    snapshot, centroids[offset], n_recommendations, resolved[profile_idx][1]
+                )
+                results[profile_idx] = [
+                    self._format_recommendation(snapshot, idx, distance)
+                    for idx, distance in zip(top_indices, distances)
+                ]
+            return results
+        
+        # Bound the (block x n_rows) distance matrix held in memory at once
+        block_rows = max(1, max_block_bytes // (features_matrix.itemsize * max(1, snapshot.n_rows)))
+        for start in range(0, len(valid), block_rows):
+            block = slice(start, start + block_rows)
+            # ||a - b||^2 = ||a||^2 - 2a.b + ||b||^2, with a.b as a single matrix product
+            centroid_norms = np.einsum('ij,ij->i', centroids[block], centroids[block])
+            squared = centroids[block] @ features_matrix.T
+            squared *= -2
+            squared += centroid_norms[:, None]
+            squared += snapshot.row_norms[None, :]
+            np.maximum(squared, 0, out=squared)
+            distances = np.sqrt(squared, out=squared)
+            
+            for offset, row in enumerate(distances):
+                profile_idx = valid[start + offset]
+                top_indices = select_top_k(row, resolved[profile_idx][1], n_recommendations)
+                results[profile_idx] = [
+                    self._format_recommendation(snapshot, idx, row[idx])
+                    for idx in top_indices
+                ]
+        
+        return results
+    
+    def _search(self, snapshot: ModelSnapshot, centroid: np.ndarray, k: int, excluded_positions):
+        """Nearest rows to one centroid
+        
+        Brute-force search runs sharded over the scoring threads, on the
+        quantized codes if present; other backends answer through their index.
+        """
+        if snapshot.neighbor_index.name != 'brute':
+            with metrics.span('index_lookup'):
+                return snapshot.neighbor_index.query(centroid, k, excluded_positions)
+        if snapshot.quantized is not None:
+            return snapshot.quantized.query(
+                centroid, k, excluded_positions, snapshot.features_matrix, self.rerank_candidates, self.scorer
+            )
+        positions, squared = self.scorer.top_k(
+            snapshot.n_rows,
+            euclidean_shard_scorer(snapshot.features_matrix, snapshot.row_norms, centroid),
+            k,
+            excluded_positions
+        )
+        return positions, np.sqrt(squared)
+    
+    @staticmethod
+    def _resolve_inputs(snapshot: ModelSnapshot, school_ids: List[str]):
+        """Row positions of the input schools, and the rows to exclude: theirs, every row sharing their names, removed rows"""
+        input_indices = []
+        excluded_positions = set(snapshot.removed_positions)
+        for school_id in school_ids:
+            positions = snapshot.name_positions.get(school_id)
+            if positions is None:
+                logger.debug("School not found: %s", school_id)
+                continue
+            input_indices.append(positions[0])
+            excluded_positions.update(positions)
+            logger.debug("Found index %d for school %s", positions[0], school_id)
+        return input_indices, excluded_positions
+    
+    @staticmethod
+    def _format_recommendation(snapshot: ModelSnapshot, idx: int, distance: float) -> Dict:
+        """Build the response payload for one recommended row"""
+        school_data = dict(snapshot.records[idx])
+        school_data['id'] = str(idx)
+        # Convert distances to similarities (inverse of distance)
+        school_data['similarity_score'] = float(1 / (1 + distance))
+        return school_data
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Tuple
+import os
+import threading
+
+import numpy as np
+
+from .metrics import metrics
+from .neighbors import select_top_k
+
+
+class ShardedScorer:
+    """Exact top-k over row shards of the catalog, scored in a thread pool
+
+    Each shard computes squared distances with the ||a||^2 - 2a.b + ||b||^2
+    expansion (a matrix-vector product over the shard, no n x d temporary),
+    keeps its own k best rows, and the per-shard winners are merged. NumPy
+    releases the GIL inside the products, so shards run on separate cores.
+    Catalogs of a single shard are scored inline.
+
+    Args:
+        n_workers: Threads scoring shards (defaults to the CPU count)
+        shard_rows: Rows per shard
+    """
+
+    def __init__(self, n_workers: int = None, shard_rows: int = 65536):
+        self.n_workers = max(1, n_workers or os.cpu_count() or 1)
+        self.shard_rows = shard_rows
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix='scoring')
+        return self._executor
+
+    def top_k(self, n_rows: int, score_shard: Callable[[int, int], np.ndarray], k: int,
+              excluded_positions: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (positions, squared distances) of the k best rows, nearest first
+
+        Args:
+            n_rows: Number of rows in the catalog
+            score_shard: ``score_shard(start, end)`` returns the squared distances of rows start..end
+            k: Number of rows to return
+            excluded_positions: Rows never returned
+        """
+        excluded = np.fromiter(excluded_positions, dtype=np.int64)
+
+        def run(start: int):
+            end = min(start + self.shard_rows, n_rows)
+            with metrics.span('distance'):
+                squared = score_shard(start, end)
+            with metrics.span('top_k'):
+                local_excluded = excluded[(excluded >= start) & (excluded < end)] - start
+                top = select_top_k(squared, set(local_excluded.tolist()), k)
+            return top + start, squared[top]
+
+        starts = range(0, n_rows, self.shard_rows)
+        if len(starts) > 1 and self.n_workers > 1:
+            shards = list(self._get_executor().map(run, starts))
+        else:
+            shards = [run(start) for start in starts]
+        if not shards:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        positions = np.concatenate([shard[0] for shard in shards])
+        squared = np.concatenate([shard[1] for shard in shards])
+        best = select_top_k(squared, (), k)
+        return positions[best], squared[best]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def euclidean_shard_scorer(features_matrix: np.ndarray, row_norms: np.ndarray, query: np.ndarray):
+    """``score_shard`` for exact squared euclidean distances to ``query``"""
+    query = np.asarray(query, dtype=features_matrix.dtype)
+    query_norm = query @ query
+
+    def score_shard(start: int, end: int) -> np.ndarray:
+        squared = features_matrix[start:end] @ query
+        squared *= -2
+        squared += row_norms[start:end]
+        squared += query_norm
+        return np.maximum(squared, 0, out=squared)
+
+    return score_shard
@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import os
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class ModelSnapshot:
+    """Immutable, fully loaded set of model artifacts used to serve requests.
+
+    A snapshot is never mutated after construction. The recommender replaces
+    it wholesale (a single reference assignment) when new artifacts are
+    trained or detected on disk, so a request that grabbed a snapshot keeps a
+    consistent view for its whole lifetime.
+
+    The fitted transformers are only needed to patch the model, not to serve
+    it, so they are unpickled (importing sklearn) on first access.
+
+    Rows removed by incremental updates stay in the matrix and indexes as
+    ``tombstones`` (sorted row positions) that every search skips, until a
+    compaction rewrites the artifacts without them.
+    """
+    load_transformers: Callable[[], Tuple[Any, Any]]
+    features_matrix: np.ndarray
+    records: Any
+    neighbor_index: Any
+    feature_weights: Dict[str, float]
+    last_training_time: Any
+    numerical_features: Tuple[str, ...]
+    categorical_features: Tuple[str, ...]
+    model_version: str
+    source_fingerprint: Optional[Dict[str, Any]]
+    row_hashes: Optional[np.ndarray]
+    name_positions: Dict[str, Tuple[int, ...]]
+    row_norms: np.ndarray
+    geo_index: Any = None
+    filter_index: Any = None
+    quantized: Any = None
+    # Version of the fitted transformers; stays the same across incremental updates
+    feature_space: Optional[str] = None
+    tombstones: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    signature: Optional[Tuple[int, int, int]] = field(default=None, compare=False)
+
+    @property
+    def n_rows(self) -> int:
+        """Rows in the matrix and indexes, removed ones included"""
+        return len(self.features_matrix)
+
+    @property
+    def n_schools(self) -> int:
+        return self.n_rows - len(self.tombstones)
+
+    @cached_property
+    def removed_positions(self) -> frozenset:
+        return frozenset(self.tombstones.tolist())
+
+    @cached_property
+    def live_positions(self) -> np.ndarray:
+        """Sorted positions of the rows not removed"""
+        return np.setdiff1d(np.arange(self.n_rows), self.tombstones, assume_unique=True)
+
+    @cached_property
+    def transformers(self) -> Tuple[Any, Any]:
+        return self.load_transformers()
+
+    @property
+    def preprocessor(self):
+        return self.transformers[0]
+
+    @property
+    def pca(self):
+        return self.transformers[1]
+
+    @property
+    def storage_precision(self) -> str:
+        return 'int8' if self.quantized is not None else self.features_matrix.dtype.name
+
+    @property
+    def feature_bytes(self) -> int:
+        """Bytes of the feature storage scanned on the request path"""
+        if self.quantized is not None:
+            return self.quantized.nbytes
+        return self.features_matrix.nbytes
+
+    @cached_property
+    def schools_df(self):
+        """School table as a DataFrame, materialized on first use by training code"""
+        return self.records.to_frame()
+
+
+def artifact_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """Cheap change token for an artifact file (inode, size, mtime)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def build_name_index(names: Iterable[str], removed: Iterable[int] = ()) -> Dict[str, Tuple[int, ...]]:
+    """Map each school name to the row positions carrying it, in row order, skipping removed rows"""
+    removed = set(removed)
+    index: Dict[str, list] = {}
+    for position, name in enumerate(names):
+        if position not in removed:
+            index.setdefault(name, []).append(position)
+    return {name: tuple(positions) for name, positions in index.items()}
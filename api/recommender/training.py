@@ -0,0 +1,125 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+
+from .metrics import metrics
+
+logger = logging.getLogger("recommender_engine")
+
+
+def train_from_source(data_path: str, model_dir: str, settings: Dict, force_retrain: bool) -> Dict:
+    """Load the CSV, fit and save a complete model set; runs in a worker process
+
+    ``settings`` are the serving recommender's ``settings()``, so a retrain
+    (and the incremental path it may take) uses its configuration, not the
+    defaults. The recommender holds the model directory's write lock for the
+    whole refresh, so when several API workers start training at once, one
+    trains and the others find its result unchanged once they get the lock.
+    """
+    from .rec_eng import HybridSchoolRecommender
+
+    recommender = HybridSchoolRecommender(data_path=data_path, model_dir=model_dir, **settings)
+    mode = recommender.refresh_from_source(force_retrain=force_retrain)
+    return {
+        "mode": mode,
+        "model_version": recommender.snapshot.model_version,
+        "number_of_schools": recommender.snapshot.n_schools
+    }
+
+
+class TrainingManager:
+    """Runs training off the event loop and publishes the result atomically
+
+    Training happens in a single-worker process pool, so pandas/sklearn work
+    never blocks request handling. The serving process keeps answering from
+    its current snapshot and swaps to the new artifacts only once they are
+    completely written. Concurrent start requests join the running job.
+
+    Args:
+        recommender: The serving recommender whose snapshot gets swapped
+    """
+
+    def __init__(self, recommender):
+        self.recommender = recommender
+        self._executor = None
+        self._task: asyncio.Task = None
+        self.status = {
+            "state": "idle",
+            "stage": None,
+            "started_at": None,
+            "finished_at": None,
+            "duration_seconds": None,
+            "error": None,
+            "result": None,
+            "coalesced_requests": 0
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: never fork a process that is running the server's threads
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, force_retrain: bool = False) -> Dict:
+        """Start a training job, or join the one already running"""
+        if self.running:
+            self.status["coalesced_requests"] += 1
+            return {**self.status, "coalesced": True}
+
+        self.status.update(
+            state="running",
+            stage="queued",
+            started_at=datetime.now(),
+            finished_at=None,
+            duration_seconds=None,
+            error=None,
+            result=None,
+            coalesced_requests=0
+        )
+        self._task = asyncio.get_running_loop().create_task(self._run(force_retrain))
+        return {**self.status, "coalesced": False}
+
+    async def _run(self, force_retrain: bool):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        recommender = self.recommender
+        try:
+            self.status["stage"] = "training"
+            result = await loop.run_in_executor(self._get_executor(), functools.partial(
+                train_from_source,
+                recommender.data_path,
+                recommender.model_dir,
+                recommender.settings(),
+                force_retrain
+            ))
+
+            # Map the new artifacts and swap the snapshot reference
+            self.status["stage"] = "publishing"
+            if not await loop.run_in_executor(None, functools.partial(recommender.refresh_if_stale, min_interval=0)):
+                raise RuntimeError("Trained models could not be loaded")
+
+            self.status.update(state="succeeded", result=result)
+            logger.info(f"Training finished: {result}")
+        except Exception as e:
+            self.status.update(state="failed", error=str(e))
+            logger.error(f"Training failed: {e}")
+        finally:
+            duration = time.perf_counter() - started
+            self.status.update(stage=None, finished_at=datetime.now(), duration_seconds=round(duration, 3))
+            metrics.histogram(
+                'recommender_training_seconds', 'Duration of background training runs', 'outcome', self.status["state"]
+            ).observe(duration)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,49 +1,125 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, url_for
 from flask_cors import CORS
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from bson import ObjectId
+import csv
 import json
-import requests
+import os
 from datetime import datetime
-from requests.exceptions import RequestException
-import pandas as pd
 from utils import format_school_for_frontend
+from interaction_store import InteractionStore, parse_timestamp
+from recommender_client import RecommenderClient, RecommenderError, RecommenderUnavailable, StaleProfile
+from recommendation_store import RecommendationStore
+from school_listing import (ListingError, bump_collection_version, collection_version, ensure_indexes,
+                            fetch_page, listing_etag, parse_listing_args)
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag', 'Link', 'X-Next-Cursor'])
 
 # MongoDB connection
 client = MongoClient('mongodb://localhost:27017/')
 db = client['school_recommendations']
 schools_collection = db['schools']
 users_collection = db['users']
+# Latest interaction per (user, school, type)
+interaction_store = InteractionStore(db['interactions'])
+# Write versions of collections, used for ETags
+meta_collection = db['collection_versions']
+
+# Shared, pooled client for the recommender service
+recommender_client = RecommenderClient(os.environ.get('RECOMMENDER_URL', 'http://localhost:8000'))
 
 # Helper function to convert ObjectId to string
 def parse_json(data):
     return json.loads(json.dumps(data, default=str))
 
+# Column types of the schools CSV; every other column is text
+SCHOOL_NUMERIC_FIELDS = {
+    'latitude': float, 'longitude': float, 'rating': float,
+    'tuition': int, 'student_teacher_ratio': int, 'test_scores': int
+}
+
+def read_schools_csv(path, batch_size=1000):
+    """Rows of the schools CSV as documents, in lists of ``batch_size``"""
+    with open(path, newline='', encoding='utf-8') as f:
+        batch = []
+        for row in csv.DictReader(f):
+            document = {}
+            for field, value in row.items():
+                if value == '':
+                    value = None
+                elif field in SCHOOL_NUMERIC_FIELDS:
+                    value = SCHOOL_NUMERIC_FIELDS[field](value)
+                document[field] = value
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
 # Add after MongoDB connection setup
 def init_schools():
     # Check if schools collection is empty
     if schools_collection.count_documents({}) == 0:
-        # Read schools from CSV
-        schools_df = pd.read_csv('api/data/schools.csv')
-        # Convert DataFrame to list of dictionaries
-        schools_data = schools_df.to_dict('records')
-        # Insert schools into MongoDB
-        schools_collection.insert_many(schools_data)
+        for batch in read_schools_csv('api/data/schools.csv'):
+            schools_collection.insert_many(batch)
+        bump_collection_version(meta_collection)
+    ensure_indexes(schools_collection)
+
+def migrate_interactions():
+    """Move interactions embedded in user documents into the interaction store
+    
+    The old unbounded ``interacted_schools`` arrays are removed, along with any
+    profile built from them; profiles are rebuilt on the next read.
+    """
+    interaction_store.ensure_indexes()
+    for user in users_collection.find({'interacted_schools': {'$exists': True}}, {'interacted_schools': 1}):
+        interactions = [
+            (interaction['school_name'], interaction.get('type', 'view'), interaction['timestamp'])
+            for interaction in user['interacted_schools']
+            if interaction.get('school_name') and interaction.get('timestamp')
+        ]
+        interaction_store.record(user['_id'], interactions)
+        users_collection.update_one(
+            {'_id': user['_id']},
+            {'$unset': {'interacted_schools': '', 'profile': '', 'pending_interactions': ''},
+             '$set': {'interaction_count': len(interactions)}}
+        )
+        interaction_store.trim(user['_id'])
 
 # Call this after creating MongoDB connection
 init_schools()
+migrate_interactions()
 
 @app.route('/api/schools', methods=['GET'])
 def get_schools():
-    schools = list(schools_collection.find())
-    # Transform _id to id for frontend compatibility
-    for school in schools:
-        school['id'] = str(school['_id'])
-        del school['_id']
-    return jsonify(parse_json(schools))
+    """One page of schools as a JSON list
+
+    Query params: ``view`` (list/detail), ``limit``, ``cursor``, ``type``,
+    ``curriculum``, ``focus``, ``min_tuition``, ``max_tuition``. The next
+    page's cursor comes back in the ``X-Next-Cursor`` and ``Link`` headers.
+    """
+    try:
+        query, projection, limit = parse_listing_args(request.args)
+    except ListingError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    etag = listing_etag(collection_version(meta_collection), request.args)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    schools, next_cursor = fetch_page(schools_collection, query, projection, limit)
+    response = jsonify(schools)
+    response.set_etag(etag, weak=True)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for("get_schools", **args)}>; rel="next"'
+    return response
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -52,7 +128,7 @@ def login():
     user = users_collection.find_one({
         'username': data.get('username'),
         'password': data.get('password')
-    })
+    }, {'profile': 0})
         
     if user:
         response = {'success': True, 'user': parse_json(user)}
@@ -78,6 +154,9 @@ def register():
     
     return jsonify({'success': True, 'message': 'User registered successfully'})
 
+# Interactions accepted per batch request
+MAX_INTERACTION_BATCH = 500
+
 @app.route('/api/user/interactions', methods=['POST'])
 def update_user_interactions():
     data = request.get_json()
@@ -89,73 +168,234 @@ def update_user_interactions():
     if not all([user_id, school_name, interaction_type]):
         return jsonify({'success': False, 'message': 'Missing required fields'}), 400
     
-    # First find the school by name
-    school = schools_collection.find_one({'name': school_name})
+    # First find the school by name (indexed)
+    school = schools_collection.find_one({'name': school_name}, {'_id': 1})
     if not school:
         return jsonify({'success': False, 'message': 'School not found'}), 404
-        
-    users_collection.update_one(
+    
+    record_interactions(user_id, [(school_name, interaction_type, datetime.now())])
+    return jsonify({'success': True})
+
+@app.route('/api/user/interactions/batch', methods=['POST'])
+def update_user_interactions_batch():
+    """Record a burst of buffered interactions with one bulk write
+    
+    Body: ``{userId, interactions: [{school_name, type, timestamp?}]}`` with
+    ISO 8601 timestamps (default: now). Interactions naming unknown schools
+    are skipped and listed in the response.
+    """
+    data = request.get_json()
+    
+    user_id = data.get('userId')
+    items = data.get('interactions')
+    if not user_id or not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'Missing required fields'}), 400
+    if len(items) > MAX_INTERACTION_BATCH:
+        return jsonify({'success': False, 'message': f'At most {MAX_INTERACTION_BATCH} interactions per batch'}), 400
+    
+    now = datetime.now()
+    interactions = []
+    try:
+        for item in items:
+            if not isinstance(item, dict) or not item.get('school_name') or not item.get('type'):
+                return jsonify({'success': False, 'message': 'Missing required fields'}), 400
+            interactions.append((item['school_name'], item['type'], parse_timestamp(item.get('timestamp'), now)))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid timestamp: {e}'}), 400
+    
+    names = list({school_name for school_name, _, _ in interactions})
+    known = {school['name'] for school in schools_collection.find({'name': {'$in': names}}, {'_id': 0, 'name': 1})}
+    unknown = sorted(set(names) - known)
+    interactions = [interaction for interaction in interactions if interaction[0] in known]
+    
+    if interactions:
+        record_interactions(user_id, interactions)
+    return jsonify({'success': True, 'recorded': len(interactions), 'unknown': unknown})
+
+# Newest interactions kept on the user for folding into their profile
+PENDING_INTERACTIONS = 50
+
+def record_interactions(user_id, interactions):
+    """Store interactions for a user and queue the fold into their profile
+    
+    Cost is independent of the user's history and makes no recommender call:
+    one update of the user, which bumps the counter and appends the
+    interactions to a short pending list, and one bulk upsert into the
+    interaction store. The background refresh folds them into the profile.
+    
+    The user is updated first, so a rebuild reading the user in between
+    still finds the new interactions in the pending list.
+    """
+    user = users_collection.find_one_and_update(
         {'_id': ObjectId(user_id)},
         {
-            '$addToSet': {
-                'interacted_schools': {
-                    'school_name': school_name,
-                    'type': interaction_type,
-                    'timestamp': datetime.now()
-                }
-            }
+            '$inc': {'interaction_count': len(interactions)},
+            '$push': {'pending_interactions': {
+                '$each': [
+                    {'school_name': school_name, 'type': interaction_type, 'timestamp': timestamp}
+                    for school_name, interaction_type, timestamp in interactions
+                ],
+                '$slice': -PENDING_INTERACTIONS
+            }}
         },
-        upsert=True
+        projection={'interaction_count': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
+    interaction_store.record(user['_id'], interactions)
+    count_before = user['interaction_count'] - len(interactions)
+    interaction_store.recorded(user['_id'], count_before, user['interaction_count'])
     
-    return jsonify({'success': True})
+    # Fold and refresh the user's materialized recommendations in the background
+    recommendation_store.enqueue(user_id)
+
+def pending_interactions(user):
+    """The user's pending interactions as (school name, interaction type, datetime) tuples"""
+    return [(item['school_name'], item['type'], item['timestamp']) for item in user.get('pending_interactions', [])]
+
+def fold_into_profile(user):
+    """Bring the user's stored profile up to their ``interaction_count``, O(d) per interaction
+    
+    Only the interactions the profile is behind by are folded, taken from the
+    user's pending list, and the result is stored only if the profile is still
+    the one it extends. Returns the folded profile, or None when it must be
+    rebuilt: the missing interactions are no longer pending, or the model
+    was refitted since it was built.
+    """
+    profile = user['profile']
+    behind = user['interaction_count'] - profile['n_interactions']
+    pending = pending_interactions(user)
+    if behind == 0:
+        return profile
+    if not 0 < behind <= len(pending):
+        return None
+    try:
+        updated, _ = recommender_client.update_profile(profile, pending[-behind:], interaction_store.max_history)
+    except StaleProfile:
+        return None
+    users_collection.update_one(
+        {'_id': user['_id'], 'profile.n_interactions': profile['n_interactions']},
+        {'$set': {'profile': updated}}
+    )
+    return updated
+
+def rebuild_profile(user):
+    """Build the user's profile from their newest stored interactions
+    
+    The store keeps the latest interaction per (school, type), and a fold
+    replaces a pair's contribution and keeps as many pairs as the store
+    returns, so the rebuilt profile is the one folding would have produced.
+    It also folds the user's pending interactions, and is stored only if no
+    interaction was recorded since the user was read.
+    """
+    # Rows a concurrent write has not stored yet are still pending on the user;
+    # folding one already in the store again changes nothing
+    interactions = interaction_store.latest(user['_id']) + pending_interactions(user)
+    profile, _ = recommender_client.update_profile(None, interactions, interaction_store.max_history)
+    if profile is not None:
+        profile['n_interactions'] = user['interaction_count']
+        users_collection.update_one(
+            {'_id': user['_id'], 'interaction_count': user['interaction_count']},
+            {'$set': {'profile': profile}}
+        )
+    return profile
+
+class UserRecommendationError(Exception):
+    """Recommendations can't be computed for this user; carries the HTTP response"""
+    def __init__(self, body, status):
+        super().__init__(body.get('message') or body.get('error'))
+        self.body = body
+        self.status = status
+
+def compute_user_recommendations(user_id, **options):
+    """Fetch fresh recommendations for a user from the recommender service
+    
+    ``options`` are passed on to the recommender (e.g. a location and radius).
+    Returns (formatted recommendations, model version, stale flag)
+    """
+    user = users_collection.find_one({'_id': ObjectId(user_id)},
+                                     {'profile': 1, 'interaction_count': 1, 'pending_interactions': 1})
+    if not user:
+        raise UserRecommendationError({'error': 'User not found'}, 404)
+
+    if not user.get('interaction_count'):
+        raise UserRecommendationError({'success': False, 'message': 'No school interactions found'}, 400)
+
+    # Score from the stored profile vector: fold in the pending interactions it
+    # is behind by, and rebuild it from the history only when it is missing,
+    # too far behind or from a refitted model. An unreachable recommender
+    # leaves the stored profile as it is, and the result is the last good one.
+    stored = profile = user.get('profile')
+    # Scored from a profile missing some interactions; never materialized
+    partial = False
+    for _ in range(2):
+        try:
+            if profile is not None:
+                profile = fold_into_profile({**user, 'profile': profile})
+            if profile is None:
+                profile = rebuild_profile(user)
+        except RecommenderUnavailable:
+            if stored is None:
+                raise
+            profile = stored
+            partial = stored['n_interactions'] != user['interaction_count']
+        if profile is None:
+            raise UserRecommendationError({'success': False, 'message': 'No valid school names found'}, 400)
+        try:
+            result = recommender_client.get_profile_recommendations(profile, n_recommendations=5,
+                                                                    owner=user_id, **options)
+            break
+        except StaleProfile:
+            profile = None
+    else:
+        raise UserRecommendationError({'success': False, 'message': 'Profile could not be rebuilt'}, 503)
+    raw_recommendations = result.get('recommendations', [])
+    formatted_recommendations = [format_school_for_frontend(rec) for rec in raw_recommendations]
+    return formatted_recommendations, result.get('model_version'), result.get('stale', False) or partial
+
+# Materialized per-user results, refreshed on interactions and model changes
+recommendation_store = RecommendationStore(db['user_recommendations'], compute_user_recommendations,
+                                           model_version=recommender_client.model_version)
+
+@app.before_request
+def start_background_refresh():
+    # Threads started at import would not survive a pre-fork server's fork, so
+    # the refresh workers and the model watcher start in the serving process
+    recommendation_store.start()
+
+# Query parameters forwarded to the recommender service as-is
+RECOMMENDATION_OPTIONS = (
+    'latitude', 'longitude', 'max_distance_km',
+    'type', 'curriculum', 'focus', 'facilities',
+    'min_tuition', 'max_tuition', 'min_rating', 'max_rating'
+)
 
 @app.route('/api/recommendations/<user_id>', methods=['GET'])
 def get_recommendations(user_id):
+    # Location and attribute constraints vary per request; those results are never materialized
+    options = {key: tuple(request.args.getlist(key)) for key in RECOMMENDATION_OPTIONS if request.args.get(key)}
     try:
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-
-        interacted_schools = user.get('interacted_schools', [])
-        if not interacted_schools:
-            return jsonify({'success': False, 'message': 'No school interactions found'}), 400
-
-        # Get unique school names from interactions
-        school_names = list(set(
-            interaction['school_name'] 
-            for interaction in interacted_schools 
-            if interaction.get('school_name')
-        ))
-        
-        if not school_names:
-            return jsonify({'success': False, 'message': 'No valid school names found'}), 400
+        if options:
+            recommendations, _, _ = compute_user_recommendations(user_id, **options)
+            return jsonify({'success': True, 'recommendations': recommendations})
 
-        params = []
-        for name in school_names:
-            params.append(('school_names', name))
-        params.append(('n_recommendations', 5))
+        # One primary-key lookup when the user's recommendations are materialized
+        document = recommendation_store.get(user_id)
+        if document is not None:
+            return jsonify({'success': True, 'recommendations': document['recommendations']})
 
-        try:
-            response = requests.get(
-                'http://localhost:8000/recommendations',
-                params=params,
-                timeout=5
-            )
-            if response.status_code == 200:
-                print(response.json())
-                raw_recommendations = response.json().get('recommendations', [])
-                formatted_recommendations = [format_school_for_frontend(rec) for rec in raw_recommendations]
-                return jsonify({'success': True, 'recommendations': formatted_recommendations})
-            else:
-                return jsonify({'success': False, 'message': f'API Error: {response.text}'}), 500
-                
-        except RequestException as e:
-            return jsonify({
-                'success': False, 
-                'message': 'Recommender service unavailable'
-            }), 503
-            
+        # First request for this user: compute synchronously and materialize
+        recommendations = recommendation_store.refresh(user_id)
+        return jsonify({'success': True, 'recommendations': recommendations})
+    except UserRecommendationError as e:
+        return jsonify(e.body), e.status
+    except RecommenderError as e:
+        return jsonify({'success': False, 'message': f'API Error: {e}'}), 500
+    except RecommenderUnavailable:
+        return jsonify({
+            'success': False, 
+            'message': 'Recommender service unavailable'
+        }), 503
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -0,0 +1,101 @@
+"""Request rate through the recommender client against a local stub server
+
+Compares the old per-call ``requests.get`` (no session, no keep-alive) with
+the pooled RecommenderClient, using the same number of caller threads.
+
+    python backend/benchmarks/client_benchmark.py --threads 16 --seconds 5 --latency-ms 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommender_client import RecommenderClient  # noqa: E402
+
+PAYLOAD = json.dumps({'recommendations': [
+    {'id': str(i), 'name': f'School {i}', 'similarity_score': 0.5} for i in range(5)
+]}).encode()
+
+
+def start_stub_server(latency_ms):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls on keep-alive
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(call, threads, seconds, distinct_users):
+    """Hammer ``call`` from ``threads`` threads; returns (requests/s, errors)"""
+    deadline = time.perf_counter() + seconds
+    counts = [0] * threads
+    errors = [0] * threads
+
+    def worker(slot):
+        i = 0
+        while time.perf_counter() < deadline:
+            try:
+                call([f'School {(slot * 7919 + i) % distinct_users}'])
+                counts[slot] += 1
+            except Exception:
+                errors[slot] += 1
+            i += 1
+
+    workers = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / seconds, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--latency-ms', type=float, default=5, help='Simulated recommender latency')
+    parser.add_argument('--distinct-users', type=int, default=1000)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency_ms)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    def unpooled(school_names):
+        params = [('school_names', name) for name in school_names] + [('n_recommendations', 5)]
+        response = requests.get(f'{base_url}/recommendations', params=params, timeout=5)
+        return response.json()
+
+    client = RecommenderClient(base_url, pool_size=args.threads, max_concurrency=args.threads)
+
+    for label, call in (('requests.get per call', unpooled), ('RecommenderClient', client.get_recommendations)):
+        rate, errors = run(call, args.threads, args.seconds, args.distinct_users)
+        print(f'{label:<24} {rate:>10.1f} req/s  errors={errors}')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
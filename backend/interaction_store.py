@@ -0,0 +1,88 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+DEFAULT_MAX_HISTORY = 200
+DEFAULT_TRIM_EVERY = 50
+
+
+def parse_timestamp(value, now=None):
+    """A client-supplied ISO 8601 timestamp as a naive local datetime, never in the future
+
+    Raises:
+        ValueError: If ``value`` is not an ISO 8601 string
+    """
+    now = now or datetime.now()
+    if value is None:
+        return now
+    if not isinstance(value, str):
+        raise ValueError('timestamp must be an ISO 8601 string')
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return min(timestamp, now)
+
+
+class InteractionStore:
+    """Latest interaction per (user, school, type), in its own collection
+
+    Each document is ``{user_id, school_name, type, timestamp}``. A repeat
+    interaction upserts its row instead of adding one, so a user's rows are
+    bounded by the schools they touched, and ``max_history`` caps them
+    further: reads take the newest rows through the ``(user_id, timestamp)``
+    index, and writes trim older rows once every ``trim_every``
+    interactions. Both stay constant-cost however long a user stays active.
+
+    Args:
+        collection: Mongo collection holding one document per (user, school, type)
+        max_history: Rows kept (and read) per user
+        trim_every: Interactions recorded between two trims of a user's rows
+    """
+
+    def __init__(self, collection, max_history=DEFAULT_MAX_HISTORY, trim_every=DEFAULT_TRIM_EVERY):
+        self.collection = collection
+        self.max_history = max_history
+        self.trim_every = trim_every
+
+    def ensure_indexes(self):
+        self.collection.create_index(
+            [('user_id', ASCENDING), ('school_name', ASCENDING), ('type', ASCENDING)], unique=True)
+        self.collection.create_index([('user_id', ASCENDING), ('timestamp', DESCENDING)])
+
+    def record(self, user_id, interactions):
+        """Upsert (school name, interaction type, datetime) tuples with one unordered bulk write
+
+        ``$max`` keeps the newest timestamp whatever order the operations run in.
+        """
+        operations = [
+            UpdateOne(
+                {'user_id': user_id, 'school_name': school_name, 'type': interaction_type},
+                {'$max': {'timestamp': timestamp}},
+                upsert=True
+            )
+            for school_name, interaction_type, timestamp in interactions
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def recorded(self, user_id, count_before, count_after):
+        """Trim a user's rows when their interaction count crossed a multiple of ``trim_every``"""
+        if count_before // self.trim_every != count_after // self.trim_every:
+            self.trim(user_id)
+
+    def trim(self, user_id):
+        """Delete the user's rows older than the newest ``max_history``"""
+        oldest_kept = list(
+            self.collection.find({'user_id': user_id}, {'timestamp': 1})
+            .sort('timestamp', DESCENDING).skip(self.max_history - 1).limit(1)
+        )
+        if oldest_kept:
+            self.collection.delete_many({'user_id': user_id, 'timestamp': {'$lt': oldest_kept[0]['timestamp']}})
+
+    def latest(self, user_id):
+        """The user's newest interactions as (school name, interaction type, datetime) tuples"""
+        cursor = (
+            self.collection.find({'user_id': user_id}, {'_id': 0, 'school_name': 1, 'type': 1, 'timestamp': 1})
+            .sort('timestamp', DESCENDING).limit(self.max_history)
+        )
+        return [(row['school_name'], row['type'], row['timestamp']) for row in cursor]
@@ -0,0 +1,150 @@
+from datetime import datetime
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationStore:
+    """Materialized per-user recommendations, refreshed in the background
+
+    Each user has one document ``{_id: user_id, recommendations, model_version,
+    updated_at}``, so serving is a single primary-key lookup. Refreshes are
+    queued (deduplicated per user) and computed by worker threads, so reads
+    keep working while the recommender is retraining or down.
+
+    With ``model_version``, a watcher thread polls the served model version
+    and, when it changes, queues a refresh for every user whose document
+    belongs to another version, so results follow a retrain even for users
+    who don't interact.
+
+    Args:
+        collection: Mongo collection holding one document per user
+        compute: ``compute(user_id) -> (recommendations, model_version, stale)``
+        workers: Number of refresh worker threads
+        max_queued: Refreshes waiting at most; further requests are dropped
+        model_version: ``model_version() -> version or None`` of the served model
+        poll_interval: Seconds between polls of ``model_version``
+    """
+
+    def __init__(self, collection, compute, workers=2, max_queued=10000,
+                 model_version=None, poll_interval=30.0):
+        self.collection = collection
+        self.compute = compute
+        self.workers = workers
+        self.model_version = model_version
+        self.poll_interval = poll_interval
+        # Newest model version seen from the recommender
+        self.latest_model_version = None
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        # Process the threads were started in
+        self._started = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_workers(self):
+        # Threads do not survive a fork, so a forked process starts its own
+        if self._started == os.getpid():
+            return
+        with self._start_lock:
+            if self._started != os.getpid():
+                for i in range(self.workers):
+                    threading.Thread(target=self._work, name=f'recommendation-refresh-{i}', daemon=True).start()
+                if self.model_version is not None:
+                    threading.Thread(target=self._watch, name='recommendation-model-watch', daemon=True).start()
+                self._started = os.getpid()
+
+    def start(self):
+        """Start the refresh workers and the model version watcher, once per process
+
+        Call it from the serving process, e.g. on its first request, not at import.
+        """
+        self._ensure_workers()
+
+    def get(self, user_id):
+        """Stored document for a user, or None; documents from an older model get a refresh queued"""
+        document = self.collection.find_one({'_id': user_id})
+        if document is not None and self.latest_model_version and document.get('model_version') != self.latest_model_version:
+            self.enqueue(user_id)
+        return document
+
+    def save(self, user_id, recommendations, model_version):
+        if model_version:
+            self.latest_model_version = model_version
+        self.collection.update_one(
+            {'_id': user_id},
+            {'$set': {
+                'recommendations': recommendations,
+                'model_version': model_version,
+                'updated_at': datetime.now()
+            }},
+            upsert=True
+        )
+
+    def enqueue(self, user_id, block=False):
+        """Queue a refresh unless one is already pending for this user
+
+        With ``block``, waits for room in a full queue instead of dropping the refresh.
+        """
+        self._ensure_workers()
+        with self._pending_lock:
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+        try:
+            self._queue.put(user_id, block=block)
+        except queue.Full:
+            with self._pending_lock:
+                self._pending.discard(user_id)
+            logger.warning(f'Recommendation refresh queue full, dropped refresh for {user_id}')
+
+    def observe_model_version(self, model_version):
+        """Record the served model version; on a change, queue refreshes for documents of other versions
+
+        Returns the number of refreshes queued.
+        """
+        if not model_version or model_version == self.latest_model_version:
+            return 0
+        self.latest_model_version = model_version
+        queued = 0
+        for document in self.collection.find({'model_version': {'$ne': model_version}}, {'_id': 1}):
+            # A newer version may appear while a large backlog is queued
+            if self.latest_model_version != model_version:
+                break
+            self.enqueue(document['_id'], block=True)
+            queued += 1
+        if queued:
+            logger.info(f'Model version {model_version}: queued {queued} recommendation refreshes')
+        return queued
+
+    def refresh(self, user_id):
+        """Recompute and store one user's recommendations now"""
+        recommendations, model_version, stale = self.compute(user_id)
+        # Never overwrite a materialized result with a circuit-breaker fallback
+        if not stale:
+            self.save(user_id, recommendations, model_version)
+        return recommendations
+
+    def _work(self):
+        while True:
+            user_id = self._queue.get()
+            with self._pending_lock:
+                self._pending.discard(user_id)
+            try:
+                self.refresh(user_id)
+            except Exception as e:
+                logger.warning(f'Recommendation refresh failed for {user_id}: {e}')
+            finally:
+                self._queue.task_done()
+
+    def _watch(self):
+        while True:
+            try:
+                self.observe_model_version(self.model_version())
+            except Exception as e:
+                logger.warning(f'Model version check failed: {e}')
+            time.sleep(self.poll_interval)
@@ -0,0 +1,290 @@
+from collections import OrderedDict
+import hashlib
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+
+class RecommenderError(Exception):
+    """The recommender answered, but rejected the request (4xx)"""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StaleProfile(RecommenderError):
+    """The model was refitted since the profile was built; rebuild it from the history"""
+
+
+class RecommenderUnavailable(Exception):
+    """The recommender could not be reached and no cached result was available"""
+
+
+class CircuitBreaker:
+    """Stop calling a failing service for a while, then let one trial call through
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds the circuit stays open before a trial call
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class _InFlight:
+    """A call other threads asking for the same key can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RecommenderClient:
+    """Pooled, resilient client for the FastAPI recommender service
+
+    - one persistent session with a keep-alive connection pool
+    - at most ``max_concurrency`` calls in flight; callers beyond that fail
+      fast without waiting for a slot, falling back like an unavailable service
+    - per-attempt connect/read timeouts, retried with full-jitter backoff
+    - a circuit breaker; while open, the last good result for the same input
+      is served (marked ``stale``)
+    - identical concurrent requests share a single upstream call
+
+    Args:
+        base_url: Recommender service root URL
+        pool_size: Keep-alive connections kept per host
+        max_concurrency: Upstream calls allowed in flight at once
+        connect_timeout: Seconds to establish a connection, per attempt
+        read_timeout: Seconds to wait for the response, per attempt
+        retries: Extra attempts after a failed one
+        backoff: Base backoff in seconds, doubled per attempt
+        fallback_size: Number of last good results kept for the circuit breaker
+    """
+
+    # Constraints that take several values
+    LIST_OPTIONS = ('type', 'curriculum', 'focus', 'facilities')
+
+    def __init__(self, base_url='http://localhost:8000', pool_size=20, max_concurrency=10,
+                 connect_timeout=0.5, read_timeout=2.0, retries=2, backoff=0.1,
+                 breaker=None, fallback_size=10000):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.fallback_size = fallback_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self._last_good = OrderedDict()
+        self._last_good_lock = threading.Lock()
+
+    def get_recommendations(self, school_names, n_recommendations=5, **options):
+        """Recommendations payload from the service
+
+        Args:
+            school_names: Schools to base the recommendations on
+            n_recommendations: Number of recommendations
+            **options: Extra query parameters, e.g. ``latitude``, ``longitude``
+                and ``max_distance_km`` for nearby schools only
+
+        Returns:
+            The service's JSON body, plus ``stale: True`` when it is a cached
+            fallback served because the service is unavailable
+        """
+        key = (tuple(sorted(set(school_names))), n_recommendations, tuple(sorted(options.items())))
+        return self._coalesced(key, key, lambda: self._fetch(key))
+
+    def _coalesced(self, key, fallback_key, fetch):
+        """``fetch()`` shared by concurrent callers with the same ``key``, with the last good result as fallback"""
+        with self._in_flight_lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _InFlight()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._fetch_with_fallback(fallback_key, fetch)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def _fetch_with_fallback(self, key, fetch):
+        try:
+            result = fetch()
+        except RecommenderUnavailable:
+            with self._last_good_lock:
+                cached = self._last_good.get(key)
+            if cached is None:
+                raise
+            return {**cached, 'stale': True}
+
+        with self._last_good_lock:
+            self._last_good[key] = result
+            self._last_good.move_to_end(key)
+            while len(self._last_good) > self.fallback_size:
+                self._last_good.popitem(last=False)
+        return result
+
+    def update_profile(self, profile, interactions, max_entries=None):
+        """Fold interactions into a user profile kept by the caller
+
+        Args:
+            profile: The stored profile, or None to build one from ``interactions``
+            interactions: (school name, interaction type, datetime) tuples
+            max_entries: (school, type) pairs the profile keeps at most, the newest ones
+
+        Returns:
+            (new profile or None if no school was known, unknown school names)
+
+        Raises:
+            StaleProfile: The model was refitted; rebuild from the whole history
+        """
+        payload = self._call('POST', '/profiles', json={
+            'profile': profile,
+            'interactions': [
+                {'school_name': name, 'type': interaction_type, 'timestamp': timestamp.timestamp()}
+                for name, interaction_type, timestamp in interactions
+            ],
+            'max_entries': max_entries
+        })
+        return payload['profile'], payload['unknown']
+
+    def get_profile_recommendations(self, profile, n_recommendations=5, owner=None, **options):
+        """Recommendations scored from a stored profile
+
+        ``options`` are the query-style constraints of ``get_recommendations``
+        (tuples of values); list-valued ones are sent as lists, others as
+        their single value. Concurrent requests for the same profile share
+        one upstream call. While the service is unavailable, the last good
+        result for the same ``owner`` (e.g. the user id; default: the same
+        profile) and options is served, marked ``stale``.
+
+        Raises:
+            StaleProfile: The model was refitted; rebuild the profile
+        """
+        body = {'profile': profile, 'n_recommendations': n_recommendations}
+        for name, values in options.items():
+            values = list(values) if isinstance(values, (list, tuple)) else [values]
+            body[name] = values if name in self.LIST_OPTIONS else values[0]
+        digest = hashlib.sha256(json.dumps(profile, sort_keys=True).encode()).hexdigest()
+        options_key = tuple(sorted(options.items()))
+        key = ('profile', digest, n_recommendations, options_key)
+        fallback_key = key if owner is None else ('profile-owner', owner, n_recommendations, options_key)
+        return self._coalesced(key, fallback_key, lambda: self._call('POST', '/recommendations/profile', json=body))
+
+    def model_version(self):
+        """Version of the model the service is serving, or None if it is warming up or unreachable
+
+        A single cheap probe of ``/ready``, outside the circuit breaker and the
+        concurrency limit, so polling it never trips or starves real calls.
+        """
+        try:
+            response = self.session.get(f'{self.base_url}/ready', timeout=self.timeout)
+            if response.status_code != 200:
+                return None
+            return response.json().get('model_version')
+        except (RequestException, ValueError):
+            return None
+
+    def _fetch(self, key):
+        school_names, n_recommendations, options = key
+        params = [('school_names', name) for name in school_names]
+        params.append(('n_recommendations', n_recommendations))
+        params.extend(options)
+        return self._call('GET', '/recommendations', params=params)
+
+    def _call(self, method, path, **kwargs):
+        """One upstream call with the concurrency limit, circuit breaker and retries"""
+        # Fail fast instead of queueing Flask workers behind a slow service
+        if not self._slots.acquire(blocking=False):
+            raise RecommenderUnavailable('Too many recommender calls in flight')
+        try:
+            if not self.breaker.allow():
+                raise RecommenderUnavailable('Recommender circuit open')
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                try:
+                    response = self.session.request(method, f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+                except RequestException:
+                    continue
+                if response.status_code >= 500:
+                    continue
+                if response.status_code != 200:
+                    # A rejection still means the service is healthy
+                    self.breaker.record_success()
+                    if response.status_code == 409:
+                        raise StaleProfile(response.status_code, response.text)
+                    raise RecommenderError(response.status_code, response.text)
+                try:
+                    payload = response.json()
+                except ValueError:
+                    continue
+                self.breaker.record_success()
+                return payload
+            self.breaker.record_failure()
+            raise RecommenderUnavailable('Recommender service unavailable')
+        finally:
+            self._slots.release()
@@ -0,0 +1,130 @@
+import hashlib
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, ReturnDocument
+
+# Fields sent per view; the list view carries just enough for the map and search
+LIST_FIELDS = ('name', 'latitude', 'longitude', 'type', 'curriculum', 'rating', 'tuition', 'focus')
+DETAIL_FIELDS = LIST_FIELDS + ('facilities', 'student_teacher_ratio', 'test_scores')
+VIEWS = {'list': LIST_FIELDS, 'detail': DETAIL_FIELDS}
+
+# Exact-match filters accepted as query parameters
+FILTER_FIELDS = ('type', 'curriculum', 'focus')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class ListingError(ValueError):
+    """Invalid listing query parameters"""
+
+
+def ensure_indexes(schools_collection):
+    """Create the indexes used by lookups by name and the listing filters"""
+    schools_collection.create_index([('name', ASCENDING)])
+    for field in FILTER_FIELDS:
+        schools_collection.create_index([(field, ASCENDING), ('_id', ASCENDING)])
+    schools_collection.create_index([('tuition', ASCENDING)])
+
+
+def collection_version(meta_collection, name='schools'):
+    """Current write version of a collection (0 if it was never bumped)"""
+    document = meta_collection.find_one({'_id': name})
+    return document['version'] if document else 0
+
+
+def bump_collection_version(meta_collection, name='schools'):
+    """Record a write to a collection; invalidates every ETag issued for it"""
+    document = meta_collection.find_one_and_update(
+        {'_id': name},
+        {'$inc': {'version': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return document['version']
+
+
+def _parse_float(args, key):
+    value = args.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ListingError(f'{key} must be a number')
+
+
+def parse_listing_args(args):
+    """Turn request arguments into (query, projection, limit)
+
+    Args:
+        args: Request query parameters (``view``, ``limit``, ``cursor``,
+            ``type``, ``curriculum``, ``focus``, ``min_tuition``, ``max_tuition``)
+
+    Returns:
+        Mongo filter, projection, and page size
+
+    Raises:
+        ListingError: If a parameter is malformed
+    """
+    view = args.get('view', 'detail')
+    if view not in VIEWS:
+        raise ListingError(f"view must be one of {', '.join(VIEWS)}")
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ListingError('limit must be an integer')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ListingError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    query = {}
+    for field in FILTER_FIELDS:
+        if args.get(field):
+            query[field] = args.get(field)
+
+    tuition = {}
+    min_tuition = _parse_float(args, 'min_tuition')
+    max_tuition = _parse_float(args, 'max_tuition')
+    if min_tuition is not None:
+        tuition['$gte'] = min_tuition
+    if max_tuition is not None:
+        tuition['$lte'] = max_tuition
+    if tuition:
+        query['tuition'] = tuition
+
+    cursor = args.get('cursor')
+    if cursor:
+        try:
+            query['_id'] = {'$gt': ObjectId(cursor)}
+        except (InvalidId, TypeError):
+            raise ListingError('Invalid cursor')
+
+    projection = {field: 1 for field in VIEWS[view]}
+    return query, projection, limit
+
+
+def fetch_page(schools_collection, query, projection, limit):
+    """One page of schools in ``_id`` order
+
+    Returns:
+        (schools ready to serialize, cursor for the next page or None)
+    """
+    documents = schools_collection.find(query, projection).sort('_id', ASCENDING).limit(limit + 1)
+    schools = []
+    last_id = None
+    for document in documents:
+        if len(schools) == limit:
+            return schools, str(last_id)
+        last_id = document.pop('_id')
+        document['id'] = str(last_id)
+        schools.append(document)
+    return schools, None
+
+
+def listing_etag(version, args):
+    """ETag value for a listing: the collection version plus the normalized query"""
+    normalized = '&'.join(f'{key}={value}' for key, value in sorted(args.items(multi=True)))
+    digest = hashlib.sha1(f'{version}?{normalized}'.encode()).hexdigest()[:16]
+    return f'{version}-{digest}'
@@ -13,5 +13,6 @@ def format_school_for_frontend(school_data):
         'Facilities': school_data.get('facilities'),
         'Student-Teacher Ratio': school_data.get('student_teacher_ratio'),
         'Test Scores': school_data.get('test_scores'),
-        'similarity_score': school_data.get('similarity_score')
+        'similarity_score': school_data.get('similarity_score'),
+        'distance_km': school_data.get('distance_km')
     } 
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""Fixtures shared by the test modules at the repository root"""
+import functools
+import inspect
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# The recommender package is imported as the API server does, from api/
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """Path to a private copy of the school CSV, next to an empty model directory"""
+    path = tmp_path / 'schools.csv'
+    shutil.copy(os.path.join(ROOT, 'api', 'data', 'schools.csv'), path)
+    return str(path)
+
+
+def _bulk_update_compat(monkeypatch, mongomock):
+    """Let mongomock run the bulk updates of newer pymongo releases
+
+    Since 4.9, ``UpdateOne`` passes ``sort`` when it adds itself to a bulk
+    write; mongomock 4.3 does not accept it. Without a sort there is nothing
+    to honour, so the argument is dropped.
+    """
+    builder = mongomock.collection.BulkOperationBuilder
+    add_update = builder.add_update
+    if 'sort' in inspect.signature(add_update).parameters:
+        return
+
+    @functools.wraps(add_update)
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        if sort is not None:
+            raise NotImplementedError('mongomock cannot sort bulk updates')
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(builder, 'add_update', add_update_without_sort)
+
+
+@pytest.fixture(scope='session')
+def backend():
+    """The Flask backend module, imported against an in-memory mongomock server"""
+    mongomock = pytest.importorskip('mongomock')
+    import pymongo
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        _bulk_update_compat(monkeypatch, mongomock)
+        monkeypatch.syspath_prepend(os.path.join(ROOT, 'backend'))
+        # The backend connects and seeds its schools collection at import time
+        with pytest.MonkeyPatch.context() as importing:
+            importing.setattr(pymongo, 'MongoClient', mongomock.MongoClient)
+            importing.chdir(ROOT)
+            import app
+        yield app
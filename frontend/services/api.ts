@@ -45,9 +45,18 @@ export const api = {
   getSchools: async () => {
     try {
       console.log('🏫 Fetching schools list');
-      const response = await axios.get(`${API_URL}/schools`);
-      console.log(`✅ Retrieved ${response.data.length} schools`);
-      return response.data;
+      // The listing is paginated; follow the cursor until the last page
+      const schools: any[] = [];
+      let cursor: string | undefined;
+      do {
+        const response = await axios.get(`${API_URL}/schools`, {
+          params: cursor ? { cursor } : {}
+        });
+        schools.push(...response.data);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      console.log(`✅ Retrieved ${schools.length} schools`);
+      return schools;
     } catch (error: any) {
       console.error('❌ Error fetching schools:', error);
       throw error;
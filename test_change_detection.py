@@ -0,0 +1,128 @@
+"""Tests for source change detection: file fingerprints, the row-hash diff and the retrain threshold
+
+    python -m pytest test_change_detection.py
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from recommender.fingerprint import file_fingerprint, same_source
+from recommender.rec_eng import HybridSchoolRecommender
+
+
+def make_recommender(catalog):
+    return HybridSchoolRecommender(catalog, model_dir=os.path.join(os.path.dirname(catalog), 'models'))
+
+
+@pytest.fixture
+def recommender(catalog):
+    recommender = make_recommender(catalog)
+    assert recommender.refresh_from_source() == 'full'
+    return recommender
+
+
+def edit_source(catalog, change):
+    source = pd.read_csv(catalog)
+    source = change(source)
+    source.to_csv(catalog, index=False)
+    return source
+
+
+def touch(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def diff(recommender, source):
+    appended, removed = recommender._diff_rows(source)
+    return sorted(appended['name']), sorted(removed)
+
+
+def test_fingerprint(catalog):
+    fingerprint = file_fingerprint(catalog)
+    assert same_source(catalog, fingerprint)
+
+    # A touched but identical file is recognised by its content hash
+    touch(catalog)
+    assert file_fingerprint(catalog)['mtime_ns'] != fingerprint['mtime_ns']
+    assert same_source(catalog, fingerprint)
+
+    with open(catalog, 'a') as f:
+        f.write('\n')
+    assert not same_source(catalog, fingerprint)
+    assert not same_source(catalog, None)
+    assert file_fingerprint(catalog + '.missing') is None
+    assert not same_source(catalog + '.missing', fingerprint)
+
+
+def test_diff_finds_edited_added_and_removed_rows(recommender):
+    source = pd.read_csv(recommender.data_path)
+    positions = recommender.snapshot.name_positions
+    assert diff(recommender, source) == ([], [])
+
+    edited = source.copy()
+    edited.loc[3, 'rating'] += 0.1
+    assert diff(recommender, edited) == ([source.loc[3, 'name']], list(positions[source.loc[3, 'name']]))
+
+    added = pd.concat([source, source.iloc[[3]].assign(name='Harbour Lights School')], ignore_index=True)
+    assert diff(recommender, added) == (['Harbour Lights School'], [])
+
+    removed = source.drop(index=3)
+    assert diff(recommender, removed) == ([], [3])
+
+    # Rows are matched by content, wherever they are in the file
+    assert diff(recommender, source.iloc[::-1]) == ([], [])
+
+    # Other columns make a row-level diff impossible
+    assert recommender._diff_rows(source.assign(extra=1)) is None
+
+
+def test_duplicate_rows_are_matched_as_a_multiset(recommender, catalog):
+    source = edit_source(catalog, lambda source: pd.concat([source, source.iloc[[3]]], ignore_index=True))
+    assert recommender.refresh_from_source() == 'incremental'
+    duplicates = recommender.snapshot.name_positions[source.loc[3, 'name']]
+    assert len(duplicates) == 2
+    # Dropping either copy leaves one of the two stored rows unmatched
+    appended, removed = diff(recommender, source.drop(index=3))
+    assert appended == [] and len(removed) == 1 and removed[0] in duplicates
+    assert diff(recommender, source) == ([], [])
+
+
+def test_touched_file_is_unchanged(recommender, catalog):
+    version = recommender.snapshot.model_version
+    touch(catalog)
+    assert not recommender.source_changed()
+    assert make_recommender(catalog).refresh_from_source() == 'unchanged'
+    assert recommender.refresh_from_source() == 'unchanged'
+    assert recommender.snapshot.model_version == version
+
+
+def test_touched_file_fingerprint_is_recorded(recommender, catalog):
+    touch(catalog)
+    recommender.load_data()
+    assert recommender.fit(recommender.schools_df) == 'unchanged'
+    # The new mtime is recorded, so the next check is a stat again
+    assert recommender.snapshot.source_fingerprint['mtime_ns'] == os.stat(catalog).st_mtime_ns
+
+
+def test_edited_added_and_removed_rows_are_patched(recommender, catalog):
+    source = edit_source(catalog, lambda source: pd.concat([
+        source.drop(index=5).assign(rating=lambda frame: frame['rating'].where(frame.index != 3, 4.3)),
+        source.iloc[[7]].assign(name='Harbour Lights School'),
+    ], ignore_index=True))
+    assert recommender.source_changed()
+    assert recommender.refresh_from_source() == 'incremental'
+    assert recommender.snapshot.source_fingerprint['sha256'] == file_fingerprint(catalog)['sha256']
+    assert recommender.snapshot.n_schools == len(source)
+    assert diff(recommender, source) == ([], [])
+
+
+@pytest.mark.parametrize('extra_rows, mode', [(0, 'incremental'), (1, 'full')])
+def test_threshold_between_patching_and_retraining(recommender, catalog, extra_rows, mode):
+    n_schools = recommender.snapshot.n_schools
+    # An edited row counts twice: one removal plus one addition
+    n_edits = int(recommender._max_incremental_fraction * n_schools) // 2 + extra_rows
+    edit_source(catalog, lambda source: source.assign(
+        rating=source['rating'].where(source.index >= n_edits, source['rating'] + 0.01)))
+    assert recommender.refresh_from_source() == mode
@@ -0,0 +1,32 @@
+"""Tests for the spatial grid index behind radius queries
+
+    python -m pytest test_geo.py
+"""
+import numpy as np
+import pytest
+
+from recommender.geo import GeoGridIndex, haversine_km
+
+
+@pytest.fixture(scope='module')
+def points():
+    rng = np.random.default_rng(7)
+    latitudes = np.concatenate([rng.uniform(-90, 90, 5000), [0.0, 0.0, 89.95, 89.95]])
+    longitudes = np.concatenate([rng.uniform(-180, 180, 5000), [179.99, -179.99, 0.0, 180.0]])
+    return latitudes, longitudes
+
+
+@pytest.mark.parametrize('latitude, longitude, radius_km', [
+    (0.0, 179.995, 5),      # across the antimeridian, from the east
+    (0.0, -179.995, 5),     # and from the west
+    (-10.0, 180.0, 800),
+    (89.9, 10.0, 50),       # over the pole
+    (45.0, 120.0, 1500),
+])
+def test_query_matches_exact_distances(points, latitude, longitude, radius_km):
+    latitudes, longitudes = points
+    index = GeoGridIndex(0.5).build(latitudes, longitudes)
+    positions, distances = index.query(latitude, longitude, radius_km)
+    expected = np.flatnonzero(haversine_km(latitude, longitude, latitudes, longitudes) <= radius_km)
+    assert positions.tolist() == expected.tolist()
+    assert np.all(distances <= radius_km)
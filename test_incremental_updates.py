@@ -0,0 +1,195 @@
+"""Tests for incremental catalog updates of the recommender engine
+
+    python -m pytest test_incremental_updates.py
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommender.rec_eng import HybridSchoolRecommender
+
+SCHOOL = 'British Overseas School'
+
+
+def make_recommender(catalog, **options):
+    return HybridSchoolRecommender(catalog, model_dir=os.path.join(os.path.dirname(catalog), 'models'), **options)
+
+
+@pytest.fixture
+def recommender(catalog):
+    recommender = make_recommender(catalog)
+    assert recommender.refresh_from_source() == 'full'
+    return recommender
+
+
+def row_of(recommender, name):
+    snapshot = recommender.snapshot
+    return snapshot.records[snapshot.name_positions[name][0]]
+
+
+def all_names(recommender, seed):
+    """Names of every recommendable school, from one exhaustive query"""
+    results = recommender.get_recommendations([seed], n_recommendations=recommender.snapshot.n_rows)
+    return {school['name'] for school in results}
+
+
+def diff_against_source(catalog):
+    """Rows a fresh process would append and drop to match the CSV with the recorded edits"""
+    fresh = make_recommender(catalog)
+    assert fresh.load_models() and fresh.load_data()
+    appended, removed = fresh._diff_rows(fresh.schools_df)
+    return len(appended), len(removed)
+
+
+def test_upsert_keeps_column_types(recommender, catalog):
+    dtypes = recommender.snapshot.records.numeric_dtypes
+    edited = {**row_of(recommender, SCHOOL), 'rating': 4.1, 'tuition': 251000.0}
+    added = {**row_of(recommender, SCHOOL), 'name': 'Harbour Lights School', 'test_scores': '88'}
+    result = recommender.upsert_schools(pd.DataFrame([edited, added]))
+    assert result == {'mode': 'incremental', 'updated': 1, 'added': 1}
+
+    assert recommender.snapshot.records.numeric_dtypes == dtypes
+    assert recommender.snapshot.schools_df['tuition'].dtype == np.int64
+    school = next(school for school in recommender.get_recommendations([SCHOOL], n_recommendations=100)
+                  if school['name'] == 'Harbour Lights School')
+    assert isinstance(school['tuition'], int) and isinstance(school['test_scores'], int)
+    assert isinstance(school['rating'], float) and isinstance(school['type'], str)
+    assert row_of(recommender, SCHOOL)['tuition'] == 251000
+    # Appended rows hash like the same rows parsed from the CSV
+    assert diff_against_source(catalog) == (0, 0)
+
+
+def test_removal_keeps_column_types(recommender, catalog):
+    dtypes = recommender.snapshot.records.numeric_dtypes
+    n_schools = recommender.snapshot.n_schools
+    result = recommender.remove_schools([SCHOOL, 'Nope'])
+    assert result == {'mode': 'incremental', 'removed': 1, 'unknown': ['Nope']}
+
+    assert recommender.snapshot.records.numeric_dtypes == dtypes
+    assert recommender.snapshot.n_schools == n_schools - 1
+    assert SCHOOL not in recommender.snapshot.name_positions
+    seed = next(iter(recommender.snapshot.name_positions))
+    assert SCHOOL not in all_names(recommender, seed)
+    assert diff_against_source(catalog) == (0, 0)
+
+
+def test_upsert_rejects_values_of_the_wrong_type(recommender):
+    version = recommender.snapshot.model_version
+    with pytest.raises(ValueError, match='tuition'):
+        recommender.upsert_schools(pd.DataFrame([{**row_of(recommender, SCHOOL), 'tuition': 'a lot'}]))
+    with pytest.raises(ValueError, match='Missing required columns'):
+        recommender.upsert_schools(pd.DataFrame([{'name': SCHOOL, 'rating': 4.0}]))
+    assert recommender.snapshot.model_version == version
+
+
+def test_edits_survive_retraining(recommender, catalog):
+    recommender.upsert_schools(pd.DataFrame([{**row_of(recommender, SCHOOL), 'rating': 4.2}]))
+    removed = next(name for name in recommender.snapshot.name_positions if name != SCHOOL)
+    recommender.remove_schools([removed])
+
+    # Another process finds the model up to date with the CSV plus the edits
+    assert make_recommender(catalog).refresh_from_source() == 'unchanged'
+
+    # A change elsewhere in the CSV is patched in without reverting the edits
+    source = pd.read_csv(catalog)
+    other = source.index[~source['name'].isin([SCHOOL, removed])][0]
+    source.loc[other, 'rating'] = 3.9
+    source.to_csv(catalog, index=False)
+    updated = make_recommender(catalog)
+    assert updated.refresh_from_source() == 'incremental'
+    assert row_of(updated, SCHOOL)['rating'] == 4.2
+    assert removed not in updated.snapshot.name_positions
+
+    for options in ({}, {'chunk_rows': 20}):
+        retrained = make_recommender(catalog, **options)
+        assert retrained.refresh_from_source(force_retrain=True) == 'full'
+        assert row_of(retrained, SCHOOL)['rating'] == 4.2
+        assert removed not in retrained.snapshot.name_positions
+        assert len(retrained.snapshot.tombstones) == 0
+
+
+def test_drift_asks_for_a_retrain(recommender, catalog):
+    version = recommender.snapshot.model_version
+    result = recommender.upsert_schools(pd.DataFrame([{**row_of(recommender, SCHOOL), 'type': 'Floating'}]))
+    assert result['mode'] == 'retrain' and 'type' in result['reason']
+    assert recommender.snapshot.model_version == version
+
+    # The edit is recorded, so the model counts as out of date until retrained
+    assert recommender.source_changed()
+    assert recommender.refresh_from_source() == 'full'
+    assert row_of(recommender, SCHOOL)['type'] == 'Floating'
+
+
+@pytest.mark.parametrize('options', [
+    {'index_backend': 'brute'},
+    {'index_backend': 'kd_tree'},
+    {'index_backend': 'ball_tree'},
+    {'index_backend': 'ivf', 'index_params': {'n_lists': 4, 'n_probe': 4}},
+    {'storage_precision': 'int8', 'rerank_candidates': 1000},
+])
+def test_patched_model_matches_exact_search(catalog, options):
+    recommender = make_recommender(catalog, **options)
+    recommender.refresh_from_source()
+    # Keep the removed rows as tombstones in this small catalog
+    recommender._max_removed_fraction = 0.5
+    names = list(recommender.snapshot.name_positions)
+    n_schools = recommender.snapshot.n_schools
+    replaced = {position for name in [names[0]] + names[5:8] for position in recommender.snapshot.name_positions[name]}
+    recommender.remove_schools(names[5:8])
+    recommender.upsert_schools(pd.DataFrame([
+        {**row_of(recommender, names[0]), 'rating': 3.7},
+        {**row_of(recommender, names[1]), 'name': 'Harbour Lights School', 'latitude': 51.5, 'longitude': -0.12},
+    ]))
+    snapshot = recommender.snapshot
+    assert set(snapshot.tombstones.tolist()) == replaced
+    assert snapshot.n_schools == n_schools - len(replaced) + 2
+
+    for loaded in (recommender, make_recommender(catalog, **options)):
+        loaded.refresh_if_stale(min_interval=0)
+        results = loaded.get_recommendations([names[2], names[3]], n_recommendations=10)
+        features = loaded.snapshot.features_matrix
+        live = {position for positions in loaded.snapshot.name_positions.values() for position in positions}
+        inputs = set(loaded.snapshot.name_positions[names[2]] + loaded.snapshot.name_positions[names[3]])
+        centroid = features[[loaded.snapshot.name_positions[names[2]][0], loaded.snapshot.name_positions[names[3]][0]]].mean(axis=0)
+        candidates = sorted(live - inputs)
+        distances = np.linalg.norm(np.asarray(features[candidates], dtype=np.float64) - centroid, axis=1)
+        expected = [candidates[i] for i in np.argsort(distances, kind='stable')[:10]]
+        assert [int(school['id']) for school in results] == expected
+
+    # The spatial and attribute indexes know the appended row, not the removed ones
+    nearby = recommender.get_recommendations([names[2]], n_recommendations=5, location=(51.5, -0.12),
+                                             max_distance_km=1)
+    assert [school['name'] for school in nearby] == ['Harbour Lights School']
+    matching = recommender.get_recommendations([names[2]], n_recommendations=500,
+                                               filters={'type': [row_of(recommender, names[1])['type']]})
+    assert 'Harbour Lights School' in {school['name'] for school in matching}
+    assert not {school['name'] for school in matching} & set(names[5:8])
+
+
+def test_many_removals_compact_the_artifacts(recommender):
+    recommender._max_removed_fraction = 0
+    recommender.remove_schools([SCHOOL])
+    snapshot = recommender.snapshot
+    assert len(snapshot.tombstones) == 0 and snapshot.n_rows == snapshot.n_schools
+    assert SCHOOL not in snapshot.name_positions
+
+
+
+def test_retrains_use_the_serving_settings(catalog, monkeypatch):
+    from recommender import rec_eng
+    from recommender.training import train_from_source
+
+    serving = make_recommender(catalog, index_backend='kd_tree', drift_threshold=0.5,
+                               interaction_weights={'view': 1.0, 'favorite': 5.0}, profile_half_life_days=30)
+    trained = []
+    refresh_from_source = rec_eng.HybridSchoolRecommender.refresh_from_source
+    def recording_refresh(self, force_retrain=False):
+        trained.append(self)
+        return refresh_from_source(self, force_retrain)
+    monkeypatch.setattr(rec_eng.HybridSchoolRecommender, 'refresh_from_source', recording_refresh)
+
+    result = train_from_source(serving.data_path, serving.model_dir, serving.settings(), False)
+    assert result['mode'] == 'full'
+    assert trained[0].settings() == serving.settings()
@@ -0,0 +1,214 @@
+"""Tests for the backend's interaction storage, run against mongomock
+
+    python -m pytest test_interactions_api.py
+"""
+from datetime import datetime, timedelta
+import os
+import time
+
+from bson import ObjectId
+import mongomock
+import numpy as np
+import pytest
+
+SCHOOL = 'British Overseas School'
+OTHER_SCHOOL = 'Seaview Academy'
+
+
+@pytest.fixture
+def client(backend, monkeypatch):
+    # Only the background refresh reaches the recommender
+    monkeypatch.setattr(backend.recommendation_store, 'enqueue', lambda user_id: None)
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def user_id(backend):
+    return str(backend.users_collection.insert_one({'username': 'reader'}).inserted_id)
+
+
+def rows(backend, user_id):
+    return list(backend.interaction_store.collection.find({'user_id': ObjectId(user_id)}))
+
+
+def test_repeat_interactions_upsert_one_row(backend, client, user_id):
+    for interaction_type in ('view', 'view', 'favorite', 'view'):
+        response = client.post('/api/user/interactions',
+                               json={'userId': user_id, 'school_name': SCHOOL, 'type': interaction_type})
+        assert response.status_code == 200
+    assert sorted(row['type'] for row in rows(backend, user_id)) == ['favorite', 'view']
+    user = backend.users_collection.find_one({'_id': ObjectId(user_id)})
+    assert user['interaction_count'] == 4
+    assert 'interacted_schools' not in user
+
+
+def test_unknown_school(client, user_id):
+    response = client.post('/api/user/interactions', json={'userId': user_id, 'school_name': 'Nope', 'type': 'view'})
+    assert response.status_code == 404
+
+
+def test_batch(backend, client, user_id):
+    now = datetime.now()
+    response = client.post('/api/user/interactions/batch', json={'userId': user_id, 'interactions': [
+        {'school_name': SCHOOL, 'type': 'view', 'timestamp': (now - timedelta(days=2)).isoformat()},
+        {'school_name': SCHOOL, 'type': 'view', 'timestamp': (now - timedelta(days=1)).isoformat()},
+        {'school_name': OTHER_SCHOOL, 'type': 'favorite'},
+        {'school_name': 'Nope', 'type': 'view'},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json() == {'success': True, 'recorded': 3, 'unknown': ['Nope']}
+    latest = backend.interaction_store.latest(ObjectId(user_id))
+    assert [(name, interaction_type) for name, interaction_type, _ in latest] == [(OTHER_SCHOOL, 'favorite'), (SCHOOL, 'view')]
+    # The newest of the two views is kept
+    assert abs(latest[1][2] - (now - timedelta(days=1))) < timedelta(seconds=1)
+
+
+def test_batch_rejects_bad_input(client, user_id):
+    assert client.post('/api/user/interactions/batch', json={'userId': user_id, 'interactions': []}).status_code == 400
+    assert client.post('/api/user/interactions/batch', json={'userId': user_id, 'interactions': [
+        {'school_name': SCHOOL, 'type': 'view', 'timestamp': 'yesterday'}]}).status_code == 400
+    assert client.post('/api/user/interactions/batch', json={'userId': user_id, 'interactions': [
+        {'school_name': SCHOOL, 'type': 'view'}] * 501}).status_code == 400
+
+
+def test_history_is_capped(backend, client, user_id, monkeypatch):
+    monkeypatch.setattr(backend.interaction_store, 'max_history', 5)
+    monkeypatch.setattr(backend.interaction_store, 'trim_every', 4)
+    schools = [school['name'] for school in backend.schools_collection.find({}, {'name': 1}).limit(12)]
+    start = datetime.now() - timedelta(hours=1)
+    for i, name in enumerate(schools):
+        client.post('/api/user/interactions/batch', json={'userId': user_id, 'interactions': [
+            {'school_name': name, 'type': 'view', 'timestamp': (start + timedelta(minutes=i)).isoformat()}]})
+    assert len(rows(backend, user_id)) <= 5 + 3
+    assert [name for name, _, _ in backend.interaction_store.latest(ObjectId(user_id))] == schools[::-1][:5]
+
+
+def test_schools_loaded_with_numeric_types(backend):
+    school = backend.schools_collection.find_one({'name': SCHOOL})
+    assert isinstance(school['tuition'], int) and isinstance(school['rating'], float)
+
+
+def test_model_change_queues_refreshes_for_older_documents(backend):
+    store = backend.RecommendationStore(mongomock.MongoClient().db.recommendations, compute=None, workers=0)
+    store.collection.insert_many([
+        {'_id': 'a', 'model_version': 'v1'}, {'_id': 'b', 'model_version': 'v2'}, {'_id': 'c', 'model_version': 'v1'}])
+    assert store.observe_model_version(None) == 0
+    assert store.observe_model_version('v2') == 2
+    assert sorted(store._queue.queue) == ['a', 'c']
+    # Unchanged version: nothing new is queued
+    assert store.observe_model_version('v2') == 0
+    assert store._queue.qsize() == 2
+
+
+def test_interactions_are_folded_by_the_refresh(backend, client, user_id, monkeypatch):
+    folded = []
+    def update_profile(profile, interactions, max_entries=None):
+        folded.append([name for name, _, _ in interactions])
+        count = (profile['n_interactions'] if profile else 0) + len(interactions)
+        return {'vector': [float(count)], 'n_interactions': count}, []
+    monkeypatch.setattr(backend.recommender_client, 'update_profile', update_profile)
+    monkeypatch.setattr(backend.recommender_client, 'get_profile_recommendations',
+                        lambda profile, **options: {'recommendations': [], 'model_version': 'v1'})
+
+    client.post('/api/user/interactions', json={'userId': user_id, 'school_name': SCHOOL, 'type': 'view'})
+    # The write itself never calls the recommender
+    assert folded == []
+    backend.compute_user_recommendations(user_id)
+    # The first read builds the profile from the stored rows plus the pending list
+    assert folded == [[SCHOOL, SCHOOL]]
+
+    client.post('/api/user/interactions/batch', json={'userId': user_id, 'interactions': [
+        {'school_name': OTHER_SCHOOL, 'type': 'view'}, {'school_name': SCHOOL, 'type': 'favorite'}]})
+    backend.compute_user_recommendations(user_id)
+    # Only the interactions the profile is behind by are folded
+    assert folded[-1] == [OTHER_SCHOOL, SCHOOL]
+    user = backend.users_collection.find_one({'_id': ObjectId(user_id)})
+    assert user['profile']['n_interactions'] == user['interaction_count'] == 3
+
+
+def test_profile_scoring_falls_back_to_the_last_good_result(backend, monkeypatch):
+    recommender = backend.RecommenderClient()
+    calls = []
+    def call(method, path, **kwargs):
+        calls.append(path)
+        if len(calls) > 1:
+            raise backend.RecommenderUnavailable('down')
+        return {'recommendations': [{'name': SCHOOL}], 'model_version': 'v1'}
+    monkeypatch.setattr(recommender, '_call', call)
+
+    profile = {'vector': [1.0], 'n_interactions': 1}
+    assert 'stale' not in recommender.get_profile_recommendations(profile, owner='u1')
+    # A newer profile of the same user is served the last good result while the service is down
+    result = recommender.get_profile_recommendations({**profile, 'n_interactions': 2}, owner='u1')
+    assert result['stale'] and result['recommendations'] == [{'name': SCHOOL}]
+    with pytest.raises(backend.RecommenderUnavailable):
+        recommender.get_profile_recommendations(profile, owner='u2')
+
+
+@pytest.fixture
+def engine(backend, catalog, monkeypatch):
+    """A recommender trained on the catalog, answering the backend's profile calls in-process"""
+    from recommender.rec_eng import HybridSchoolRecommender
+
+    recommender = HybridSchoolRecommender(catalog, model_dir=os.path.join(os.path.dirname(catalog), 'models'))
+    recommender.refresh_from_source()
+    monkeypatch.setattr(backend.recommender_client, 'update_profile', recommender.update_profile)
+    monkeypatch.setattr(backend.recommender_client, 'get_profile_recommendations',
+                        lambda profile, **options: {'recommendations': [], 'model_version': 'v1'})
+    return recommender
+
+
+def assert_same_profile(engine, folded, rebuilt):
+    from recommender.profiles import profile_centroid
+
+    assert rebuilt['entries'] == folded['entries']
+    feature_space = engine.snapshot.feature_space
+    np.testing.assert_allclose(profile_centroid(folded, feature_space), profile_centroid(rebuilt, feature_space))
+
+
+def test_folded_and_rebuilt_profiles_match(backend, client, user_id, engine, monkeypatch):
+    monkeypatch.setattr(backend.interaction_store, 'max_history', 4)
+    schools = [school['name'] for school in backend.schools_collection.find({}, {'name': 1}).limit(4)]
+    start = datetime.now() - timedelta(days=30)
+    # Repeats, a late arrival and more (school, type) pairs than the history keeps
+    visits = [(schools[0], 'view', 0), (schools[1], 'favorite', 1), (schools[0], 'view', 2), (schools[0], 'view', 9),
+              (schools[2], 'view', 5), (schools[1], 'view', 4), (schools[3], 'view', 12), (schools[0], 'favorite', 3)]
+    for name, interaction_type, day in visits:
+        client.post('/api/user/interactions/batch', json={'userId': user_id, 'interactions': [
+            {'school_name': name, 'type': interaction_type, 'timestamp': (start + timedelta(days=day)).isoformat()}]})
+        backend.compute_user_recommendations(user_id)
+
+    user = backend.users_collection.find_one({'_id': ObjectId(user_id)})
+    folded = user['profile']
+    assert folded['n_interactions'] == len(visits) and len(folded['entries']) == 4
+    assert_same_profile(engine, folded, backend.rebuild_profile(user))
+
+
+def test_rebuild_racing_a_write_loses_nothing(backend, client, user_id, engine, monkeypatch):
+    schools = [school['name'] for school in backend.schools_collection.find({}, {'name': 1}).limit(2)]
+    client.post('/api/user/interactions', json={'userId': user_id, 'school_name': schools[0], 'type': 'view'})
+    backend.compute_user_recommendations(user_id)
+
+    # A refit forces a rebuild, which runs between the user update and the interaction store write
+    backend.users_collection.update_one({'_id': ObjectId(user_id)}, {'$unset': {'profile': ''}})
+    record = backend.interaction_store.record
+    def record_after_a_rebuild(*args):
+        backend.compute_user_recommendations(user_id)
+        record(*args)
+    monkeypatch.setattr(backend.interaction_store, 'record', record_after_a_rebuild)
+    client.post('/api/user/interactions', json={'userId': user_id, 'school_name': schools[1], 'type': 'view'})
+    monkeypatch.setattr(backend.interaction_store, 'record', record)
+
+    backend.compute_user_recommendations(user_id)
+    user = backend.users_collection.find_one({'_id': ObjectId(user_id)})
+    assert user['profile']['schools'] == sorted(schools) and user['profile']['n_interactions'] == 2
+    assert_same_profile(engine, user['profile'], backend.rebuild_profile(user))
+
+
+def test_calls_beyond_the_concurrency_limit_fail_fast(backend):
+    recommender = backend.RecommenderClient(max_concurrency=1, read_timeout=5.0)
+    assert recommender._slots.acquire(blocking=False)
+    started = time.monotonic()
+    with pytest.raises(backend.RecommenderUnavailable, match='in flight'):
+        recommender.get_recommendations([SCHOOL])
+    assert time.monotonic() - started < 1
@@ -0,0 +1,69 @@
+"""Tests for the backend's /api/schools listing, run against mongomock
+
+    python -m pytest test_schools_api.py
+"""
+import pytest
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+def test_indexes_created(backend):
+    keys = [[field for field, _ in index['key']] for index in backend.schools_collection.index_information().values()]
+    assert ['name'] in keys
+    assert ['type', '_id'] in keys
+    assert ['tuition'] in keys
+
+
+def test_pages_cover_the_collection_once(backend, client):
+    seen = []
+    cursor = None
+    while True:
+        response = client.get('/api/schools', query_string={'limit': 30, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= 30
+        seen.extend(school['id'] for school in page)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+        assert 'rel="next"' in response.headers['Link']
+    assert len(seen) == len(set(seen)) == backend.schools_collection.count_documents({})
+
+
+def test_list_view_projects_fields(client):
+    school = client.get('/api/schools', query_string={'view': 'list', 'limit': 1}).get_json()[0]
+    assert set(school) == {'id', 'name', 'latitude', 'longitude', 'type', 'curriculum', 'rating', 'tuition', 'focus'}
+    detail = client.get('/api/schools', query_string={'limit': 1}).get_json()[0]
+    assert {'facilities', 'student_teacher_ratio', 'test_scores'} <= set(detail)
+    assert '_id' not in detail
+
+
+def test_filters(backend, client):
+    schools = client.get('/api/schools', query_string={
+        'type': 'Private', 'min_tuition': 100000, 'max_tuition': 300000, 'limit': 500
+    }).get_json()
+    expected = backend.schools_collection.count_documents(
+        {'type': 'Private', 'tuition': {'$gte': 100000, '$lte': 300000}})
+    assert len(schools) == expected > 0
+    assert all(school['type'] == 'Private' and 100000 <= school['tuition'] <= 300000 for school in schools)
+
+
+def test_invalid_parameters(client):
+    assert client.get('/api/schools?limit=0').status_code == 400
+    assert client.get('/api/schools?cursor=nope').status_code == 400
+    assert client.get('/api/schools?min_tuition=cheap').status_code == 400
+    assert client.get('/api/schools?view=full').status_code == 400
+
+
+def test_etag_revalidation(backend, client):
+    response = client.get('/api/schools?view=list')
+    etag = response.headers['ETag']
+    assert client.get('/api/schools?view=list', headers={'If-None-Match': etag}).status_code == 304
+    # Another query gets another tag
+    assert client.get('/api/schools?view=detail').headers['ETag'] != etag
+
+    backend.bump_collection_version(backend.meta_collection)
+    assert client.get('/api/schools?view=list', headers={'If-None-Match': etag}).status_code == 200